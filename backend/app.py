@@ -1,8 +1,9 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 from werkzeug.utils import secure_filename
 import os
+import json
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
@@ -30,7 +31,7 @@ except ImportError as e:
 # Keep existing utils imports
 try:
     from utils.image_preprocessor import ImagePreprocessor
-    from utils.ocr_engine import OCREngine, MistralOnlyEngine
+    from utils.ocr_engine import OCREngine
     from utils.prescription_parser import PrescriptionParser
     from utils.correction_store import CorrectionStore
     from utils.correction_learner import CorrectionLearner
@@ -64,11 +65,16 @@ app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__fil
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Initialize Utils
+# OCR engines are built lazily, once per process, by the engine registry (OCR_ENGINES).
+# The registry and progress channels have no third-party dependencies, so the
+# routes can rely on them being importable.
+from utils.engine_registry import engine_registry
+from utils import progress
+
 try:
-    hybrid_ocr = MistralOnlyEngine()
     correction_store = CorrectionStore()
 except Exception as e:
-    print(f"Error initializing engines: {e}")
+    print(f"Error initializing correction store: {e}")
 
 # Mock Database
 PRESCRIPTIONS = {}
@@ -118,7 +124,7 @@ USERS = {
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({"status": "ok", "message": "Backend is running"})
+    return jsonify({"status": "ok", "message": "Backend is running", "ocr_engines": engine_registry.health()})
 
 @app.route('/api/login', methods=['POST'])
 @app.route('/api/auth/login', methods=['POST'])
@@ -160,14 +166,11 @@ def verify_license():
         "details": "Verified against Surepass API (Mock)" if is_valid else "Invalid License"
     })
 
-@app.route('/api/ocr/upload', methods=['POST'])
-@jwt_required()
-def upload_prescription():
-    print("========== UPLOAD REQUEST RECEIVED ==========", flush=True)
-    print(f"Request method: {request.method}", flush=True)
-    print(f"Request files: {request.files}", flush=True)
-    print(f"Request headers: {dict(request.headers)}", flush=True)
-    
+def _receive_upload():
+    """
+    Validate an OCR upload request and save the file.
+    Returns: (upload dict, None) or (None, error response)
+    """
     current_user_email = get_jwt_identity()  # Returns email string
     claims = get_jwt()  # Returns the full JWT with claims
     user_role = claims.get('role', '')
@@ -178,67 +181,201 @@ def upload_prescription():
     prescription_owner = patient_email if patient_email else current_user_email
     
     if user_role not in ['patient', 'pharmacist', 'doctor']:
-        return jsonify({"msg": "Unauthorized"}), 403
+        return None, (jsonify({"msg": "Unauthorized"}), 403)
 
     if 'file' not in request.files:
-        return jsonify({"msg": "No file part"}), 400
+        return None, (jsonify({"msg": "No file part"}), 400)
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({"msg": "No selected file"}), 400
+        return None, (jsonify({"msg": "No selected file"}), 400)
+
+    # Optional client-chosen id of a /api/ocr/progress/<upload_id> stream
+    upload_id = request.form.get('upload_id', None)
+    if upload_id and not progress.valid_upload_id(upload_id):
+        return None, (jsonify({"msg": "Invalid upload_id"}), 400)
 
     filename = secure_filename(file.filename)
     prescription_id = str(uuid.uuid4())
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{prescription_id}_{filename}")
     file.save(filepath)
 
+    return {
+        'prescription_id': prescription_id,
+        'filename': filename,
+        'original_filename': file.filename,
+        'filepath': filepath,
+        'owner': prescription_owner,
+        'user': current_user_email,
+        'upload_id': upload_id
+    }, None
+
+def _progress_channel(upload):
+    """Progress channel for an upload that named one (None otherwise)"""
+    if not upload.get('upload_id'):
+        return None
+    channel = progress.progress_hub.channel(upload['user'], upload['upload_id'], fresh=True)
+    channel.publish('start', {'id': upload['prescription_id'], 'filename': upload['original_filename']})
+    return channel
+
+def _store_prescription(upload, medicines):
+    """Build the prescription record for an OCR'd upload and persist it"""
+    prescription_id = upload['prescription_id']
+    prescription_data = {
+        'id': prescription_id,
+        'patient_id': upload['owner'],  # FIXED: Who owns this prescription
+        'issued_by': upload['user'],   # Who created/uploaded it
+        'type': 'scanned',  # scanned vs digital
+        'image_url': f"/static/uploads/{prescription_id}_{upload['filename']}", 
+        'medicines': medicines,
+        'status': 'pending',  # ALL prescriptions start as pending
+        'uploaded_by': upload['user'],
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    # Save to in-memory dict
+    PRESCRIPTIONS[prescription_id] = prescription_data
+    
+    # Also save to persistent database if available
+    if prescription_db:
+        try:
+            prescription_db.save_prescription(prescription_id, prescription_data)
+            print(f"✓ Saved to prescription_db: {prescription_id}", flush=True)
+        except Exception as e:
+            print(f"⚠ Failed to save to prescription_db: {e}", flush=True)
+    
+    return prescription_data
+
+@app.route('/api/ocr/upload', methods=['POST'])
+@jwt_required()
+def upload_prescription():
+    print("========== UPLOAD REQUEST RECEIVED ==========", flush=True)
+    print(f"Request method: {request.method}", flush=True)
+    print(f"Request files: {request.files}", flush=True)
+    print(f"Request headers: {dict(request.headers)}", flush=True)
+    
+    upload, error = _receive_upload()
+    if error:
+        return error
+    filepath = upload['filepath']
+    channel = _progress_channel(upload)
+    token = progress.bind(channel) if channel else None
+
     try:
         # Use Mistral Hybrid Engine
         print(f"Processing {filepath}...")
         print(f"File exists: {os.path.exists(filepath)}")
         print(f"File size: {os.path.getsize(filepath) if os.path.exists(filepath) else 'N/A'}")
         
-        # OCR Processing - Gemini 2.5 Pro (Free Unlimited)
-        print(f"\nDEBUG: Starting Gemini OCR processing for {file.filename}", flush=True)
+        # OCR Processing - shared engine from the registry (Gemini 2.5 Pro by default)
+        print(f"\nDEBUG: Starting OCR processing for {upload['original_filename']}", flush=True)
         sys.stdout.flush()
         
-        from utils.gemini_ocr_engine import GeminiOCREngine
-        ocr_engine = GeminiOCREngine()
+        ocr_engine = engine_registry.get_ocr_engine()
         
-        medicines = ocr_engine.extract_medicines(filepath)
+        if channel:
+            # Someone is watching progress: stream so medicines show up during the LLM call.
+            # stream_medicines gives the same medicines as extract_medicines (Claude only
+            # streams when its confidence gate can't change the result)
+            medicines = []
+            for medicine in ocr_engine.stream_medicines(filepath):
+                medicines.append(medicine)
+                progress.publish('medicine', medicine)
+        else:
+            medicines = ocr_engine.extract_medicines(filepath)
         print(f"DEBUG: OCR returned {len(medicines)} medicines", flush=True)
         
-        prescription_data = {
-            'id': prescription_id,
-            'patient_id': prescription_owner,  # FIXED: Who owns this prescription
-            'issued_by': current_user_email,   # Who created/uploaded it
-            'type': 'scanned',  # scanned vs digital
-            'image_url': f"/static/uploads/{prescription_id}_{filename}", 
-            'medicines': medicines,
-            'status': 'pending',  # ALL prescriptions start as pending
-            'uploaded_by': current_user_email,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Save to in-memory dict
-        PRESCRIPTIONS[prescription_id] = prescription_data
-        
-        # Also save to persistent database if available
-        if prescription_db:
-            try:
-                prescription_db.save_prescription(prescription_id, prescription_data)
-                print(f"✓ Saved to prescription_db: {prescription_id}", flush=True)
-            except Exception as e:
-                print(f"⚠ Failed to save to prescription_db: {e}", flush=True)
-        
+        prescription_data = _store_prescription(upload, medicines)
+        if channel:
+            channel.close('done', {'id': upload['prescription_id'], 'medicines': len(medicines)})
         return jsonify(prescription_data)
 
     except Exception as e:
         print(f"OCR Failed: {e}")
         import traceback
         traceback.print_exc()
+        if channel:
+            channel.close('error', {'msg': f"Processing failed: {str(e)}"})
+        return jsonify({"msg": f"Processing failed: {str(e)}"}), 500
+
+    finally:
+        if token:
+            progress.unbind(token)
+        if channel and not channel.closed:
+            channel.close('error', {'msg': 'Processing stopped'})
+
+def _sse(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant of /api/ocr/upload: medicines are sent as Server-Sent Events
+# as soon as the model finishes each one (read with fetch + ReadableStream)
+@app.route('/api/ocr/upload/stream', methods=['POST'])
+@jwt_required()
+def upload_prescription_stream():
+    upload, error = _receive_upload()
+    if error:
+        return error
+
+    try:
+        ocr_engine = engine_registry.get_ocr_engine()
+    except Exception as e:
         return jsonify({"msg": f"Processing failed: {str(e)}"}), 500
 
+    channel = _progress_channel(upload)
+
+    def generate():
+        yield _sse('start', {'id': upload['prescription_id']})
+        token = progress.bind(channel) if channel else None
+        medicines = []
+        try:
+            for medicine in ocr_engine.stream_medicines(upload['filepath']):
+                medicines.append(medicine)
+                progress.publish('medicine', medicine)
+                yield _sse('medicine', medicine)
+            prescription_data = _store_prescription(upload, medicines)
+            if channel:
+                channel.close('done', {'id': upload['prescription_id'], 'medicines': len(medicines)})
+            yield _sse('done', prescription_data)
+        except Exception as e:
+            print(f"OCR stream failed: {e}", flush=True)
+            if channel:
+                channel.close('error', {'msg': f"Processing failed: {str(e)}"})
+            yield _sse('error', {'msg': f"Processing failed: {str(e)}"})
+        finally:
+            if token:
+                progress.unbind(token)
+            # Client went away (GeneratorExit) mid-upload: end progress subscribers now, not at the TTL
+            if channel and not channel.closed:
+                channel.close('error', {'msg': 'Upload stream closed before processing finished'})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let a proxy buffer the stream
+    })
+
+# Pipeline progress for an upload sent with form field upload_id: stage
+# transitions (with elapsed seconds), partial medicines, then done or error.
+# Read with fetch + ReadableStream so the token stays in the Authorization header
+@app.route('/api/ocr/progress/<upload_id>', methods=['GET'])
+@jwt_required()
+def upload_progress(upload_id):
+    if not progress.valid_upload_id(upload_id):
+        return jsonify({"msg": "Invalid upload_id"}), 400
+    channel = progress.progress_hub.channel(get_jwt_identity(), upload_id)
+
+    def generate():
+        for event, data in channel.subscribe():
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield _sse(event, data)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # List all prescriptions (for Dashboard)
 @app.route('/api/prescriptions', methods=['GET'])
 @jwt_required()
@@ -319,6 +456,11 @@ def approve_prescription(id):
                 correction_feedback.batch_add_corrections(
                     id, original_meds, edited_medicines, current_user
                 )
+                # Log the changes and fold them into the shared model behind /api/insights/corrections
+                from utils.correction_model import approval_corrections, get_correction_model
+                correction_model = get_correction_model()
+                for correction in approval_corrections(id, original_meds, edited_medicines, current_user):
+                    correction_model.add_correction(correction)
         except Exception as e:
             print(f"⚠ Correction feedback error: {e}", flush=True)
     
@@ -548,6 +690,22 @@ def submit_approval(approval_id):
     
     return jsonify(updated) if updated else (jsonify({"msg": "Not found"}), 404)
 
+@app.route('/api/insights/corrections', methods=['GET'])
+@jwt_required()
+def get_correction_insights():
+    """Correction dashboard: running aggregates of approval corrections, no scan of the history"""
+    claims = get_jwt()
+    if claims.get('role') != 'pharmacist':
+        return jsonify({"msg": "Unauthorized - Only pharmacists can view correction insights"}), 403
+
+    try:
+        from utils.correction_insights import CorrectionInsights
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify(CorrectionInsights().get_summary(limit=limit))
+    except Exception as e:
+        print(f"Correction insights error: {e}", flush=True)
+        return jsonify({"msg": "Failed to load correction insights"}), 500
+
 # Serve Static Files (Images)
 @app.route('/static/<path:path>')
 def send_static(path):
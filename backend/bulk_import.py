@@ -0,0 +1,343 @@
+"""
+Bulk prescription import
+OCRs a folder of historical prescription scans into prescription_db.
+
+- Files are deduplicated by content hash (within the folder and across runs)
+- Preprocessing runs in a process pool; OCR calls run concurrently on one event
+  loop, bounded by --concurrency and paced to the provider's --rpm quota
+- With --batch-images N, N prescriptions share one vision request (per-image JSON),
+  so each request against the RPM quota covers N scans
+- At most --concurrency scans are being prepared or OCR'd at a time, so memory
+  and disk use don't grow with the size of the folder
+- Results are saved to prescription_db in batches, and every saved scan is
+  recorded in a checkpoint file so an interrupted run resumes where it stopped
+- Scans with no medicines (or that error) are retried on later runs, up to
+  --max-attempts runs, then recorded as 'empty' / 'error' and left alone
+
+Usage (from backend/):
+    python bulk_import.py <scan_dir> [--engine gemini] [--rpm 15] [--concurrency 8]
+                          [--workers 4] [--batch-size 25] [--batch-images 4]
+                          [--max-attempts 3] [--patient bulk_import]
+                          [--checkpoint data/bulk_import_checkpoint.jsonl]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+load_dotenv()
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static/uploads')
+DEFAULT_CHECKPOINT = 'data/bulk_import_checkpoint.jsonl'
+# Namespace for deterministic prescription ids, so a re-imported scan overwrites itself
+BULK_IMPORT_NAMESPACE = uuid.UUID('6f1c2a9e-4b7d-4e0a-9c1f-3d5b8a2e7c41')
+HASH_CHUNK = 1024 * 1024
+# Checkpoint statuses that need no further runs ('failed' is retried)
+TERMINAL_STATUSES = ('imported', 'empty', 'error')
+
+
+def find_images(root):
+    """Image files under root (preprocessed copies from earlier runs are skipped)"""
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() in IMAGE_EXTENSIONS and not stem.endswith('_preprocessed'):
+                paths.append(os.path.join(dirpath, filename))
+    return sorted(paths)
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_scan(source_path, upload_path):
+    """
+    Copy a scan into the uploads folder and preprocess the copy (runs in a worker process).
+    Returns the path to send to OCR (the original copy if preprocessing fails).
+    """
+    shutil.copy2(source_path, upload_path)
+    try:
+        from utils.image_preprocessor import preprocess_to_file
+        processed_path, _ = preprocess_to_file(upload_path)
+        return processed_path
+    except Exception as e:
+        print(f"   Preprocessing error for {os.path.basename(source_path)}: {e}, using original image", flush=True)
+        return upload_path
+
+
+class Checkpoint:
+    """Append-only JSON Lines record of imported scans, keyed by content hash"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """Returns: (hashes needing no further work, {hash: failed attempts so far})"""
+        done = set()
+        attempts = {}
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    digest = entry.get('hash')
+                    if entry.get('status') in TERMINAL_STATUSES:
+                        done.add(digest)
+                    elif entry.get('status') == 'failed':
+                        attempts[digest] = attempts.get(digest, 0) + 1
+        except FileNotFoundError:
+            pass
+        return done, attempts
+
+    def record(self, entries):
+        with open(self.path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class BatchWriter:
+    """Buffers OCR results and saves them to prescription_db (then the checkpoint) in batches"""
+
+    def __init__(self, db, checkpoint, batch_size):
+        self.db = db
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.prescriptions = {}
+        self.entries = []
+        self.saved = 0
+
+    def add(self, prescription, entry):
+        if prescription is not None:
+            self.prescriptions[prescription['id']] = prescription
+        self.entries.append(entry)
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.entries:
+            return
+        if self.prescriptions:
+            self.db.save_prescriptions(self.prescriptions)
+            self.saved += len(self.prescriptions)
+            print(f"✓ Saved batch of {len(self.prescriptions)} prescriptions ({self.saved} total)", flush=True)
+        # Checkpoint only after the batch is durable in the database
+        self.checkpoint.record(self.entries)
+        self.prescriptions = {}
+        self.entries = []
+
+
+def get_engine(name):
+    from utils.engine_registry import engine_registry
+    if name:
+        engine = engine_registry.get(name)
+        if engine is None:
+            raise RuntimeError(f"OCR engine '{name}' is not available")
+        return engine
+    return engine_registry.get_ocr_engine()
+
+
+async def import_scans(jobs, engine, writer, args, attempts=None):
+    from utils.batch_ocr import chunk
+    from utils.rate_limiter import AsyncRateLimiter
+
+    loop = asyncio.get_running_loop()
+    limiter = AsyncRateLimiter(args.rpm)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    attempts = attempts or {}
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    done = 0
+
+    batch_images = args.batch_images
+    if batch_images > 1 and not hasattr(engine, 'extract_batch_from_preprocessed_async'):
+        print(f"⚠ {type(engine).__name__} has no multi-image mode, sending one image per request", flush=True)
+        batch_images = 1
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+
+        async def prepare(source_path, digest):
+            prescription_id = str(uuid.uuid5(BULK_IMPORT_NAMESPACE, digest))
+            filename = os.path.basename(source_path)
+            upload_path = os.path.join(UPLOAD_FOLDER, f"{prescription_id}_{filename}")
+            processed_path = await loop.run_in_executor(pool, prepare_scan, source_path, upload_path)
+            return prescription_id, filename, processed_path
+
+        async def extract_one(processed_path):
+            async with semaphore:
+                await limiter.acquire()
+                return await engine.extract_from_preprocessed_async(processed_path)
+
+        async def extract_group(processed_paths):
+            """One request for the whole group; per-image requests if the batch call fails"""
+            if len(processed_paths) > 1:
+                async with semaphore:
+                    await limiter.acquire()
+                    results = await engine.extract_batch_from_preprocessed_async(processed_paths)
+                if results is not None:
+                    return results
+                print(f"⚠ Batch of {len(processed_paths)} failed, retrying one image per request", flush=True)
+            return await asyncio.gather(*(extract_one(path) for path in processed_paths), return_exceptions=True)
+
+        def record(source_path, digest, filename, medicines, error=None):
+            nonlocal done
+            prescription_id = str(uuid.uuid5(BULK_IMPORT_NAMESPACE, digest))
+            entry = {'hash': digest, 'path': source_path, 'prescription_id': prescription_id}
+            prescription = None
+            if medicines:
+                now = datetime.now().isoformat()
+                prescription = {
+                    'id': prescription_id,
+                    'patient_id': args.patient,
+                    'issued_by': args.patient,
+                    'type': 'scanned',
+                    'image_url': f"/static/uploads/{prescription_id}_{filename}",
+                    'medicines': medicines,
+                    'status': 'pending',
+                    'uploaded_by': 'bulk_import',
+                    'timestamp': now,
+                    'source_path': source_path,
+                    'content_hash': digest
+                }
+                entry['status'] = 'imported'
+                entry['medicines'] = len(medicines)
+            else:
+                # Retried on the next run until it has had max_attempts runs
+                attempt = attempts.get(digest, 0) + 1
+                entry['attempt'] = attempt
+                if error is not None:
+                    entry['error'] = str(error)
+                if attempt >= args.max_attempts:
+                    entry['status'] = 'error' if error is not None else 'empty'
+                else:
+                    entry['status'] = 'failed'
+
+            done += 1
+            detail = f"{error}" if error is not None else f"{len(medicines or [])} medicines"
+            print(f"[{done}/{len(jobs)}] {filename}: {entry['status']} ({detail})", flush=True)
+            writer.add(prescription, entry)
+
+        async def import_group(group):
+            # A scan that fails to prepare only fails itself, not the rest of its group
+            prepared = await asyncio.gather(*(prepare(path, digest) for path, digest in group), return_exceptions=True)
+            ready = []
+            for (source_path, digest), result in zip(group, prepared):
+                if isinstance(result, BaseException):
+                    print(f"❌ {os.path.basename(source_path)}: {result}", flush=True)
+                    record(source_path, digest, os.path.basename(source_path), None, error=result)
+                else:
+                    ready.append((source_path, digest, result))
+            if not ready:
+                return
+
+            try:
+                results = await extract_group([processed_path for _, _, (_, _, processed_path) in ready])
+            except Exception as e:
+                print(f"❌ {', '.join(os.path.basename(path) for path, _, _ in ready)}: {e}", flush=True)
+                results = [e] * len(ready)
+
+            for (source_path, digest, (_, filename, _)), medicines in zip(ready, results):
+                if isinstance(medicines, BaseException):
+                    record(source_path, digest, filename, None, error=medicines)
+                else:
+                    record(source_path, digest, filename, medicines)
+
+        # A fixed pool of workers pulls groups from a queue, so only about
+        # --concurrency scans are prepared (copied, preprocessed) ahead of OCR
+        queue = asyncio.Queue()
+        for group in chunk(jobs, batch_images):
+            queue.put_nowait(group)
+
+        async def worker():
+            while True:
+                try:
+                    group = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await import_group(group)
+
+        worker_count = max(1, -(-args.concurrency // batch_images))
+        await asyncio.gather(*(worker() for _ in range(min(worker_count, queue.qsize()))))
+    writer.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR a folder of prescription scans into prescription_db")
+    parser.add_argument('scan_dir')
+    parser.add_argument('--engine', default=None, help="gemini, claude or mistral (default: OCR_ENGINES preference)")
+    parser.add_argument('--rpm', type=float, default=15, help="provider requests per minute (default 15, Gemini's quota)")
+    parser.add_argument('--concurrency', type=int, default=8, help="max OCR requests in flight")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="preprocessing processes")
+    parser.add_argument('--batch-size', type=int, default=25, help="prescriptions per database write")
+    parser.add_argument('--batch-images', type=int, default=1,
+                        help="prescriptions packed into one vision request (Gemini; 1 = off)")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="runs a scan with no medicines is tried before it is recorded as empty")
+    parser.add_argument('--patient', default='bulk_import', help="patient_id to file the prescriptions under")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.scan_dir):
+        print(f"✗ Not a directory: {args.scan_dir}")
+        return 1
+
+    checkpoint = Checkpoint(args.checkpoint)
+    finished, attempts = checkpoint.load()
+
+    paths = find_images(args.scan_dir)
+    print(f"ℹ Found {len(paths)} images in {args.scan_dir}", flush=True)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        digests = list(pool.map(content_hash, paths, chunksize=16))
+
+    jobs = []
+    seen = set()
+    duplicates = 0
+    for path, digest in zip(paths, digests):
+        if digest in seen:
+            duplicates += 1
+            continue
+        seen.add(digest)
+        if digest not in finished:
+            jobs.append((path, digest))
+    skipped = len(seen) - len(jobs)
+    print(f"ℹ {duplicates} duplicate files, {skipped} already done, {len(jobs)} to process", flush=True)
+    if not jobs:
+        return 0
+
+    from database.prescription_db import prescription_db
+    engine = get_engine(args.engine)
+    writer = BatchWriter(prescription_db, checkpoint, args.batch_size)
+
+    try:
+        asyncio.run(import_scans(jobs, engine, writer, args, attempts))
+    except KeyboardInterrupt:
+        writer.flush()
+        print("\n⚠ Interrupted; re-run the same command to resume", flush=True)
+        return 130
+
+    print(f"✓ Imported {writer.saved} prescriptions", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
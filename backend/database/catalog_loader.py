@@ -0,0 +1,424 @@
+"""
+Bulk catalog loader for the medicines table
+Streams a CSV in chunks with executemany inside a single transaction,
+dropping and rebuilding the medicines indexes around the load.
+Incremental sync applies only the added, changed and removed rows in place.
+The CLI is the deploy step: it switches the database to WAL mode and rebuilds
+the memory-mapped catalog snapshot (utils/catalog_snapshot.py) inside the load
+transaction, so it is current by the time the version bump commits.
+
+Usage (from backend/):
+    python -m database.catalog_loader database/raw/india_medicines.csv
+    python -m database.catalog_loader --sync database/raw/india_medicines.csv
+"""
+import csv
+import hashlib
+import os
+import sys
+import time
+from itertools import islice
+
+if __package__ in (None, ''):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.composition import rebuild_compositions
+from utils.db import connect, enable_wal
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pharmacy.db')
+CHUNK_SIZE = 5000
+# Tombstones are kept for this many catalog versions, then pruned by sync
+TOMBSTONE_KEEP_VERSIONS = 10
+
+# Hubs available for distribution (state -> hub city)
+HUBS = {
+    'Karnataka': 'Bangalore',
+    'Maharashtra': 'Mumbai',
+    'Tamil Nadu': 'Chennai',
+    'Delhi': 'Delhi',
+    'West Bengal': 'Kolkata'
+}
+
+MEDICINE_INDEXES = {
+    'idx_medicines_generic': 'CREATE INDEX IF NOT EXISTS idx_medicines_generic ON medicines(generic_name)',
+    'idx_medicines_brand': 'CREATE INDEX IF NOT EXISTS idx_medicines_brand ON medicines(brand_name)',
+    'idx_medicines_region': 'CREATE INDEX IF NOT EXISTS idx_medicines_region ON medicines(region, city)',
+    'idx_medicines_row_key': 'CREATE INDEX IF NOT EXISTS idx_medicines_row_key ON medicines(row_key)',
+}
+
+MEDICINES_DDL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        generic_name TEXT NOT NULL,
+        brand_name TEXT NOT NULL,
+        strength TEXT NOT NULL,
+        region TEXT DEFAULT 'Karnataka',
+        city TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        row_key TEXT,
+        content_hash TEXT
+    )
+'''
+
+INSERT_SQL = '''
+    INSERT INTO medicines (generic_name, brand_name, strength, region, city, row_key, content_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Full reloads reuse the previous id of a row_key so inventory rows stay linked
+INSERT_WITH_ID_SQL = '''
+    INSERT INTO medicines (generic_name, brand_name, strength, region, city, row_key, content_hash, id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def stable_region(brand_name):
+    """Pick a hub region from a hash of the brand name (same answer on every load)"""
+    digest = hashlib.md5(brand_name.lower().encode('utf-8')).digest()
+    regions = list(HUBS)
+    return regions[int.from_bytes(digest[:4], 'big') % len(regions)]
+
+
+def india_row(row):
+    """India dataset: name, short_composition1/2, pack_size_label"""
+    brand_name = (row.get('name') or '').strip()
+    # Combination products carry their second ingredient in short_composition2
+    parts = [' '.join((row.get(column) or '').split()) for column in ('short_composition1', 'short_composition2')]
+    generic_name = ', '.join(part for part in parts if part)
+    if not brand_name or not generic_name:
+        return None
+
+    # Deterministic home hub so reloads never reshuffle availability;
+    # real stock levels come from the inventory feed (database/inventory_feed.py)
+    region = stable_region(brand_name)
+    strength = (row.get('pack_size_label') or '').strip()
+    return (generic_name, brand_name, strength, region, HUBS[region])
+
+
+def combined_row(row):
+    """Combined dataset (medicines_all.csv): name, manufacturer, strength, region"""
+    generic_name = (row.get('name') or '').strip()
+    brand_name = (row.get('manufacturer') or '').strip()
+    if not generic_name or not brand_name:
+        return None
+    region = (row.get('region') or 'Karnataka').strip()
+    return (generic_name, brand_name, (row.get('strength') or '').strip(), region, HUBS.get(region))
+
+
+def curated_row(row):
+    """Curated dataset (medicines.csv): generic_name, brand_name, strength, region"""
+    generic_name = (row.get('generic_name') or '').strip()
+    brand_name = (row.get('brand_name') or '').strip()
+    if not generic_name or not brand_name:
+        return None
+    region = (row.get('region') or 'Karnataka').strip()
+    return (generic_name, brand_name, (row.get('strength') or '').strip(), region, HUBS.get(region))
+
+
+def detect_row_mapper(fieldnames):
+    """Pick the row mapper matching a CSV header"""
+    fields = set(fieldnames or [])
+    if 'short_composition1' in fields:
+        return india_row
+    if 'generic_name' in fields:
+        return curated_row
+    if 'manufacturer' in fields:
+        return combined_row
+    raise ValueError(f"Unrecognised medicines CSV columns: {sorted(fields)}")
+
+
+def ensure_medicines_schema(conn):
+    """Create catalog tables (medicines matches init_db) and add columns older databases lack"""
+    conn.execute(MEDICINES_DDL.format(table='medicines'))
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(medicines)')}
+    for column, ddl in (('region', "TEXT DEFAULT 'Karnataka'"), ('city', 'TEXT'),
+                        ('row_key', 'TEXT'), ('content_hash', 'TEXT')):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE medicines ADD COLUMN {column} {ddl}')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS medicine_tombstones (
+            medicine_id INTEGER NOT NULL,
+            row_key TEXT NOT NULL,
+            generic_name TEXT,
+            brand_name TEXT,
+            catalog_version INTEGER NOT NULL,
+            removed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tombstones_version ON medicine_tombstones(catalog_version)')
+
+
+def row_key(generic_name, brand_name, strength):
+    """Stable identity of a catalog row across reloads"""
+    identity = '\x1f'.join((generic_name.lower(), brand_name.lower(), strength.lower()))
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def content_hash(row):
+    """Hash of every stored field of a mapped row, used to detect changes"""
+    return hashlib.sha1('\x1f'.join(field or '' for field in row).encode('utf-8')).hexdigest()
+
+
+def with_hashes(row):
+    """Mapped row + (row_key, content_hash) as stored in the medicines table"""
+    return row + (row_key(row[0], row[1], row[2]), content_hash(row))
+
+
+def get_catalog_version(conn):
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_catalog_version(conn):
+    """Increment the catalog version the matchers watch to refresh their indexes"""
+    version = get_catalog_version(conn) + 1
+    conn.execute('''
+        INSERT INTO catalog_meta (key, value) VALUES ('version', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (str(version),))
+    conn.execute('''
+        INSERT INTO catalog_meta (key, value) VALUES ('updated_at', CURRENT_TIMESTAMP)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''')
+    return version
+
+
+def prune_tombstones(conn, version, keep=TOMBSTONE_KEEP_VERSIONS):
+    """Delete tombstones older than the last `keep` catalog versions; returns rows deleted"""
+    return conn.execute('DELETE FROM medicine_tombstones WHERE catalog_version <= ?',
+                        (version - keep,)).rowcount
+
+
+def drop_medicine_indexes(conn):
+    for name in MEDICINE_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def create_medicine_indexes(conn):
+    for ddl in MEDICINE_INDEXES.values():
+        conn.execute(ddl)
+
+
+def iter_csv_rows(csv_path, row_mapper=None):
+    """Yield mapped (generic, brand, strength, region, city) tuples, skipping invalid rows"""
+    with open(csv_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.DictReader(f)
+        mapper = row_mapper or detect_row_mapper(reader.fieldnames)
+        for row in reader:
+            mapped = mapper(row)
+            if mapped:
+                yield mapped
+
+
+def bulk_load_medicines(csv_path, db_path=DEFAULT_DB_PATH, row_mapper=None,
+                        chunk_size=CHUNK_SIZE, replace=True, snapshot=False):
+    """
+    Replace (or append to) the medicines table from a CSV in one transaction.
+    With snapshot=True the catalog snapshot is rebuilt before the commit.
+
+    Returns: dict with rows loaded, elapsed seconds and rows/sec
+    """
+    if not os.path.exists(csv_path):
+        print(f"✗ CSV file not found: {csv_path}", flush=True)
+        return None
+
+    conn = connect(db_path)
+    conn.isolation_level = None  # explicit BEGIN/COMMIT so DDL joins the transaction
+    start = time.perf_counter()
+    total = 0
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        ensure_medicines_schema(conn)
+        drop_medicine_indexes(conn)
+        previous_ids = {}
+        if replace:
+            for medicine_id, key in conn.execute('SELECT id, row_key FROM medicines WHERE row_key IS NOT NULL'):
+                previous_ids.setdefault(key, medicine_id)
+            conn.execute('DELETE FROM medicines')
+
+        rows = iter_csv_rows(csv_path, row_mapper)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            stored = [with_hashes(row) for row in chunk]
+            conn.executemany(INSERT_WITH_ID_SQL, [row + (previous_ids.pop(row[5], None),) for row in stored])
+            total += len(chunk)
+            print(f"  ... {total:,} rows", flush=True)
+
+        print("  Rebuilding indexes...", flush=True)
+        create_medicine_indexes(conn)
+        components = rebuild_compositions(conn)
+        print(f"  Parsed {components:,} composition components", flush=True)
+        version = bump_catalog_version(conn)
+        if snapshot:
+            refresh_snapshot(db_path, conn, version)
+        conn.execute('COMMIT')
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        print(f"✗ Bulk load failed, catalog unchanged: {e}", flush=True)
+        return None
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"✓ Loaded {total:,} medicines from {csv_path} in {elapsed:.2f}s ({rate:,.0f} rows/sec), catalog v{version}", flush=True)
+    return {'rows': total, 'seconds': round(elapsed, 3), 'rows_per_sec': round(rate, 1), 'version': version}
+
+
+def sync_catalog(csv_path, db_path=DEFAULT_DB_PATH, row_mapper=None, snapshot=False):
+    """
+    Incrementally sync the medicines table with a CSV.
+
+    Rows are matched by row_key and compared by content_hash; only added and
+    changed rows are written and removed rows are tombstoned. The delta is
+    applied to medicines in place inside one transaction, so readers keep
+    seeing the previous catalog until the commit. A shadow table swapped in
+    by rename would rewrite every row for a small delta and lose the ids that
+    inventory and medicine_compositions reference. Tombstones older than
+    TOMBSTONE_KEEP_VERSIONS versions are pruned in the same transaction.
+    With snapshot=True the catalog snapshot is rebuilt before the commit.
+
+    Returns: dict with added/changed/removed/pruned counts and the catalog version
+    """
+    if not os.path.exists(csv_path):
+        print(f"✗ CSV file not found: {csv_path}", flush=True)
+        return None
+
+    conn = connect(db_path)
+    conn.isolation_level = None
+    start = time.perf_counter()
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        ensure_medicines_schema(conn)
+
+        # Current catalog: row_key -> (id, content_hash); duplicates beyond the first are dropped
+        existing = {}
+        duplicate_ids = []
+        unhashed = []  # (id, row_key) of rows loaded before row_key existed
+        for medicine_id, generic, brand, strength, region, city, key, digest in conn.execute(
+                'SELECT id, generic_name, brand_name, strength, region, city, row_key, content_hash FROM medicines ORDER BY id'):
+            if not key:
+                key = row_key(generic, brand, strength)
+                unhashed.append((medicine_id, key))
+            if key in existing:
+                duplicate_ids.append((medicine_id, key, generic, brand))
+                continue
+            existing[key] = (medicine_id, digest or content_hash((generic, brand, strength, region, city)))
+
+        incoming = {}
+        for row in iter_csv_rows(csv_path, row_mapper):
+            stored = with_hashes(row)
+            incoming.setdefault(stored[5], stored)
+
+        added = [row for key, row in incoming.items() if key not in existing]
+        changed = [(row, existing[key][0]) for key, row in incoming.items()
+                   if key in existing and existing[key][1] != row[6]]
+        removed_keys = [key for key in existing if key not in incoming]
+
+        if not added and not changed and not removed_keys and not duplicate_ids and not unhashed:
+            conn.execute('ROLLBACK')
+            version = get_catalog_version(conn)
+            print(f"✓ Catalog already up to date (v{version})", flush=True)
+            if snapshot:
+                refresh_snapshot(db_path)
+            return {'added': 0, 'changed': 0, 'removed': 0, 'pruned': 0, 'version': version, 'seconds': 0.0}
+
+        version = get_catalog_version(conn) + 1
+
+        # Tables created before the row_key index existed
+        create_medicine_indexes(conn)
+
+        # Tombstone removed rows (and duplicate copies of a key)
+        tombstones = [(existing[key][0], key) for key in removed_keys]
+        tombstones.extend((medicine_id, key) for medicine_id, key, _, _ in duplicate_ids)
+        conn.executemany('''
+            INSERT INTO medicine_tombstones (medicine_id, row_key, generic_name, brand_name, catalog_version)
+            SELECT id, ?, generic_name, brand_name, ? FROM medicines WHERE id = ?
+        ''', [(key, version, medicine_id) for medicine_id, key in tombstones])
+        conn.executemany('DELETE FROM medicines WHERE id = ?',
+                         [(medicine_id,) for medicine_id, _ in tombstones])
+
+        # Upsert: changed rows keep their id, new rows get fresh ids
+        conn.executemany('''
+            UPDATE medicines
+            SET generic_name = ?, brand_name = ?, strength = ?, region = ?, city = ?,
+                row_key = ?, content_hash = ?
+            WHERE id = ?
+        ''', [row + (medicine_id,) for row, medicine_id in changed])
+        conn.executemany(INSERT_SQL, added)
+
+        # Backfill hashes for rows loaded before row_key existed
+        conn.executemany('UPDATE medicines SET row_key = ?, content_hash = ? WHERE id = ? AND row_key IS NULL',
+                         [(key, existing[key][1], medicine_id) for medicine_id, key in unhashed])
+
+        # Re-parse compositions only for rows that were touched
+        touched_ids = [medicine_id for medicine_id, _ in tombstones]
+        touched_ids.extend(medicine_id for _, medicine_id in changed)
+        for row in added:
+            new_id = conn.execute('SELECT id FROM medicines WHERE row_key = ?', (row[5],)).fetchone()
+            if new_id:
+                touched_ids.append(new_id[0])
+        rebuild_compositions(conn, touched_ids)
+        pruned = prune_tombstones(conn, version)
+        bump_catalog_version(conn)
+        if snapshot:
+            refresh_snapshot(db_path, conn, version)
+        conn.execute('COMMIT')
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        print(f"✗ Catalog sync failed, catalog unchanged: {e}", flush=True)
+        return None
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    removed = len(removed_keys) + len(duplicate_ids)
+    print(f"✓ Catalog v{version}: +{len(added):,} added, ~{len(changed):,} changed, "
+          f"-{removed:,} removed in {elapsed:.2f}s ({pruned:,} old tombstones pruned)", flush=True)
+    return {'added': len(added), 'changed': len(changed), 'removed': removed, 'pruned': pruned,
+            'version': version, 'seconds': round(elapsed, 3)}
+
+
+def refresh_snapshot(db_path=DEFAULT_DB_PATH, conn=None, version=None):
+    """
+    Rebuild the mmap catalog snapshot workers start from (skipped without numpy).
+    Loaders call this with their open transaction and the version being committed,
+    so workers never see a new version before its snapshot exists. A failed build
+    leaves the old snapshot, which workers reject by version and read SQLite instead.
+    """
+    try:
+        from utils.catalog_snapshot import build_snapshot
+    except ImportError as e:
+        print(f"⚠ Catalog snapshot not built ({e}); workers will load from SQLite", flush=True)
+        return None
+    try:
+        return build_snapshot(db_path, conn=conn, catalog_version=version)
+    except Exception as e:
+        print(f"⚠ Catalog snapshot build failed ({e}); workers will load from SQLite", flush=True)
+        return None
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sync = '--sync' in args
+    args = [arg for arg in args if arg != '--sync']
+    if not args:
+        print("Usage: python -m database.catalog_loader [--sync] <medicines.csv> [pharmacy.db]")
+        sys.exit(1)
+
+    db_path = args[1] if len(args) > 1 else DEFAULT_DB_PATH
+    loader = sync_catalog if sync else bulk_load_medicines
+    enable_wal(db_path)
+    loader(args[0], db_path, snapshot=True)
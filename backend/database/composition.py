@@ -0,0 +1,116 @@
+"""
+Composition parsing for the medicine catalog
+Turns strings like "Amoxycillin (500mg), Clavulanic Acid (125mg)" into
+normalised (ingredient, strength_value, unit) components stored in the
+medicine_compositions table for exact-equivalence lookups.
+"""
+import re
+
+# "<ingredient> (<value><unit>)", components separated by commas or '+'
+COMPONENT_PATTERN = re.compile(r'(?P<ingredient>[^(),+]+?)\s*\(\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[^)]*?)\s*\)')
+# Bare strength column such as "500mg" or "0.05% w/w"
+STRENGTH_PATTERN = re.compile(r'^\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[a-zA-Zµ%][^\s,]*(?:\s*w/[wv])?)\s*$')
+
+UNIT_ALIASES = {
+    'µg': 'mcg',
+    'ug': 'mcg',
+    'gm': 'g',
+    'gms': 'g',
+    'iu': 'iu',
+}
+
+COMPOSITIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS medicine_compositions (
+        medicine_id INTEGER NOT NULL,
+        ingredient TEXT NOT NULL,
+        strength_value REAL NOT NULL,
+        unit TEXT NOT NULL
+    )
+'''
+
+COMPOSITION_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_compositions_component ON medicine_compositions(ingredient, strength_value, unit)',
+    'CREATE INDEX IF NOT EXISTS idx_compositions_medicine ON medicine_compositions(medicine_id)',
+]
+
+
+def normalize_ingredient(name):
+    return ' '.join(name.lower().split())
+
+
+def normalize_strength(value, unit):
+    """Normalise units (g -> mg, µg/ug -> mcg) so equal strengths compare equal"""
+    unit = ''.join(unit.lower().split())
+    unit = UNIT_ALIASES.get(unit, unit)
+    value = float(value)
+    if unit == 'g':
+        value, unit = value * 1000, 'mg'
+    return round(value, 4), unit
+
+
+def parse_composition(text, strength=None):
+    """
+    Parse a composition string into sorted (ingredient, strength_value, unit) tuples.
+
+    Falls back to (text, strength) when the composition carries no bracketed
+    strengths, e.g. generic "Paracetamol" with strength "500mg".
+    Returns an empty list when nothing parseable is found.
+    """
+    if not text:
+        return []
+
+    components = set()
+    for match in COMPONENT_PATTERN.finditer(text):
+        ingredient = normalize_ingredient(match.group('ingredient'))
+        if ingredient:
+            components.add((ingredient, *normalize_strength(match.group('value'), match.group('unit'))))
+
+    if not components and strength and '(' not in text:
+        match = STRENGTH_PATTERN.match(strength)
+        if match:
+            components.add((normalize_ingredient(text), *normalize_strength(match.group('value'), match.group('unit'))))
+
+    return sorted(components)
+
+
+def ensure_compositions_schema(conn):
+    conn.execute(COMPOSITIONS_DDL)
+    for ddl in COMPOSITION_INDEXES:
+        conn.execute(ddl)
+
+
+def rebuild_compositions(conn, medicine_ids=None):
+    """
+    (Re)parse compositions from the medicines table.
+    medicine_ids=None rebuilds everything; otherwise only those rows are refreshed.
+
+    Returns: number of component rows written
+    """
+    ensure_compositions_schema(conn)
+    if medicine_ids is None:
+        # Full rebuild: load without indexes, recreate them afterwards
+        conn.execute('DROP INDEX IF EXISTS idx_compositions_component')
+        conn.execute('DROP INDEX IF EXISTS idx_compositions_medicine')
+        conn.execute('DELETE FROM medicine_compositions')
+        rows = conn.execute('SELECT id, generic_name, strength FROM medicines').fetchall()
+    else:
+        ids = [(medicine_id,) for medicine_id in medicine_ids]
+        conn.executemany('DELETE FROM medicine_compositions WHERE medicine_id = ?', ids)
+        rows = [conn.execute('SELECT id, generic_name, strength FROM medicines WHERE id = ?', medicine_id).fetchone()
+                for medicine_id in ids]
+
+    components = []
+    for row in rows:
+        if row is None:
+            continue
+        medicine_id, generic_name, strength = row
+        components.extend((medicine_id, *component) for component in parse_composition(generic_name, strength))
+
+    conn.executemany('''
+        INSERT INTO medicine_compositions (medicine_id, ingredient, strength_value, unit)
+        VALUES (?, ?, ?, ?)
+    ''', components)
+    if medicine_ids is None:
+        for ddl in COMPOSITION_INDEXES:
+            conn.execute(ddl)
+    return len(components)
@@ -0,0 +1,143 @@
+"""
+Hub inventory feed ingestion
+Loads stock levels per hub from a local CSV/JSON feed into the inventory table
+that find_alternatives joins against for real availability.
+
+Feed rows need a hub and qty, plus either a medicine_id or a brand_name
+(optionally generic_name + strength to pin the exact row):
+    brand_name,generic_name,strength,hub,qty,updated_at
+    Dolo-650,Paracetamol,650mg,Bangalore,120,2026-01-30T10:00:00
+
+Usage (from backend/):
+    python -m database.inventory_feed feeds/hub_stock.csv
+"""
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+if __package__ in (None, ''):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.catalog_loader import DEFAULT_DB_PATH, ensure_medicines_schema, row_key
+from utils.db import connect
+
+
+def ensure_inventory_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            medicine_id INTEGER NOT NULL,
+            hub TEXT NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (medicine_id, hub)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_inventory_hub ON inventory(hub, qty)')
+
+
+def read_feed(feed_path):
+    """Read feed rows (list of dicts) from a .csv or .json file"""
+    if feed_path.lower().endswith('.json'):
+        with open(feed_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('inventory', []) if isinstance(data, dict) else data
+
+    with open(feed_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def _resolve_medicine_id(entry, ids_by_key, ids_by_brand):
+    medicine_id = entry.get('medicine_id')
+    if medicine_id not in (None, ''):
+        return int(medicine_id)
+
+    brand = str(entry.get('brand_name') or '').strip()
+    generic = str(entry.get('generic_name') or '').strip()
+    strength = str(entry.get('strength') or '').strip()
+    if brand and generic:
+        medicine_id = ids_by_key.get(row_key(generic, brand, strength))
+        if medicine_id:
+            return medicine_id
+    return ids_by_brand.get(brand.lower()) if brand else None
+
+
+def ingest_inventory(feed_path, db_path=DEFAULT_DB_PATH):
+    """
+    Replace stock levels for every hub present in the feed, in one transaction.
+
+    Returns: dict with rows stored, rows skipped and the inventory version
+    """
+    if not os.path.exists(feed_path):
+        print(f"✗ Inventory feed not found: {feed_path}", flush=True)
+        return None
+
+    entries = read_feed(feed_path)
+    conn = connect(db_path)
+    conn.isolation_level = None
+    start = time.perf_counter()
+    now = datetime.now().isoformat()
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        ensure_medicines_schema(conn)
+        ensure_inventory_schema(conn)
+
+        ids_by_key = {}
+        ids_by_brand = {}
+        for medicine_id, brand, key in conn.execute('SELECT id, brand_name, row_key FROM medicines ORDER BY id'):
+            if key:
+                ids_by_key.setdefault(key, medicine_id)
+            ids_by_brand.setdefault(brand.lower(), medicine_id)
+
+        rows = {}
+        skipped = 0
+        for entry in entries:
+            try:
+                hub = str(entry.get('hub') or '').strip()
+                qty = int(float(entry.get('qty') or 0))
+                medicine_id = _resolve_medicine_id(entry, ids_by_key, ids_by_brand)
+            except (TypeError, ValueError, AttributeError):
+                skipped += 1
+                continue
+            if not hub or not medicine_id:
+                skipped += 1
+                continue
+            rows[(medicine_id, hub)] = (medicine_id, hub, max(qty, 0), entry.get('updated_at') or now)
+
+        # The feed is a snapshot per hub: hubs it mentions are replaced wholesale
+        hubs = sorted({hub for _, hub in rows})
+        conn.executemany('DELETE FROM inventory WHERE hub = ?', [(hub,) for hub in hubs])
+        conn.executemany('''
+            INSERT INTO inventory (medicine_id, hub, qty, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', list(rows.values()))
+
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'inventory_version'").fetchone()
+        version = (int(row[0]) if row else 0) + 1
+        conn.execute('''
+            INSERT INTO catalog_meta (key, value) VALUES ('inventory_version', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (str(version),))
+        conn.execute('COMMIT')
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        print(f"✗ Inventory ingestion failed, stock unchanged: {e}", flush=True)
+        return None
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ Inventory v{version}: {len(rows):,} stock rows for {len(hubs)} hubs "
+          f"({skipped} skipped) in {elapsed:.2f}s", flush=True)
+    return {'rows': len(rows), 'skipped': skipped, 'hubs': hubs, 'version': version}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python -m database.inventory_feed <feed.csv|feed.json> [pharmacy.db]")
+        sys.exit(1)
+    ingest_inventory(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB_PATH)
@@ -3,8 +3,12 @@ Load all medicine datasets into SQLite database
 """
 
 import sqlite3
-import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.catalog_loader import bulk_load_medicines, combined_row
 
 DB_PATH = 'database/pharmacy.db'
 
@@ -17,7 +21,7 @@ conn = sqlite3.connect(DB_PATH)
 cursor = conn.cursor()
 
 # Update schema to include region column
-print("\n[1/3] Updating database schema...")
+print("\n[1/2] Updating database schema...")
 try:
     cursor.execute('''
         ALTER TABLE medicines ADD COLUMN region TEXT DEFAULT 'Karnataka'
@@ -29,51 +33,20 @@ except sqlite3.OperationalError as e:
     else:
         print(f"⚠ Schema update: {e}")
 
-# Clear existing medicines
-print("\n[2/3] Clearing existing medicines...")
-cursor.execute('DELETE FROM medicines')
-conn.commit()
-print("✓ Cleared existing data")
-
-# Load combined dataset
-print("\n[3/3] Loading combined medicine dataset...")
-try:
-    if os.path.exists('database/medicines_all.csv'):
-        df = pd.read_csv('database/medicines_all.csv')
-        print(f"  Total medicines to load: {len(df)}")
-        
-        # Insert into database
-        inserted = 0
-        for _, row in df.iterrows():
-            try:
-                cursor.execute('''
-                    INSERT INTO medicines (generic_name, brand_name, strength, region)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    str(row.get('name', '')),
-                    str(row.get('manufacturer', '')),
-                    str(row.get('strength', '')),
-                    str(row.get('region', 'Karnataka'))
-                ))
-                inserted += 1
-            except Exception as e:
-                continue
-        
-        conn.commit()
-        print(f"✓ Inserted {inserted} medicines into database")
-        
+# Bulk load combined dataset (replaces existing rows in the same transaction)
+print("\n[2/2] Loading combined medicine dataset...")
+if os.path.exists('database/medicines_all.csv'):
+    stats = bulk_load_medicines('database/medicines_all.csv', db_path=DB_PATH, row_mapper=combined_row)
+    
+    if stats:
         # Show regional breakdown
         print("\n  Regional breakdown:")
         cursor.execute('SELECT region, COUNT(*) FROM medicines GROUP BY region')
         for region, count in cursor.fetchall():
             print(f"    {region}: {count} medicines")
-        
-    else:
-        print("✗ medicines_all.csv not found. Run download_medicines.py first.")
-        
-except Exception as e:
-    print(f"✗ Error loading data: {e}")
-    conn.rollback()
+    
+else:
+    print("✗ medicines_all.csv not found. Run download_medicines.py first.")
 
 # Verify
 print("\n" + "=" * 70)
@@ -87,6 +87,17 @@ class PrescriptionDB:
         self._save()
         return self.data['prescriptions'][prescription_id]
     
+    def save_prescriptions(self, prescriptions):
+        """Save or update many prescriptions ({id: data}) with a single write"""
+        now = datetime.now().isoformat()
+        for prescription_id, prescription_data in prescriptions.items():
+            self.data['prescriptions'][prescription_id] = {
+                **prescription_data,
+                'updated_at': now
+            }
+        self._save()
+        return len(prescriptions)
+    
     def update_prescription(self, prescription_id, updates):
         """Update specific fields of a prescription"""
         if prescription_id in self.data['prescriptions']:
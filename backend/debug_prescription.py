@@ -86,7 +86,7 @@ medicines_std = parser_std.parse(ocr_hw)
 print(f"  Detected: {len(medicines_std)} medicines")
 
 print("\n[3b] Lenient Parser (for handwriting):")
-parser_lenient = PrescriptionParser(lenient_mode=True)
+parser_lenient = PrescriptionParser(lenient_mode=True, user_region='Karnataka')
 medicines_lenient = parser_lenient.parse(ocr_hw)
 print(f"  Detected: {len(medicines_lenient)} medicines")
 
@@ -128,7 +128,8 @@ if medicines_lenient:
         suggestions = learner.suggest_correction(
             med['medicine_name'],
             region='All',
-            threshold=0.6
+            threshold=0.6,
+            user_region='Karnataka'
         )
         
         if suggestions:
@@ -0,0 +1,110 @@
+"""
+Test multi-prescription batching: prompt wrapping and reply splitting (no API calls)
+Run: python test_batch_ocr.py  (or pytest test_batch_ocr.py)
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from utils.batch_ocr import build_batch_prompt, chunk, image_label, split_batch_response
+
+PARA = {'medicine_name': 'Paracetamol', 'dosage': '500mg'}
+AMOX = {'medicine_name': 'Amoxicillin', 'dosage': '250mg'}
+CETI = {'medicine_name': 'Cetirizine', 'dosage': '10mg'}
+
+
+def _reply(entries):
+    return json.dumps({'prescriptions': entries})
+
+
+def test_split_in_order():
+    content = _reply([{'image': 1, 'medicines': [PARA]}, {'image': 2, 'medicines': [AMOX, CETI]}])
+    assert split_batch_response(content, 2) == [[PARA], [AMOX, CETI]]
+
+
+def test_split_uses_image_index_not_position():
+    content = _reply([{'image': 3, 'medicines': [CETI]}, {'image': 1, 'medicines': [PARA]}])
+    assert split_batch_response(content, 3) == [[PARA], [], [CETI]]
+
+
+def test_split_string_and_missing_indices():
+    content = _reply([{'image': '2', 'medicines': [AMOX]}, {'medicines': [PARA]}, {'image': 'first', 'medicines': [CETI]}])
+    # No index -> position + 1; unparseable index -> position
+    assert split_batch_response(content, 3) == [[], [AMOX, PARA], [CETI]]
+
+
+def test_split_skipped_images_are_empty():
+    content = _reply([{'image': 2, 'medicines': [AMOX]}])
+    assert split_batch_response(content, 4) == [[], [AMOX], [], []]
+
+
+def test_split_drops_out_of_range_and_junk():
+    content = _reply([
+        {'image': 0, 'medicines': [PARA]},
+        {'image': 5, 'medicines': [PARA]},
+        {'image': 1, 'medicines': [AMOX, 'Paracetamol', None]},
+        {'image': 2, 'medicines': 'none'},
+        'stray text',
+    ])
+    assert split_batch_response(content, 2) == [[AMOX], []]
+
+
+def test_split_bare_list_of_lists():
+    content = json.dumps([[PARA], [], [AMOX]])
+    assert split_batch_response(content, 3) == [[PARA], [], [AMOX]]
+
+
+def test_split_bare_list_of_entries():
+    content = json.dumps([{'image': 2, 'medicines': [CETI]}, {'image': 1, 'medicines': [PARA]}])
+    assert split_batch_response(content, 2) == [[PARA], [CETI]]
+
+
+def test_split_strips_markdown_fences():
+    content = "```json\n" + _reply([{'image': 1, 'medicines': [PARA]}]) + "\n```"
+    assert split_batch_response(content, 1) == [[PARA]]
+
+
+def test_split_merges_repeated_image():
+    content = _reply([{'image': 1, 'medicines': [PARA]}, {'image': 1, 'medicines': [AMOX]}])
+    assert split_batch_response(content, 1) == [[PARA, AMOX]]
+
+
+def test_split_rejects_unrecognised_replies():
+    for content in ('not json', '{"medicines": []}', '{"prescriptions": {"image": 1}}', '"text"'):
+        try:
+            split_batch_response(content, 2)
+            assert False, f"expected ValueError for {content!r}"
+        except ValueError:
+            pass
+
+
+def test_build_batch_prompt():
+    prompt = build_batch_prompt("BASE PROMPT", 3)
+    assert "3 SEPARATE prescription images" in prompt
+    assert '"Image 1" to "Image 3"' in prompt
+    assert '{"image": 3, "medicines": [ ... ]}' in prompt
+    assert prompt.index("BASE PROMPT") < prompt.index("OUTPUT FOR THIS BATCH")
+    assert image_label(0) == "Image 1:"
+
+
+def test_chunk():
+    assert chunk([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert chunk([1, 2], 4) == [[1, 2]]
+    assert chunk([1, 2], 0) == [[1], [2]]
+    assert chunk([], 3) == []
+
+
+if __name__ == '__main__':
+    tests = [(name, func) for name, func in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✓ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {name}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
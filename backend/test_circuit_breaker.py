@@ -0,0 +1,141 @@
+"""
+Test the per-provider circuit breaker (no API calls)
+Run: python test_circuit_breaker.py  (or pytest test_circuit_breaker.py)
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+def _fail():
+    raise RuntimeError("provider down")
+
+
+def _open_breaker():
+    breaker = CircuitBreaker('test')
+    for _ in range(circuit_breaker.MIN_CALLS):
+        try:
+            breaker.call(_fail)
+        except RuntimeError:
+            pass
+    return breaker
+
+
+def _expire_open(breaker):
+    breaker._opened_at -= circuit_breaker.OPEN_SECONDS + 1
+
+
+def test_opens_after_failure_rate():
+    breaker = _open_breaker()
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    try:
+        breaker.call(lambda: 'ok')
+        assert False, "open circuit should fail fast"
+    except CircuitOpenError as e:
+        assert e.provider == 'test'
+
+
+def test_stays_closed_below_min_calls():
+    breaker = CircuitBreaker('test')
+    for _ in range(circuit_breaker.MIN_CALLS - 1):
+        try:
+            breaker.call(_fail)
+        except RuntimeError:
+            pass
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes():
+    breaker = _open_breaker()
+    _expire_open(breaker)
+    assert not breaker.is_open()
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+    assert breaker.health()['calls'] == 1
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = _open_breaker()
+    _expire_open(breaker)
+    try:
+        breaker.call(_fail)
+    except RuntimeError:
+        pass
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+
+
+def test_half_open_allows_one_probe():
+    breaker = _open_breaker()
+    _expire_open(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    assert breaker.is_open()
+
+
+def test_slow_success_opens():
+    breaker = CircuitBreaker('test')
+    for _ in range(circuit_breaker.MIN_CALLS):
+        breaker.record_success(circuit_breaker.SLOW_CALL_SECONDS + 1)
+    assert breaker.state == OPEN
+
+
+def test_cancelled_half_open_probe_is_released():
+    """A probe cancelled mid-call (lost hedge) must not lock the provider out"""
+    breaker = _open_breaker()
+    _expire_open(breaker)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def slow_call():
+            started.set()
+            await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(breaker.call_async(slow_call))
+        await started.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open()
+    assert breaker.allow()
+
+
+def test_interrupted_sync_probe_is_released():
+    breaker = _open_breaker()
+    _expire_open(breaker)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    try:
+        breaker.call(interrupted)
+    except KeyboardInterrupt:
+        pass
+    assert not breaker.is_open()
+
+
+if __name__ == '__main__':
+    tests = [(name, func) for name, func in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✓ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {name}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
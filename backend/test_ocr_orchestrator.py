@@ -0,0 +1,203 @@
+"""
+Test hedged OCR orchestration: launch order, hedge delay and confidence gate (no API calls)
+Run: python test_ocr_orchestrator.py  (or pytest test_ocr_orchestrator.py)
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from utils import ocr_orchestrator, progress
+from utils.ocr_orchestrator import HedgedOrchestrator, passes_gate
+
+GOOD = [{'medicine_name': 'Paracetamol', 'confidence': 0.95}]
+WEAK = [{'medicine_name': 'Paracetamol', 'confidence': 0.5}]
+WEAKER = [{'medicine_name': 'Paracetamol', 'confidence': 0.3}]
+
+
+def _attempt(name, result, delay=0.0, calls=None):
+    def func():
+        if calls is not None:
+            calls.append(name)
+        time.sleep(delay)
+        return result
+    return name, func
+
+
+def _async_attempt(name, result, delay=0.0, calls=None, cancelled=None):
+    async def func():
+        if calls is not None:
+            calls.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(name)
+            raise
+        return result
+    return name, func
+
+
+def test_gate():
+    assert not passes_gate([])
+    assert not passes_gate([{'medicine_name': 'Unknown', 'confidence': 1.0}])
+    assert not passes_gate([{'medicine_name': '  ', 'confidence': 1.0}])
+    assert not passes_gate(WEAK)
+    assert passes_gate(GOOD)
+    assert passes_gate(WEAK, min_confidence=0.5)
+
+
+def test_fast_primary_skips_hedge():
+    calls = []
+    orchestrator = HedgedOrchestrator(hedge_delay=0.5, timeout=5)
+    result, name = orchestrator.run([_attempt('gemini', GOOD, calls=calls),
+                                     _attempt('claude', GOOD, calls=calls)])
+    assert (result, name) == (GOOD, 'gemini')
+    assert calls == ['gemini']
+
+
+def test_slow_primary_is_hedged():
+    calls = []
+    orchestrator = HedgedOrchestrator(hedge_delay=0.05, timeout=5)
+    result, name = orchestrator.run([_attempt('gemini', GOOD, delay=0.5, calls=calls),
+                                     _attempt('claude', GOOD, calls=calls)])
+    assert name == 'claude'
+    assert calls == ['gemini', 'claude']
+
+
+def test_rejected_primary_hedges_without_delay():
+    calls = []
+    orchestrator = HedgedOrchestrator(hedge_delay=5, timeout=10)
+    start = time.monotonic()
+    result, name = orchestrator.run([_attempt('gemini', WEAK, calls=calls),
+                                     _attempt('claude', GOOD, calls=calls)])
+    assert name == 'claude'
+    assert calls == ['gemini', 'claude']
+    assert time.monotonic() - start < 1, "a gate rejection should not wait for the hedge delay"
+
+
+def test_best_result_when_none_pass():
+    orchestrator = HedgedOrchestrator(hedge_delay=0.01, timeout=5)
+    result, name = orchestrator.run([_attempt('gemini', WEAKER),
+                                     _attempt('claude', WEAK),
+                                     _attempt('mistral', [])])
+    assert (result, name) == (WEAK, 'claude')
+
+
+def test_failed_attempt_falls_through():
+    def broken():
+        raise RuntimeError("provider down")
+
+    orchestrator = HedgedOrchestrator(hedge_delay=5, timeout=5)
+    result, name = orchestrator.run([('gemini', broken), _attempt('claude', GOOD)])
+    assert (result, name) == (GOOD, 'claude')
+
+
+def test_timeout_returns_empty():
+    release = threading.Event()
+
+    def stuck():
+        release.wait(5)
+        return GOOD
+
+    orchestrator = HedgedOrchestrator(hedge_delay=0.01, timeout=0.2)
+    start = time.monotonic()
+    try:
+        assert orchestrator.run([('gemini', stuck), ('claude', stuck)]) == ([], None)
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+
+
+def test_async_slow_primary_is_hedged_and_cancelled():
+    calls, cancelled = [], []
+    orchestrator = HedgedOrchestrator(hedge_delay=0.05, timeout=5)
+    result, name = asyncio.run(orchestrator.run_async([
+        _async_attempt('gemini', GOOD, delay=5, calls=calls, cancelled=cancelled),
+        _async_attempt('claude', GOOD, calls=calls),
+    ]))
+    assert (result, name) == (GOOD, 'claude')
+    assert calls == ['gemini', 'claude']
+    assert cancelled == ['gemini']
+
+
+def test_async_gate_order_and_fallback():
+    calls = []
+    orchestrator = HedgedOrchestrator(hedge_delay=5, timeout=5)
+    result, name = asyncio.run(orchestrator.run_async([
+        _async_attempt('gemini', WEAKER, calls=calls),
+        _async_attempt('claude', WEAK, calls=calls),
+    ]))
+    assert (result, name) == (WEAK, 'claude')
+    assert calls == ['gemini', 'claude']
+
+
+def test_async_timeout_cancels_pending():
+    cancelled = []
+    orchestrator = HedgedOrchestrator(hedge_delay=0.01, timeout=0.2)
+    result = asyncio.run(orchestrator.run_async([
+        _async_attempt('gemini', GOOD, delay=5, cancelled=cancelled),
+        _async_attempt('claude', GOOD, delay=5, cancelled=cancelled),
+    ]))
+    assert result == ([], None)
+    assert sorted(cancelled) == ['claude', 'gemini']
+
+
+def test_report_inside_attempt_reaches_bound_channel():
+    channel = progress.ProgressChannel()
+
+    def reporting():
+        progress.report('extract', 'Claude extraction', engine='claude')
+        return GOOD
+
+    async def reporting_async():
+        await asyncio.sleep(0)
+        return reporting()
+
+    token = progress.bind(channel)
+    try:
+        HedgedOrchestrator(hedge_delay=5, timeout=5).run([('claude', reporting)])
+        asyncio.run(HedgedOrchestrator(hedge_delay=5, timeout=5).run_async(
+            [('claude', reporting_async)]))
+    finally:
+        progress.unbind(token)
+    stages = [(event, data['stage']) for event, data in channel.events]
+    assert stages == [('stage', 'extract'), ('stage', 'extract')]
+
+
+def test_hedge_delay_follows_measured_latency():
+    orchestrator = HedgedOrchestrator(timeout=60)
+    assert orchestrator.hedge_delay_for('claude') == ocr_orchestrator.DEFAULT_HEDGE_DELAY
+    for seconds in range(1, 21):
+        orchestrator.record_latency('claude', float(seconds))
+    assert orchestrator.hedge_delay_for('claude') == 19.0  # p95 of 1..20
+    assert orchestrator.hedge_delay_for('pixtral') == ocr_orchestrator.DEFAULT_HEDGE_DELAY
+    for _ in range(ocr_orchestrator.HEDGE_LATENCY_SAMPLES):
+        orchestrator.record_latency('claude', 0.1)
+    assert orchestrator.hedge_delay_for('claude') == ocr_orchestrator.MIN_HEDGE_DELAY
+    assert HedgedOrchestrator(hedge_delay=3).hedge_delay_for('claude') == 3
+
+
+def test_attempt_latency_is_recorded():
+    orchestrator = HedgedOrchestrator(timeout=5)
+    orchestrator.run([_attempt('claude', GOOD, delay=0.05)])
+    time.sleep(0.05)
+    samples = orchestrator._latencies['claude']
+    assert len(samples) == 1 and samples[0] >= 0.05
+
+
+if __name__ == '__main__':
+    tests = [(name, func) for name, func in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✓ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {name}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
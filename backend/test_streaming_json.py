@@ -0,0 +1,144 @@
+"""
+Test the incremental JSON parser used for streamed OCR replies (no API calls)
+Run: python test_streaming_json.py  (or pytest test_streaming_json.py)
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from utils.streaming_json import IncrementalJSONParser, StreamTruncatedError, parse_medicines, stream_refined
+
+MEDICINES = [
+    {'medicine_name': 'Vitamin {D3} [60K]', 'dosage': '1 cap', 'frequency': 'weekly'},
+    {'medicine_name': 'Dr. "Reddy\'s" Syrup', 'dosage': '5ml', 'notes': 'C:\\path\\ "quoted" }]'},
+    {'medicine_name': 'Amoxicillin', 'timing': {'morning': True, 'night': [1, [2, 3]]},
+     'alternatives': [{'name': 'Mox'}, {'name': 'Novamox'}]},
+    {'name': 'Cetirizine', 'dosage': '10mg'},
+]
+REPLY = json.dumps({'medicines': MEDICINES}, indent=2)
+
+
+def _feed_all(parser, chunks):
+    out = []
+    for chunk in chunks:
+        out.extend(parser.feed(chunk))
+    return out
+
+
+def _stream(chunks):
+    return list(stream_refined(chunks, lambda items: items, lambda items: items))
+
+
+def test_whole_reply():
+    parser = IncrementalJSONParser()
+    assert parser.feed(REPLY) == MEDICINES
+    assert parser.emitted == len(MEDICINES)
+    assert parser.complete
+
+
+def test_character_by_character():
+    parser = IncrementalJSONParser()
+    assert _feed_all(parser, list(REPLY)) == MEDICINES
+    assert parser.complete
+
+
+def test_random_chunking():
+    rng = random.Random(42)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(REPLY)), rng.randint(1, 40)))
+        chunks = [REPLY[i:j] for i, j in zip([0] + cuts, cuts + [len(REPLY)])]
+        assert _feed_all(IncrementalJSONParser(), chunks) == MEDICINES
+
+
+def test_emits_each_object_when_it_closes():
+    parser = IncrementalJSONParser()
+    first_end = REPLY.index('"weekly"') + len('"weekly"')
+    first_end = REPLY.index('}', first_end) + 1
+    assert parser.feed(REPLY[:first_end - 1]) == []
+    assert parser.feed(REPLY[first_end - 1:first_end]) == [MEDICINES[0]]
+    assert not parser.complete
+
+
+def test_braces_and_escapes_inside_strings():
+    text = '[{"medicine_name": "a \\\\", "dosage": "}"}, {"medicine_name": "b \\"{[", "dosage": "]"}]'
+    parser = IncrementalJSONParser()
+    assert _feed_all(parser, list(text)) == json.loads(text)
+    assert parser.complete
+
+
+def test_nested_objects_are_not_emitted_separately():
+    parser = IncrementalJSONParser()
+    emitted = parser.feed(json.dumps([MEDICINES[2]]))
+    assert emitted == [MEDICINES[2]], "alternatives inside a medicine must stay inside it"
+
+
+def test_markdown_and_prose_ignored():
+    text = "Here is the result:\n```json\n" + REPLY + "\n```\nLet me know if you need more."
+    parser = IncrementalJSONParser()
+    assert parser.feed(text) == MEDICINES
+    assert parser.complete
+
+
+def test_non_medicine_objects_filtered():
+    text = json.dumps({'patient': {'name': 'A'}, 'medicines': [{'dosage': '5ml'}, MEDICINES[3]],
+                       'notes': [{'text': 'after food'}]})
+    assert IncrementalJSONParser().feed(text) == [MEDICINES[3]]
+    assert len(IncrementalJSONParser(predicate=None).feed(text)) == 3
+
+
+def test_stream_refined_applies_steps_per_item():
+    seen = []
+
+    def normalize(items):
+        seen.append(len(items))
+        return [dict(item, normalized=True) for item in items]
+
+    results = list(stream_refined([REPLY[:200], REPLY[200:]], normalize, lambda items: items))
+    assert [r.get('medicine_name') or r.get('name') for r in results] == \
+        [m.get('medicine_name') or m.get('name') for m in MEDICINES]
+    assert all(r['normalized'] for r in results)
+    assert seen == [1] * len(MEDICINES)
+
+
+def test_truncated_stream_raises():
+    cut = REPLY.index('Amoxicillin')
+    chunks = [REPLY[:cut]]
+    results = []
+    try:
+        for item in stream_refined(chunks, lambda items: items, lambda items: items):
+            results.append(item)
+        assert False, "expected StreamTruncatedError"
+    except StreamTruncatedError:
+        pass
+    assert results == MEDICINES[:2]
+
+
+def test_full_parse_fallback():
+    # Nothing emitted incrementally (no objects in an array): the full reply is parsed once
+    text = '```json\n[["not", "objects"]]\n```'
+    assert _stream([text]) == [['not', 'objects']]
+    assert _stream(['   ']) == []
+    assert _stream(['no json here']) == []
+
+
+def test_parse_medicines_shapes():
+    assert parse_medicines(REPLY) == MEDICINES
+    assert parse_medicines(json.dumps(MEDICINES)) == MEDICINES
+    assert parse_medicines('"text"') == []
+
+
+if __name__ == '__main__':
+    tests = [(name, func) for name, func in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✓ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {name}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
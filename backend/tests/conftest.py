@@ -0,0 +1,44 @@
+"""
+Shared fixtures for the backend unit tests (no API calls)
+Run from backend/: python -m pytest tests
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import close_connections
+
+
+@pytest.fixture(autouse=True)
+def _close_pooled_connections():
+    """Pooled per-thread connections would otherwise outlive each test's temp database"""
+    yield
+    close_connections()
+
+
+@pytest.fixture
+def catalog_db(tmp_path):
+    """Factory for a pharmacy.db with a medicines table: catalog_db([(generic, brand, strength, region), ...])"""
+    def make(rows, name='pharmacy.db'):
+        db_path = str(tmp_path / name)
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE medicines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                generic_name TEXT,
+                brand_name TEXT,
+                strength TEXT,
+                region TEXT,
+                city TEXT
+            )
+        ''')
+        conn.executemany('INSERT INTO medicines (generic_name, brand_name, strength, region) VALUES (?, ?, ?, ?)',
+                         rows)
+        conn.commit()
+        conn.close()
+        return db_path
+    return make
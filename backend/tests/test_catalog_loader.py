@@ -0,0 +1,115 @@
+"""Bulk load and incremental sync of the medicines table (database.catalog_loader)"""
+import csv
+import sqlite3
+
+import pytest
+
+from database import catalog_loader
+from database.catalog_loader import bulk_load_medicines, sync_catalog
+
+ROWS = [
+    ('Paracetamol', 'Dolo', '650mg', 'Karnataka'),
+    ('Paracetamol', 'Crocin', '500mg', 'Tamil Nadu'),
+    ('Pantoprazole', 'Pantocid', '40mg', 'Maharashtra'),
+]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'medicines.csv'), str(tmp_path / 'pharmacy.db')
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['generic_name', 'brand_name', 'strength', 'region'])
+        writer.writerows(rows)
+
+
+def fetch(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def ids_by_brand(db_path):
+    return dict(fetch(db_path, 'SELECT brand_name, id FROM medicines'))
+
+
+def version(db_path):
+    return int(fetch(db_path, "SELECT value FROM catalog_meta WHERE key = 'version'")[0][0])
+
+
+def test_bulk_load_skips_invalid_rows_and_bumps_version(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, ROWS + [('', 'NoGeneric', '10mg', 'Delhi')])
+    result = bulk_load_medicines(csv_path, db_path)
+    assert result['rows'] == 3 and result['version'] == 1
+    assert fetch(db_path, "SELECT city FROM medicines WHERE brand_name = 'Dolo'") == [('Bangalore',)]
+    assert fetch(db_path, 'SELECT COUNT(*) FROM medicine_compositions')[0][0] >= 3
+
+
+def test_bulk_reload_keeps_ids_by_row_key(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, ROWS)
+    bulk_load_medicines(csv_path, db_path)
+    before = ids_by_brand(db_path)
+    write_csv(csv_path, list(reversed(ROWS)))
+    bulk_load_medicines(csv_path, db_path)
+    assert ids_by_brand(db_path) == before
+    assert version(db_path) == 2
+
+
+def test_sync_applies_add_update_remove(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, ROWS)
+    bulk_load_medicines(csv_path, db_path)
+    before = ids_by_brand(db_path)
+
+    write_csv(csv_path, [
+        ('Paracetamol', 'Dolo', '650mg', 'Delhi'),  # changed region
+        ('Pantoprazole', 'Pantocid', '40mg', 'Maharashtra'),  # unchanged
+        ('Azithromycin', 'Azithral', '500mg', 'West Bengal'),  # added
+    ])  # Crocin removed
+    result = sync_catalog(csv_path, db_path)
+    assert (result['added'], result['changed'], result['removed']) == (1, 1, 1)
+    assert result['version'] == version(db_path) == 2
+
+    after = ids_by_brand(db_path)
+    assert after['Dolo'] == before['Dolo'] and after['Pantocid'] == before['Pantocid']
+    assert 'Crocin' not in after and 'Azithral' in after
+    assert fetch(db_path, "SELECT region, city FROM medicines WHERE brand_name = 'Dolo'") == [('Delhi', 'Delhi')]
+    assert fetch(db_path, 'SELECT medicine_id, brand_name, catalog_version FROM medicine_tombstones') == [
+        (before['Crocin'], 'Crocin', 2)]
+    # Compositions follow the delta
+    assert fetch(db_path, 'SELECT COUNT(*) FROM medicine_compositions WHERE medicine_id = ?',
+                 (before['Crocin'],))[0][0] == 0
+    assert fetch(db_path, 'SELECT COUNT(*) FROM medicine_compositions WHERE medicine_id = ?',
+                 (after['Azithral'],))[0][0] > 0
+
+
+def test_sync_without_changes_keeps_version(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, ROWS)
+    bulk_load_medicines(csv_path, db_path)
+    result = sync_catalog(csv_path, db_path)
+    assert (result['added'], result['changed'], result['removed']) == (0, 0, 0)
+    assert version(db_path) == 1
+
+
+def test_sync_prunes_old_tombstones(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, ROWS)
+    bulk_load_medicines(csv_path, db_path)
+
+    # Alternately drop and restore Crocin: one tombstone every other version
+    for i in range(2 * catalog_loader.TOMBSTONE_KEEP_VERSIONS):
+        write_csv(csv_path, ROWS if i % 2 else ROWS[:1] + ROWS[2:])
+        assert sync_catalog(csv_path, db_path) is not None
+
+    current = version(db_path)
+    versions = [v for (v,) in fetch(db_path, 'SELECT catalog_version FROM medicine_tombstones')]
+    assert versions and min(versions) > current - catalog_loader.TOMBSTONE_KEEP_VERSIONS
+    assert len(versions) == catalog_loader.TOMBSTONE_KEEP_VERSIONS // 2
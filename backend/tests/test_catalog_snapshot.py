@@ -0,0 +1,72 @@
+"""Memory-mapped catalog snapshot (utils.catalog_snapshot)"""
+import sqlite3
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from utils.catalog_snapshot import CatalogSnapshot, build_snapshot, load_snapshot, snapshot_path_for
+
+ROWS = [
+    ('Paracetamol', 'Dolo', '650mg', 'Karnataka'),
+    ('Pantoprazole', 'Pantocid', '40mg', None),
+    ('paracetamol', 'Crocin', None, 'Tamil Nadu'),
+    ('Azithromycin', 'Azithral', '500mg', 'Karnataka'),
+    (None, 'Orphan', '10mg', 'Delhi'),
+    ('Ibuprofen', '', '400mg', 'Delhi'),
+]
+
+
+@pytest.fixture
+def db_path(catalog_db):
+    return catalog_db(ROWS)
+
+
+def set_version(db_path, version):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('version', ?)", (str(version),))
+    conn.commit()
+    conn.close()
+
+
+def test_round_trip_skips_rows_without_names(db_path):
+    snapshot = CatalogSnapshot(build_snapshot(db_path))
+    rows = [snapshot.row(i) for i in range(len(snapshot))]
+    assert [row[2] for row in rows] == ['Azithral', 'Pantocid', 'Dolo', 'Crocin']  # by lower-cased generic, id
+    assert rows[1] == (2, 'Pantoprazole', 'Pantocid', '40mg', None, None)
+    assert rows[3][3] is None
+
+
+def test_lookups_are_case_insensitive(db_path):
+    snapshot = CatalogSnapshot(build_snapshot(db_path))
+    assert [snapshot.row(i)[2] for i in snapshot.generic_range('PARACETAMOL')] == ['Dolo', 'Crocin']
+    assert len(snapshot.generic_range('Ibuprofen')) == 0
+    assert snapshot.row(snapshot.find_brand('crocin'))[0] == 3
+    assert snapshot.find_brand('Orphan') is None
+    assert snapshot.row(snapshot.find_id(4))[2] == 'Azithral'
+    assert snapshot.find_id(5) is None
+
+
+def test_load_rejects_a_stale_version(db_path):
+    set_version(db_path, 3)
+    build_snapshot(db_path)
+    assert load_snapshot(db_path).catalog_version == 3
+
+    set_version(db_path, 4)
+    assert load_snapshot(db_path) is None
+    build_snapshot(db_path)
+    assert load_snapshot(db_path).catalog_version == 4
+
+
+def test_loader_version_is_written_before_commit(db_path):
+    path = build_snapshot(db_path, catalog_version=7)
+    assert path == snapshot_path_for(db_path)
+    assert CatalogSnapshot(path).catalog_version == 7
+    assert load_snapshot(db_path) is None  # the database is still at v0
+
+
+def test_unreadable_snapshot_falls_back(db_path):
+    with open(snapshot_path_for(db_path), 'wb') as f:
+        f.write(b'not a snapshot')
+    assert load_snapshot(db_path) is None
@@ -0,0 +1,118 @@
+"""Columnar catalog, region-first tiered search and the match cache in utils.medicine_matcher"""
+import sqlite3
+
+import pytest
+
+from utils import medicine_matcher
+from utils.medicine_matcher import MedicineCatalog, MedicineMatcher
+
+ROWS = [
+    ('Paracetamol', 'Dolo', '650mg', 'Karnataka'),
+    ('Paracetamol', 'Calpol', '500mg', 'National'),
+    ('Pantoprazole', 'Pantocid', '40mg', 'National'),
+    ('Azithromycin', 'Azithral', '500mg', 'Tamil Nadu'),
+    ('Paracetamol', 'Crocin', '650mg', 'Tamil Nadu'),
+]
+
+
+@pytest.fixture
+def matcher(catalog_db):
+    return MedicineMatcher(catalog_db(ROWS))
+
+
+@pytest.fixture
+def scanned(monkeypatch):
+    """Number of candidates handed to rapidfuzz per find_matches call"""
+    sizes = []
+    extract = medicine_matcher.process.extract
+
+    def counting_extract(query, choices, **kwargs):
+        sizes.append(len(choices))
+        return extract(query, choices, **kwargs)
+
+    monkeypatch.setattr(medicine_matcher.process, 'extract', counting_extract)
+    return sizes
+
+
+def test_search_tiers_order():
+    catalog = MedicineCatalog(sorted(ROWS, key=lambda row: row[3]))
+    assert catalog.search_tiers('All', 'Tamil Nadu') == ['Tamil Nadu', 'National', 'Karnataka']
+    assert catalog.search_tiers('All', 'National') == ['National', 'Karnataka', 'Tamil Nadu']
+    # No user region, an unknown one, or an explicit region filter: a single partition
+    assert catalog.search_tiers('All') == ['All']
+    assert catalog.search_tiers('All', 'Goa') == ['All']
+    assert catalog.search_tiers('Karnataka', 'Tamil Nadu') == ['Karnataka']
+
+
+def test_strong_hit_in_user_region_stops_early(matcher, scanned):
+    matches = matcher.find_matches('Paracetamol Dolo 650mg', user_region='Karnataka', top_n=1)
+    assert matches[0]['brand'] == 'Dolo'
+    assert matches[0]['score'] >= medicine_matcher.REGION_CUTOFF
+    assert scanned == [1], "only the Karnataka partition should be scored"
+
+
+def test_weak_hit_widens_to_other_regions(matcher, scanned):
+    matches = matcher.find_matches('Azithral 500', user_region='Karnataka', top_n=1)
+    assert matches[0]['brand'] == 'Azithral'
+    assert scanned == [1, 2, 2]
+
+
+def test_tiered_results_match_full_scan_when_widened(matcher):
+    # Nothing in Tamil Nadu reaches REGION_CUTOFF, so every partition is scanned
+    full = matcher.find_matches('Pantocid 40', top_n=2, threshold=30)
+    tiered = matcher.find_matches('Pantocid 40', top_n=2, threshold=30, user_region='Tamil Nadu')
+    assert tiered == full
+    assert tiered[0]['brand'] == 'Pantocid'
+
+
+def test_threshold_applies_across_tiers(matcher):
+    assert matcher.find_matches('Zzzyx', user_region='Karnataka', threshold=80) == []
+
+
+def test_user_region_is_part_of_the_cache_key(matcher, scanned):
+    matcher.find_matches('Crocin 650mg', user_region='Tamil Nadu', top_n=1)
+    matcher.find_matches('Crocin 650mg', user_region='Karnataka', top_n=1)
+    matcher.find_matches('Crocin 650mg', user_region='Tamil Nadu', top_n=1)
+    assert scanned == [2, 1, 2, 2]
+
+
+def test_catalog_columns_share_one_string_table():
+    catalog = MedicineCatalog(sorted(ROWS, key=lambda row: row[3]))
+    assert len(catalog) == len(ROWS)
+    assert sorted(catalog.row(i) for i in range(len(catalog))) == sorted(row[:3] for row in ROWS)
+    # 'Paracetamol', '650mg' and '500mg' repeat across rows but are stored once
+    assert len(catalog.strings) == len(set(value for row in ROWS for value in row[:3]))
+    assert catalog.name_ids.typecode == 'I'
+
+
+def test_repeated_query_is_served_from_cache(matcher, scanned):
+    first = matcher.find_matches('Dolo  650', top_n=1)
+    first[0]['brand'] = 'mutated by caller'
+    again = matcher.find_matches('Dolo 650', top_n=1)
+    assert again[0]['brand'] == 'Dolo'
+    assert len(scanned) == 1, "whitespace-normalised repeat should not rescan"
+
+
+def test_cache_is_bounded(matcher, monkeypatch):
+    monkeypatch.setattr(medicine_matcher, 'MATCH_CACHE_SIZE', 2)
+    for query in ('Dolo', 'Calpol', 'Crocin'):
+        matcher.find_matches(query)
+    assert [key[0] for key in matcher._match_cache] == ['Calpol', 'Crocin']
+
+
+def test_catalog_reload_clears_cache(catalog_db, scanned):
+    db_path = catalog_db(ROWS)
+    matcher = MedicineMatcher(db_path)
+    matcher.catalog_watcher.interval = matcher.catalog_watcher._next_check = 0
+    assert matcher.find_matches('Pacimol 650', threshold=90) == []
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO medicines (generic_name, brand_name, strength, region) "
+                 "VALUES ('Paracetamol', 'Pacimol', '650mg', 'Karnataka')")
+    conn.execute('CREATE TABLE catalog_meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute("INSERT INTO catalog_meta VALUES ('version', '1')")
+    conn.commit()
+    conn.close()
+
+    assert matcher.find_matches('Pacimol 650', threshold=90)[0]['brand'] == 'Pacimol'
+    assert len(scanned) == 2
@@ -0,0 +1,144 @@
+"""OCR upload and progress routes (/api/ocr/upload, /api/ocr/upload/stream, /api/ocr/progress/<id>)"""
+import io
+import json
+import os
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_cors')
+pytest.importorskip('flask_jwt_extended')
+pytest.importorskip('dotenv')
+
+from flask_jwt_extended import create_access_token
+
+from utils import progress
+
+MEDICINE = {'medicine_name': 'Dolo 650', 'confidence': 0.95}
+
+
+class FakeEngine:
+    """Stands in for the registry's OCR engine: one stage report, one medicine"""
+
+    def stream_medicines(self, image_path):
+        progress.report('extract', 'Fake extraction', engine='fake')
+        yield dict(MEDICINE)
+
+    def extract_medicines(self, image_path):
+        return list(self.stream_medicines(image_path))
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # app.py creates its data files relative to the working directory on import
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+@pytest.fixture
+def client(app_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module.engine_registry, 'get_ocr_engine', lambda: FakeEngine())
+    monkeypatch.setattr(app_module, 'prescription_db', None)
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(progress, 'progress_hub', progress.ProgressHub(ttl=60))
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def auth(app_module):
+    with app_module.app.app_context():
+        token = create_access_token(identity='patient@example.com', additional_claims={'role': 'patient'})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _sse_events(body):
+    """[(event, data)] from a Server-Sent Events body (keepalive comments skipped)"""
+    events = []
+    for frame in body.decode('utf-8').split('\n\n'):
+        event, data = None, []
+        for line in frame.split('\n'):
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].strip())
+        if event:
+            events.append((event, json.loads('\n'.join(data))))
+    return events
+
+
+def _upload(client, auth, path='/api/ocr/upload', upload_id=None):
+    data = {'file': (io.BytesIO(b'fake image'), 'rx.jpg')}
+    if upload_id:
+        data['upload_id'] = upload_id
+    return client.post(path, data=data, headers=auth, content_type='multipart/form-data')
+
+
+def test_progress_requires_token_in_header(client):
+    assert client.get('/api/ocr/progress/u1').status_code == 401
+    assert client.get('/api/ocr/progress/u1?token=abc').status_code == 401
+
+
+def test_progress_rejects_invalid_upload_id(client, auth):
+    assert client.get('/api/ocr/progress/bad.id', headers=auth).status_code == 400
+    assert _upload(client, auth, upload_id='bad id').status_code == 400
+
+
+def test_upload_progress_replayed_to_subscriber(client, auth):
+    response = _upload(client, auth, upload_id='u1')
+    assert response.status_code == 200
+    prescription = response.get_json()
+    assert prescription['medicines'] == [MEDICINE]
+
+    events = _sse_events(client.get('/api/ocr/progress/u1', headers=auth).data)
+    assert [event for event, _ in events] == ['start', 'stage', 'medicine', 'done']
+    assert events[1][1]['stage'] == 'extract'
+    assert events[-1][1] == dict(events[-1][1], id=prescription['id'], medicines=1)
+
+
+def test_reused_upload_id_reports_the_new_upload(client, auth):
+    first = _upload(client, auth, upload_id='u1').get_json()
+    second = _upload(client, auth, upload_id='u1').get_json()
+    events = _sse_events(client.get('/api/ocr/progress/u1', headers=auth).data)
+    assert [event for event, _ in events] == ['start', 'stage', 'medicine', 'done']
+    assert events[0][1]['id'] == second['id'] != first['id']
+
+
+def test_progress_is_scoped_to_the_uploader(app_module, client, auth):
+    _upload(client, auth, upload_id='u1')
+    with app_module.app.app_context():
+        other = create_access_token(identity='other@example.com', additional_claims={'role': 'patient'})
+    channel = progress.progress_hub.channel('other@example.com', 'u1')
+    assert channel.events == []
+    channel.close('error', {'msg': 'test'})
+    events = _sse_events(client.get('/api/ocr/progress/u1', headers={'Authorization': f'Bearer {other}'}).data)
+    assert events == [('error', {'msg': 'test', 'elapsed': events[0][1]['elapsed']})]
+
+
+def test_stream_upload_sends_medicines_then_done(client, auth):
+    response = _upload(client, auth, path='/api/ocr/upload/stream', upload_id='u2')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _sse_events(response.data)
+    assert [event for event, _ in events] == ['start', 'medicine', 'done']
+    assert events[1][1] == MEDICINE
+    assert events[2][1]['medicines'] == [MEDICINE]
+
+    progress_events = _sse_events(client.get('/api/ocr/progress/u2', headers=auth).data)
+    assert [event for event, _ in progress_events] == ['start', 'stage', 'medicine', 'done']
+
+
+def test_stream_upload_disconnect_closes_progress_channel(client, auth):
+    response = _upload(client, auth, path='/api/ocr/upload/stream', upload_id='u3')
+    body = iter(response.response)
+    assert b'event: start' in next(body)
+    response.close()  # client went away before the OCR finished
+
+    channel = progress.progress_hub.channel('patient@example.com', 'u3')
+    assert channel.closed
+    assert channel.events[-1] == ('error', dict(channel.events[-1][1],
+                                               msg='Upload stream closed before processing finished'))
@@ -0,0 +1,54 @@
+"""Confusable folding, phonetic keys and the phonetic tier of utils.fuzzy_matcher"""
+import pytest
+
+from utils import fuzzy_matcher
+from utils.phonetic import PhoneticIndex, fold_confusables, phonetic_key
+
+
+def test_fold_inside_words_and_numbers():
+    assert fold_confusables('Zer0dol') == 'zerodol'
+    assert fold_confusables('Dolo 6S0') == 'dolo 650'
+    assert fold_confusables('Dolo 6$0') == 'dolo 650'
+
+
+def test_real_strengths_are_not_folded():
+    assert fold_confusables('Dolo 650') == 'dolo 650'
+    assert fold_confusables('Dolo-650mg') == 'dolo 650mg'
+    assert fold_confusables('Neurobion B12') == 'neurobion b12'
+
+
+def test_confusable_spellings_share_a_key():
+    assert phonetic_key('Dolo 6S0') == phonetic_key('Dolo 650') == 'TL650'
+    assert phonetic_key('Zer0dol') == phonetic_key('Zerodol')
+    assert phonetic_key('Dolo 500') != phonetic_key('Dolo 650')
+    assert phonetic_key('') == ''
+
+
+def test_index_prefers_exact_key_then_prefix():
+    index = PhoneticIndex(['Dolo 650', 'Dolo 650 Plus', 'Zerodol'])
+    assert list(index.candidates('Dolo 6S0')) == ['Dolo 650']
+    assert set(index.candidates('Dolo 6')) == {'Dolo 650', 'Dolo 650 Plus'}
+    assert index.candidates('Xyz') == {}
+
+
+@pytest.fixture
+def make_matcher(monkeypatch, tmp_path):
+    monkeypatch.setattr(fuzzy_matcher, 'SQLITE_PATH', str(tmp_path / 'pharmacy.db'))
+    monkeypatch.setattr(fuzzy_matcher, 'SYMSPELL_PATH', str(tmp_path / 'symspell.json'))
+
+    def make(names):
+        monkeypatch.setattr(fuzzy_matcher, 'load_medicine_names', lambda: list(names))
+        return fuzzy_matcher.MedicineMatcher()
+    return make
+
+
+def test_phonetic_tier_corrects_confusables(make_matcher):
+    matcher = make_matcher(['Dolo 650', 'Dolo 650 Plus', 'Zerodol', 'Zerodol-SP'])
+    assert matcher.fuzzy_correct('Dolo 6S0') == ('Dolo 650', 1.0)
+    assert matcher.fuzzy_correct('Zer0dol') == ('Zerodol', 1.0)
+
+
+def test_phonetic_tier_does_not_reward_token_subsets(make_matcher):
+    # token_set_ratio would score "dolo 650" against "dolo 650 plus" as 100
+    matcher = make_matcher(['Dolo 650 Plus'])
+    assert matcher.fuzzy_correct('Dolo 6S0') == ('Dolo 6S0', 0.5)
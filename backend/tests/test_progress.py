@@ -0,0 +1,114 @@
+"""Upload progress channels (utils.progress)"""
+import threading
+import time
+
+from utils import progress
+from utils.progress import ProgressChannel, ProgressHub
+
+
+def _events(subscription):
+    return [(event, data) for event, data in subscription if event is not None]
+
+
+def test_late_subscriber_replays_then_ends_on_close():
+    channel = ProgressChannel()
+    channel.publish('start', {'id': 'p1'})
+    token = progress.bind(channel)
+    try:
+        progress.report('extract', 'Claude extraction', engine='claude')
+    finally:
+        progress.unbind(token)
+    channel.close('done', {'medicines': 2})
+
+    events = _events(channel.subscribe(keepalive=0.01))
+    assert [event for event, _ in events] == ['start', 'stage', 'done']
+    assert events[1][1]['stage'] == 'extract' and events[1][1]['engine'] == 'claude'
+    assert all('elapsed' in data for _, data in events)
+
+
+def test_early_subscriber_follows_live_events():
+    channel = ProgressChannel()
+    received = []
+    subscriber = threading.Thread(target=lambda: received.extend(_events(channel.subscribe(keepalive=0.01))))
+    subscriber.start()
+    time.sleep(0.05)
+    channel.publish('start')
+    channel.publish('medicine', {'medicine_name': 'Dolo'})
+    channel.close('done')
+    subscriber.join(2)
+    assert not subscriber.is_alive()
+    assert [event for event, _ in received] == ['start', 'medicine', 'done']
+
+
+def test_keepalive_while_waiting():
+    channel = ProgressChannel()
+    subscription = channel.subscribe(keepalive=0.01)
+    assert next(subscription) == (None, None)
+    channel.close('done')
+    assert [event for event, _ in subscription] == ['done']
+
+
+def test_subscription_ends_if_upload_never_starts():
+    channel = ProgressChannel()
+    start = time.monotonic()
+    events = _events(channel.subscribe(keepalive=0.01, start_wait=0.1))
+    assert events == [('error', {'msg': 'Upload did not start'})]
+    assert time.monotonic() - start < 1
+    assert not channel.closed, "the upload may still arrive for other subscribers"
+
+
+def test_subscription_ends_when_upload_stalls():
+    channel = ProgressChannel()
+    channel.publish('start')
+    events = _events(channel.subscribe(keepalive=0.01, start_wait=5, idle=0.1))
+    assert [event for event, _ in events] == ['start', 'error']
+    assert events[-1][1]['msg'] == 'Progress stalled'
+
+
+def test_publish_after_close_is_dropped():
+    channel = ProgressChannel()
+    channel.close('done')
+    channel.publish('stage', {'stage': 'late'})
+    assert [event for event, _ in channel.events] == ['done']
+
+
+def test_reused_upload_id_gets_a_fresh_channel():
+    hub = ProgressHub(ttl=60)
+    first = hub.channel('alice', 'u1', fresh=True)
+    first.close('done')
+
+    # A subscriber still sees the finished upload...
+    assert hub.channel('alice', 'u1') is first
+    # ...but a new upload with the same id must not publish into a closed channel
+    second = hub.channel('alice', 'u1', fresh=True)
+    assert second is not first and not second.closed
+    second.publish('start')
+    assert hub.channel('alice', 'u1') is second
+    assert [event for event, _ in second.events] == ['start']
+
+
+def test_open_channel_is_shared_and_scoped_per_owner():
+    hub = ProgressHub(ttl=60)
+    subscriber_side = hub.channel('alice', 'u1')
+    assert hub.channel('alice', 'u1', fresh=True) is subscriber_side
+    assert hub.channel('bob', 'u1') is not subscriber_side
+
+
+def test_expired_channels_are_closed_and_pruned():
+    hub = ProgressHub(ttl=0.05)
+    channel = hub.channel('alice', 'u1')
+    time.sleep(0.1)
+    assert hub.channel('alice', 'u1') is not channel
+    assert channel.closed
+    assert channel.events[-1][0] == 'error'
+
+
+def test_report_without_bound_channel_is_a_no_op():
+    progress.report('preprocess', 'Preprocessing image')
+
+
+def test_valid_upload_id():
+    assert progress.valid_upload_id('3f2c-uuid_1')
+    assert not progress.valid_upload_id('')
+    assert not progress.valid_upload_id('../etc/passwd')
+    assert not progress.valid_upload_id('x' * 65)
@@ -0,0 +1,129 @@
+"""Catalog loading, availability tiers and brand lookups in utils.regional_alternatives"""
+import sqlite3
+
+import pytest
+
+from utils import regional_alternatives
+from utils.regional_alternatives import RegionalMedicineMapper
+
+ROWS = [
+    ('Paracetamol', 'Dolo', '650mg', 'Tamil Nadu'),
+    ('Paracetamol', 'Calpol', '500mg', None),  # no region: All India
+    ('Paracetamol', 'Crocin', '650mg', 'Karnataka'),
+    ('Pantoprazole', 'Pantocid', '40mg', 'Karnataka'),
+    (None, 'Orphan', '10mg', 'Karnataka'),
+    ('Ibuprofen', '', '400mg', 'Karnataka'),
+]
+
+
+def set_version(db_path, key, version):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute('INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)', (key, str(version)))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def db_path(catalog_db):
+    return catalog_db(ROWS)
+
+
+@pytest.fixture
+def mapper(db_path, monkeypatch):
+    monkeypatch.setattr(regional_alternatives, 'load_snapshot', None)
+    mapper = RegionalMedicineMapper(db_path)
+    # Check the catalog version on every lookup instead of every 5 seconds
+    for watcher in (mapper.catalog_watcher, mapper.inventory_watcher):
+        watcher.interval = watcher._next_check = 0
+    return mapper
+
+
+def brands_and_tiers(result):
+    return [(alt['brand_name'], alt['tier']) for alt in result['alternatives']]
+
+
+def test_rows_without_generic_or_brand_are_skipped(mapper):
+    assert sorted(mapper.medicine_cache) == ['Pantoprazole', 'Paracetamol']
+    assert 'orphan' not in mapper.brand_index
+    assert mapper.find_alternatives('Orphan')['alternatives'] == []
+
+
+def test_tiers_rank_state_then_national_then_others(mapper):
+    result = mapper.find_alternatives('Dolo', user_region='Karnataka')
+    assert result['generic_name'] == 'Paracetamol'
+    assert brands_and_tiers(result) == [('Crocin', 2), ('Calpol', 3), ('Dolo', 4)]
+    assert result['alternatives'][1]['region'] == 'All India'
+
+
+def test_tiers_are_ranked_lazily_per_generic_and_region(mapper):
+    assert mapper.availability_tiers == {}
+    mapper.find_alternatives('Dolo', user_region='Karnataka')
+    mapper.find_alternatives('Dolo', user_region='Tamil Nadu')
+    assert list(mapper.availability_tiers) == ['Paracetamol']
+    assert set(mapper.availability_tiers['Paracetamol']) == {(None, 'Karnataka'), (None, 'Tamil Nadu')}
+    assert brands_and_tiers(mapper.find_alternatives('Dolo', user_region='Tamil Nadu'))[0] == ('Dolo', 2)
+
+
+def test_inventory_stock_overrides_catalog_region(db_path, monkeypatch):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE inventory (medicine_id INTEGER, hub TEXT, qty INTEGER)')
+    ids = dict(conn.execute('SELECT brand_name, id FROM medicines'))
+    conn.executemany('INSERT INTO inventory VALUES (?, ?, ?)', [
+        (ids['Dolo'], 'Bangalore', 5),
+        (ids['Dolo'], 'Chennai', 0),
+        (ids['Crocin'], 'Bangalore', 0),
+        (ids['Crocin'], 'Mumbai', 3),
+        (ids['Calpol'], 'Delhi', 0),
+    ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(regional_alternatives, 'load_snapshot', None)
+
+    mapper = RegionalMedicineMapper(db_path)
+    result = mapper.find_alternatives('Dolo', user_region='Karnataka', locality='Indiranagar, Bangalore')
+    assert result['hub_detected'] == 'Bangalore'
+    assert brands_and_tiers(result) == [('Dolo', 1), ('Crocin', 3), ('Calpol', 5)]
+    assert result['alternatives'][0]['stock'] == {'Bangalore': 5, 'Chennai': 0}
+
+
+def test_catalog_version_bump_reloads_and_drops_memoised_state(mapper, db_path):
+    mapper.find_alternatives('Dolo', user_region='Karnataka')
+    assert mapper.find_generic_name('Dollo') == 'Paracetamol'
+    assert mapper.availability_tiers and mapper.fuzzy_brands is not None
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO medicines (generic_name, brand_name, strength, region) "
+                 "VALUES ('Paracetamol', 'Pacimol', '650mg', 'Karnataka')")
+    conn.commit()
+    conn.close()
+    set_version(db_path, 'version', 1)
+
+    result = mapper.find_alternatives('Dolo', user_region='Karnataka')
+    assert brands_and_tiers(result)[:2] == [('Crocin', 2), ('Pacimol', 2)]
+    assert mapper.fuzzy_brands is None
+
+
+def test_fuzzy_brand_list_is_built_once(mapper):
+    assert mapper.find_generic_name('Pantocid 40') == 'Pantoprazole'
+    fuzzy_brands = mapper.fuzzy_brands
+    assert mapper.find_generic_name('Crocine') == 'Paracetamol'
+    assert mapper.fuzzy_brands is fuzzy_brands
+    assert sorted(fuzzy_brands[0]) == ['Calpol', 'Crocin', 'Dolo', 'Pantocid']
+    assert mapper.find_generic_name('Zzzyx') is None
+
+
+def test_snapshot_path_matches_sqlite_path(db_path, mapper, monkeypatch):
+    pytest.importorskip('numpy')
+    from utils.catalog_snapshot import build_snapshot, load_snapshot
+
+    build_snapshot(db_path)
+    monkeypatch.setattr(regional_alternatives, 'load_snapshot', load_snapshot)
+    snapshot_mapper = RegionalMedicineMapper(db_path)
+    assert snapshot_mapper.snapshot is not None and snapshot_mapper.medicine_cache == {}
+
+    for name, region in (('Dolo', 'Karnataka'), ('paracetamol', 'Tamil Nadu'), ('Pantocid', 'Karnataka')):
+        assert (snapshot_mapper.find_alternatives(name, user_region=region)
+                == mapper.find_alternatives(name, user_region=region))
+    assert snapshot_mapper.find_generic_name('Crocine') == mapper.find_generic_name('Crocine')
+    assert snapshot_mapper.find_alternatives('Orphan')['alternatives'] == []
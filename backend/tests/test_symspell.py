@@ -0,0 +1,54 @@
+"""SymSpell symmetric-delete dictionary (utils.symspell)"""
+from utils import symspell
+from utils.symspell import SymSpellDictionary, max_distance_for
+
+NAMES = ['Paracetamol', 'Pantoprazole', 'Azithromycin', 'Zerodol', 'Dolo', 'Dolo-650', 'Pan']
+
+
+def test_exact_and_case_insensitive_hits():
+    dictionary = SymSpellDictionary(NAMES)
+    assert dictionary.lookup('Paracetamol') == ('Paracetamol', 0)
+    assert dictionary.lookup('  PARACETAMOL ') == ('Paracetamol', 0)
+    assert dictionary.lookup('') == (None, None)
+
+
+def test_one_and_two_edit_ocr_errors():
+    dictionary = SymSpellDictionary(NAMES)
+    assert dictionary.lookup('Paracetmol') == ('Paracetamol', 1)
+    assert dictionary.lookup('Azithromicyn') == ('Azithromycin', 2)
+    # Errors past the prefix are still verified on the full string
+    assert dictionary.lookup('Pantoprazoel') == ('Pantoprazole', 2)
+    assert dictionary.lookup('Xylometazoline') == (None, None)
+
+
+def test_short_names_tolerate_fewer_edits():
+    assert max_distance_for('pan') == 0
+    assert max_distance_for('zerodol') == 1
+    dictionary = SymSpellDictionary(NAMES)
+    assert dictionary.lookup('Pam') == (None, None)
+    assert dictionary.lookup('Zerodl') == ('Zerodol', 1)
+    assert dictionary.lookup('Zerdl') == (None, None)
+    assert dictionary.lookup('Zerdl', max_distance=2) == ('Zerodol', 2)
+
+
+def test_correction_frequency_breaks_ties():
+    names = ['Dolonex', 'Dolomex']
+    assert SymSpellDictionary(names).lookup('Dolovex') == ('Dolonex', 1)
+    assert SymSpellDictionary(names, frequencies={'Dolomex': 3}).lookup('Dolovex') == ('Dolomex', 1)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'medicines.symspell')
+    SymSpellDictionary(NAMES, frequencies={'Zerodol': 2}, catalog_version=5).save(path)
+    loaded = SymSpellDictionary.load(path)
+    assert loaded.catalog_version == 5 and len(loaded) == len(NAMES)
+    assert loaded.lookup('Paracetmol') == ('Paracetamol', 1)
+    assert loaded.frequencies == {'zerodol': 2}
+
+
+def test_load_rejects_missing_or_incompatible(tmp_path, monkeypatch):
+    path = str(tmp_path / 'medicines.symspell')
+    assert SymSpellDictionary.load(path) is None
+    SymSpellDictionary(NAMES).save(path)
+    monkeypatch.setattr(symspell, 'PREFIX_LENGTH', symspell.PREFIX_LENGTH + 1)
+    assert SymSpellDictionary.load(path) is None
@@ -0,0 +1,55 @@
+"""
+Async batch OCR
+Runs an engine's extract_medicines_async over many images from a single event
+loop, with a semaphore bounding how many prescriptions are in flight at once.
+
+Configuration (environment):
+    OCR_ASYNC_CONCURRENCY=32   # max prescriptions in flight
+"""
+import asyncio
+import os
+
+DEFAULT_CONCURRENCY = 32
+
+
+def default_concurrency():
+    try:
+        return max(1, int(os.getenv('OCR_ASYNC_CONCURRENCY', DEFAULT_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_CONCURRENCY
+
+
+async def extract_many(image_paths, engine=None, concurrency=None, on_result=None):
+    """
+    OCR every image in image_paths concurrently.
+
+    Args:
+        engine: OCR engine with extract_medicines_async (default: the registry's engine)
+        concurrency: max extractions in flight (default: OCR_ASYNC_CONCURRENCY)
+        on_result: optional callback(image_path, medicines) called as each image finishes
+
+    Returns: dict mapping image path to its list of medicines
+    """
+    if engine is None:
+        from utils.engine_registry import engine_registry
+        engine = engine_registry.get_ocr_engine()
+    semaphore = asyncio.Semaphore(concurrency or default_concurrency())
+
+    async def extract_one(image_path):
+        async with semaphore:
+            try:
+                medicines = await engine.extract_medicines_async(image_path)
+            except Exception as e:
+                print(f"❌ Async OCR failed for {os.path.basename(image_path)}: {e}", flush=True)
+                medicines = []
+        if on_result is not None:
+            on_result(image_path, medicines)
+        return image_path, medicines
+
+    results = await asyncio.gather(*(extract_one(path) for path in image_paths))
+    return dict(results)
+
+
+def run_batch(image_paths, engine=None, concurrency=None, on_result=None):
+    """Blocking entry point: run extract_many on a fresh event loop"""
+    return asyncio.run(extract_many(image_paths, engine=engine, concurrency=concurrency, on_result=on_result))
@@ -0,0 +1,79 @@
+"""
+Multi-prescription batching
+Helpers for packing several preprocessed prescription images into one vision
+request (one labelled image part per prescription) and splitting the per-image
+JSON reply back into one medicine list per prescription. One request per batch
+instead of one per image stretches a requests-per-minute quota further.
+"""
+import json
+
+# Images per request; more images per call means longer replies and more cross-talk risk
+DEFAULT_BATCH_IMAGES = 4
+
+BATCH_INSTRUCTIONS = """You are given {count} SEPARATE prescription images, labelled "Image 1" to "Image {count}".
+Each image is a different patient's prescription: process every image independently
+and never move a medicine from one image to another.
+
+Apply the instructions below to EACH image."""
+
+BATCH_OUTPUT_FORMAT = """OUTPUT FOR THIS BATCH (overrides the JSON format above):
+{{
+  "prescriptions": [
+    {{"image": 1, "medicines": [ ...medicine objects for Image 1 in the format above... ]}},
+    ...
+    {{"image": {count}, "medicines": [ ... ]}}
+  ]
+}}
+Include exactly one entry per image, in order, with an empty "medicines" list if an image has none.
+Return ONLY valid JSON. No markdown."""
+
+
+def build_batch_prompt(base_prompt, count):
+    """Wrap a single-prescription prompt so the model returns per-image results"""
+    return "\n\n".join([
+        BATCH_INSTRUCTIONS.format(count=count),
+        base_prompt,
+        BATCH_OUTPUT_FORMAT.format(count=count),
+    ])
+
+
+def image_label(index):
+    return f"Image {index + 1}:"
+
+
+def split_batch_response(content, count):
+    """
+    Parse a batch reply into `count` lists of raw medicine dicts (in image order).
+    Images the model skipped get an empty list.
+
+    Raises ValueError if the reply is not JSON or not in a recognised batch shape.
+    """
+    content = content.replace("```json", "").replace("```", "").strip()
+    data = json.loads(content)
+
+    per_image = [[] for _ in range(count)]
+    entries = data.get('prescriptions') if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError("batch reply has no 'prescriptions' list")
+
+    for position, entry in enumerate(entries):
+        if isinstance(entry, list):
+            # Bare list of lists, one per image
+            index, medicines = position, entry
+        elif isinstance(entry, dict):
+            try:
+                index = int(entry.get('image', position + 1)) - 1
+            except (TypeError, ValueError):
+                index = position
+            medicines = entry.get('medicines', [])
+        else:
+            continue
+        if 0 <= index < count and isinstance(medicines, list):
+            per_image[index].extend(m for m in medicines if isinstance(m, dict))
+    return per_image
+
+
+def chunk(items, size):
+    """Split items into consecutive lists of at most size"""
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
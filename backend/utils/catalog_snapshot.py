@@ -0,0 +1,258 @@
+"""
+Compact memory-mapped medicine catalog snapshot
+A build step writes the medicines table as a string table plus NumPy
+ID/offset arrays; workers mmap it read-only so startup is near-instant and
+the catalog pages are shared between processes through the page cache.
+
+Build (from backend/):
+    python -m utils.catalog_snapshot [pharmacy.db]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+if __package__ in (None, ''):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import connect, get_catalog_version
+
+MAGIC = b'PHCATv1\0'
+NULL_STRING = 0xFFFFFFFF
+NULL_REGION = 0xFFFF
+ALIGN = 8
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def _fold(value):
+    return (value or '').lower()
+
+
+def snapshot_path_for(db_path):
+    return os.path.splitext(db_path)[0] + '.catalog'
+
+
+def build_snapshot(db_path, out_path=None, conn=None, catalog_version=None):
+    """
+    Write the medicines table to a snapshot file (atomically replaced).
+
+    Layout: MAGIC | uint32 header length | JSON header | 8-byte aligned arrays.
+    Rows are sorted by lower-cased generic name so each generic is a contiguous range.
+    Rows without a generic or brand name are left out, as in the mapper's SQLite path.
+
+    A loader passes its own connection and the version it is about to commit,
+    so the snapshot is in place before workers see the new version.
+    Returns: snapshot path
+    """
+    out_path = out_path or snapshot_path_for(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect(db_path)
+    try:
+        if catalog_version is None:
+            catalog_version = get_catalog_version(db_path)
+        rows = conn.execute('''
+            SELECT id, generic_name, brand_name, strength, region, city
+            FROM medicines
+            WHERE generic_name != '' AND brand_name != ''
+        ''').fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    # Sorted in Python so the order matches str.lower() used by the reader's bisect
+    rows.sort(key=lambda r: (_fold(r[1]), r[0]))
+
+    strings = []
+    string_ids = {}
+    regions = []
+    region_codes = {}
+
+    def intern(value):
+        if value is None:
+            return NULL_STRING
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    def region_code(value):
+        if value is None:
+            return NULL_REGION
+        if value not in region_codes:
+            region_codes[value] = len(regions)
+            regions.append(value)
+        return region_codes[value]
+
+    n = len(rows)
+    columns = {
+        'ids': np.empty(n, dtype=np.int64),
+        'generic': np.empty(n, dtype=np.uint32),
+        'brand': np.empty(n, dtype=np.uint32),
+        'strength': np.empty(n, dtype=np.uint32),
+        'city': np.empty(n, dtype=np.uint32),
+        'region': np.empty(n, dtype=np.uint16),
+    }
+    for i, (medicine_id, generic, brand, strength, region, city) in enumerate(rows):
+        columns['ids'][i] = medicine_id
+        columns['generic'][i] = intern(generic)
+        columns['brand'][i] = intern(brand)
+        columns['strength'][i] = intern(strength)
+        columns['city'][i] = intern(city)
+        columns['region'][i] = region_code(region)
+
+    # Secondary orders for binary search by brand name and by id
+    columns['brand_order'] = np.array(sorted(range(n), key=lambda i: _fold(rows[i][2])), dtype=np.int32)
+    columns['id_order'] = np.argsort(columns['ids'], kind='stable').astype(np.int32)
+
+    encoded = [s.encode('utf-8') for s in strings]
+    columns['string_offsets'] = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    columns['string_offsets'][1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+    columns['string_data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    # Lay out arrays after the header, each 8-byte aligned; repeat until the
+    # header length (which shifts every offset) stops changing
+    header = {
+        'format': 1,
+        'catalog_version': catalog_version,
+        'rows': n,
+        'strings': len(strings),
+        'regions': regions,
+        'arrays': {},
+    }
+    header_bytes = b''
+    while True:
+        offset = len(MAGIC) + 4 + len(header_bytes)
+        arrays = {}
+        for name, array in columns.items():
+            offset += (-offset) % ALIGN
+            arrays[name] = [offset, array.dtype.str, int(array.size)]
+            offset += array.nbytes
+        header['arrays'] = arrays
+        encoded_header = json.dumps(header).encode('utf-8')
+        if len(encoded_header) == len(header_bytes):
+            header_bytes = encoded_header
+            break
+        header_bytes = encoded_header
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in columns.items():
+            f.write(b'\0' * (arrays[name][0] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, out_path)
+
+    size_mb = os.path.getsize(out_path) / (1024 * 1024)
+    print(f"✓ Catalog snapshot v{catalog_version}: {n:,} rows, {len(strings):,} strings, "
+          f"{size_mb:.1f} MB -> {out_path}", flush=True)
+    return out_path
+
+
+class CatalogSnapshot:
+    """Read-only, mmap-backed view over a snapshot file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        (header_len,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + header_len].decode('utf-8'))
+
+        self.catalog_version = header['catalog_version']
+        self.regions = header['regions']
+        self.rows = header['rows']
+        for name, (offset, dtype, count) in header['arrays'].items():
+            setattr(self, name, np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset))
+
+    def __len__(self):
+        return self.rows
+
+    def string(self, string_id):
+        """Decode one entry of the string table (None for NULL)"""
+        if string_id == NULL_STRING:
+            return None
+        start, end = int(self.string_offsets[string_id]), int(self.string_offsets[string_id + 1])
+        return self.string_data[start:end].tobytes().decode('utf-8')
+
+    def region_name(self, code):
+        return None if code == NULL_REGION else self.regions[code]
+
+    def row(self, i):
+        """Row i as (id, generic_name, brand_name, strength, region, city)"""
+        return (
+            int(self.ids[i]),
+            self.string(self.generic[i]),
+            self.string(self.brand[i]),
+            self.string(self.strength[i]),
+            self.region_name(self.region[i]),
+            self.string(self.city[i]),
+        )
+
+    def generic_range(self, generic_name):
+        """Row range for a generic (case-insensitive); empty range if unknown"""
+        target = generic_name.lower()
+        key = lambda i: _fold(self.string(self.generic[i]))
+        lo = bisect_left(range(self.rows), target, key=key)
+        hi = lo
+        while hi < self.rows and key(hi) == target:
+            hi += 1
+        return range(lo, hi)
+
+    def find_brand(self, brand_name):
+        """Row index of the first brand with this name (case-insensitive), or None"""
+        target = brand_name.lower()
+        key = lambda j: _fold(self.string(self.brand[self.brand_order[j]]))
+        j = bisect_left(range(self.rows), target, key=key)
+        if j < self.rows and key(j) == target:
+            return int(self.brand_order[j])
+        return None
+
+    def find_id(self, medicine_id):
+        """Row index for a medicine id, or None"""
+        j = bisect_left(range(self.rows), medicine_id, key=lambda k: int(self.ids[self.id_order[k]]))
+        if j < self.rows and int(self.ids[self.id_order[j]]) == medicine_id:
+            return int(self.id_order[j])
+        return None
+
+
+def load_snapshot(db_path):
+    """
+    Shared (per-process) snapshot for db_path if one exists and matches the
+    current catalog version; None means callers should read the database.
+    """
+    path = snapshot_path_for(db_path)
+    if not os.path.exists(path):
+        return None
+
+    version = get_catalog_version(db_path)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(path)
+        if snapshot is None or snapshot.catalog_version != version:
+            try:
+                snapshot = CatalogSnapshot(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠ Catalog snapshot unreadable ({e}), using database", flush=True)
+                return None
+            if snapshot.catalog_version != version:
+                print(f"⚠ Catalog snapshot is v{snapshot.catalog_version}, catalog is v{version}; using database", flush=True)
+                return None
+            _snapshots[path] = snapshot
+        return snapshot
+
+
+if __name__ == '__main__':
+    default_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'pharmacy.db')
+    build_snapshot(sys.argv[1] if len(sys.argv) > 1 else default_db)
@@ -0,0 +1,222 @@
+"""
+Per-provider circuit breakers
+Tracks recent call outcomes and latencies for each OCR provider (gemini,
+blackbox, mistral). When the error rate or slow-call rate over the window
+crosses its threshold the circuit opens and calls fail fast with
+CircuitOpenError instead of waiting through retries; after a cool-down a
+limited number of half-open probe calls decide whether to close it again.
+"""
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Calls kept in the rolling window, and how old (seconds) a call may be to count
+WINDOW_SIZE = 20
+WINDOW_SECONDS = 300.0
+# Don't judge a provider on fewer calls than this
+MIN_CALLS = 4
+FAILURE_RATE_THRESHOLD = 0.5
+# Calls slower than SLOW_CALL_SECONDS count toward the slow-call rate
+SLOW_CALL_SECONDS = 45.0
+SLOW_RATE_THRESHOLD = 0.8
+# Seconds an open circuit waits before allowing half-open probes
+OPEN_SECONDS = 30.0
+HALF_OPEN_MAX_CALLS = 1
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, provider, retry_in=0.0):
+        super().__init__(f"{provider} circuit open (retry in {retry_in:.0f}s)")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one provider"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self._calls = deque(maxlen=WINDOW_SIZE)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _window(self, now):
+        while self._calls and now - self._calls[0][0] > WINDOW_SECONDS:
+            self._calls.popleft()
+        return self._calls
+
+    def _rates(self, now):
+        calls = self._window(now)
+        if not calls:
+            return 0.0, 0.0, None
+        failures = sum(1 for _, ok, _ in calls if not ok)
+        slow = sum(1 for _, _, latency in calls if latency >= SLOW_CALL_SECONDS)
+        avg_latency = sum(latency for _, _, latency in calls) / len(calls)
+        return failures / len(calls), slow / len(calls), avg_latency
+
+    def _open(self, now):
+        if self.state != OPEN:
+            print(f"⚠ Circuit for {self.name} opened, skipping it for {OPEN_SECONDS:.0f}s", flush=True)
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+
+    def retry_in(self):
+        """Seconds until an open circuit allows a probe (0 if calls are allowed)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + OPEN_SECONDS - time.monotonic())
+
+    def is_open(self):
+        """True while calls would be rejected (does not use up a half-open probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < OPEN_SECONDS
+            if self.state == HALF_OPEN:
+                return self._probes >= HALF_OPEN_MAX_CALLS
+            return False
+
+    def allow(self):
+        """Whether a call may go ahead now; in half-open state this reserves a probe slot"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < OPEN_SECONDS:
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self._probes >= HALF_OPEN_MAX_CALLS:
+                return False
+            self._probes += 1
+            return True
+
+    def release(self):
+        """
+        Give back a probe slot reserved by allow() without judging the provider
+        (the call was cancelled, e.g. it lost a hedge, so it says nothing about health)
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self, latency):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                if latency >= SLOW_CALL_SECONDS:
+                    self._open(now)
+                    return
+                self.state = CLOSED
+                self._calls.clear()
+                print(f"✓ Circuit for {self.name} closed", flush=True)
+            self._calls.append((now, True, latency))
+            self._evaluate(now)
+
+    def record_failure(self, latency=0.0):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            self._calls.append((now, False, latency))
+            self._evaluate(now)
+
+    def _evaluate(self, now):
+        if self.state != CLOSED or len(self._window(now)) < MIN_CALLS:
+            return
+        failure_rate, slow_rate, _ = self._rates(now)
+        if failure_rate >= FAILURE_RATE_THRESHOLD or slow_rate >= SLOW_RATE_THRESHOLD:
+            self._open(now)
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker, recording its outcome and latency"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled (asyncio.CancelledError, KeyboardInterrupt): free the probe slot
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """Await coroutine function func through the breaker"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled (asyncio.CancelledError, KeyboardInterrupt): free the probe slot
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def stream(self, func, *args, **kwargs):
+        """
+        Iterate the stream returned by func through the breaker. The outcome and
+        latency are recorded when the stream ends, not when it opens, so a reply
+        that breaks off midway counts as a failure.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = time.monotonic()
+        try:
+            yield from func(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - start)
+            raise
+        except BaseException:
+            # Consumer stopped reading (GeneratorExit) or was interrupted
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+
+    def health(self):
+        """State plus a 0-1 health score from the recent error and slow-call rates"""
+        with self._lock:
+            now = time.monotonic()
+            failure_rate, slow_rate, avg_latency = self._rates(now)
+            score = 0.0 if self.state == OPEN else (1 - failure_rate) * (1 - 0.5 * slow_rate)
+            return {
+                'state': self.state,
+                'score': round(score, 3),
+                'calls': len(self._calls),
+                'error_rate': round(failure_rate, 3),
+                'slow_rate': round(slow_rate, 3),
+                'avg_latency_ms': round(avg_latency * 1000, 1) if avg_latency is not None else None,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    """Shared per-process breaker for provider"""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(provider)
+            if breaker is None:
+                breaker = _breakers[provider] = CircuitBreaker(provider)
+    return breaker
@@ -4,87 +4,21 @@ Primary engine with Pixtral fallback for maximum accuracy
 """
 import os
 import json
-import base64
+import asyncio
 from dotenv import load_dotenv
-from openai import OpenAI
-import cv2
+from openai import AsyncOpenAI, OpenAI
+from utils.circuit_breaker import get_breaker
+from utils.image_encoding import encode_image_base64
+from utils.ocr_orchestrator import ocr_orchestrator
+from utils.progress import report
+from utils.streaming_json import StreamTruncatedError, stream_refined
 
 load_dotenv()
 
-class ClaudeOCREngine:
-    """
-    Claude 3.5 Sonnet via Blackbox.ai for Indian prescription OCR
-    97.8% accuracy without hardcoding
-    """
-    def __init__(self):
-        self.blackbox_key = os.getenv("BLACKBOX_API_KEY")
-        
-        if not self.blackbox_key:
-            print("⚠️ BLACKBOX_API_KEY not found, Claude engine disabled", flush=True)
-            self.client = None
-        else:
-            self.client = OpenAI(
-                base_url="https://api.blackbox.ai/v1",
-                api_key=self.blackbox_key
-            )
-            print("✓ Claude 3.5 Sonnet initialized via Blackbox", flush=True)
+BLACKBOX_BASE_URL = "https://api.blackbox.ai/v1"
+CLAUDE_MODEL = "anthropic/claude-3-5-sonnet-20241022"
 
-    def extract_medicines(self, image_path):
-        """
-        Main extraction pipeline: Claude primary -> Pixtral fallback -> Fuzzy refinement
-        """
-        try:
-            print(f"\n{'='*60}", flush=True)
-            print(f"CLAUDE OCR PIPELINE: Processing {os.path.basename(image_path)}", flush=True)
-            print(f"{'='*60}", flush=True)
-            
-            # STEP 1: Preprocessing
-            print("[1/3] Preprocessing image...", flush=True)
-            from utils.image_preprocessor import ImagePreprocessor
-            preprocessor = ImagePreprocessor(handwriting_mode=True)
-            processed_img, quality_report = preprocessor.preprocess(image_path)
-            
-            processed_path = image_path.replace('.', '_preprocessed.')
-            if not processed_path.endswith(('.jpg', '.jpeg', '.png')):
-                processed_path = image_path.rsplit('.', 1)[0] + '_preprocessed.jpg'
-            preprocessor.save_preprocessed_image(processed_img, processed_path)
-            
-            # STEP 2: Claude Vision OCR
-            print("[2/3] Claude 3.5 Sonnet extraction...", flush=True)
-            candidates = self._claude_ocr_json(processed_path)
-            
-            if not candidates or (candidates and sum(c.get('confidence', 0) for c in candidates) / max(len(candidates), 1) < 0.9):
-                print("   ⚠️ Claude confidence low, trying Pixtral fallback...", flush=True)
-                candidates = self._pixtral_fallback(processed_path)
-            
-            print(f"   Extracted {len(candidates)} medicine candidates", flush=True)
-            
-            # STEP 3: Fuzzy Database Refinement
-            print("[3/3] Fuzzy database refinement...", flush=True)
-            results = self._fuzzy_refine(candidates)
-            
-            if results:
-                avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
-                print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
-            else:
-                print(f"\n⚠️ No medicines extracted", flush=True)
-            
-            print(f"{'='*60}\n", flush=True)
-            return results
-            
-        except Exception as e:
-            print(f"❌ Pipeline Error: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            return []
-
-    def _claude_ocr_json(self, image_path):
-        """Claude 3.5 Sonnet: Image -> JSON (NO HARDCODING)"""
-        
-        if not self.client:
-            return []
-        
-        CLAUDE_PROMPT = """You are an expert Indian pharmacist AI analyzing a handwritten prescription.
+CLAUDE_PROMPT = """You are an expert Indian pharmacist AI analyzing a handwritten prescription.
 
 CRITICAL: Do NOT hardcode medicine names. Extract EXACTLY what you see.
 
@@ -125,81 +59,289 @@ RULES:
 
 Be honest about confidence - if handwriting is unclear, mark it <0.8."""
 
+class ClaudeOCREngine:
+    """
+    Claude 3.5 Sonnet via Blackbox.ai for Indian prescription OCR
+    97.8% accuracy without hardcoding
+    """
+    def __init__(self):
+        self.blackbox_key = os.getenv("BLACKBOX_API_KEY")
+        self._async_client = None
+        self._async_loop = None
+        
+        if not self.blackbox_key:
+            print("⚠️ BLACKBOX_API_KEY not found, Claude engine disabled", flush=True)
+            self.client = None
+        else:
+            self.client = OpenAI(
+                base_url=BLACKBOX_BASE_URL,
+                api_key=self.blackbox_key
+            )
+            print("✓ Claude 3.5 Sonnet initialized via Blackbox", flush=True)
+
+    def extract_medicines(self, image_path):
+        """
+        Main extraction pipeline: Claude primary -> hedged Pixtral -> Fuzzy refinement
+        """
         try:
-            # Resize for optimal API transmission
-            img = cv2.imread(image_path)
-            if img is not None:
-                max_dim = 1024
-                h, w = img.shape[:2]
-                if max(h, w) > max_dim:
-                    scale = max_dim / max(h, w)
-                    new_w, new_h = int(w * scale), int(h * scale)
-                    img = cv2.resize(img, (new_w, new_h))
-                    print(f"   Resized for API: {w}x{h} -> {new_w}x{new_h}", flush=True)
-                
-                _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                image_b64 = base64.b64encode(buffer).decode('utf-8')
-            else:
-                with open(image_path, "rb") as f:
-                    image_b64 = base64.b64encode(f.read()).decode('utf-8')
+            self._print_header(image_path)
+            processed_path = self._preprocess_image(image_path)
+            return self.extract_from_preprocessed(processed_path)
             
-            response = self.client.chat.completions.create(
-                model="anthropic/claude-3-5-sonnet-20241022",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}},
-                        {"type": "text", "text": CLAUDE_PROMPT}
-                    ]
-                }],
+        except Exception as e:
+            print(f"❌ Pipeline Error: {e}", flush=True)
+            import traceback
+            traceback.print_exc()
+            return []
+
+    async def extract_medicines_async(self, image_path):
+        """
+        Async pipeline for batch OCR: preprocessing runs in a worker thread and
+        Claude/Pixtral calls use async clients, hedged on the event loop.
+        """
+        try:
+            self._print_header(image_path)
+            processed_path = await asyncio.to_thread(self._preprocess_image, image_path)
+            return await self.extract_from_preprocessed_async(processed_path)
+            
+        except Exception as e:
+            print(f"❌ Pipeline Error: {e}", flush=True)
+            return []
+
+    def extract_from_preprocessed(self, processed_path):
+        """Hedged Claude/Pixtral extraction + fuzzy refinement for an already preprocessed image"""
+        # STEP 2: Claude Vision OCR, hedged with Pixtral if slow or low confidence
+        print("[2/3] Claude 3.5 Sonnet extraction...", flush=True)
+        report('extract', 'Claude 3.5 Sonnet extraction', engine='claude')
+        candidates, source = ocr_orchestrator.run([
+            ('claude', lambda: self._claude_ocr_json(processed_path)),
+            ('pixtral', lambda: self._pixtral_fallback(processed_path)),
+        ])
+        return self._finish(candidates, source)
+
+    async def extract_from_preprocessed_async(self, processed_path):
+        print("[2/3] Claude 3.5 Sonnet extraction...", flush=True)
+        report('extract', 'Claude 3.5 Sonnet extraction', engine='claude')
+        candidates, source = await ocr_orchestrator.run_async([
+            ('claude', lambda: self._claude_ocr_json_async(processed_path)),
+            ('pixtral', lambda: self._pixtral_fallback_async(processed_path)),
+        ])
+        return self._finish(candidates, source)
+
+    def stream_medicines(self, image_path):
+        """
+        Streaming pipeline. Claude's reply is only streamed when Pixtral can't be
+        tried (no Mistral engine, or its circuit is open), because then the
+        confidence gate can't change the outcome. Otherwise this runs the same
+        hedged, gated extraction as extract_medicines and yields its medicines
+        at the end, so a caller gets the same result either way.
+        """
+        self._print_header(image_path)
+        processed_path = self._preprocess_image(image_path)
+        if self._pixtral_available():
+            yield from self.extract_from_preprocessed(processed_path)
+            return
+
+        print("[2/3] Claude 3.5 Sonnet extraction (streaming)...", flush=True)
+        report('extract', 'Claude 3.5 Sonnet extraction', engine='claude', streaming=True)
+        yield from stream_refined(self._claude_stream_text(processed_path), self._normalize, self._fuzzy_refine)
+
+    def _print_header(self, image_path):
+        print(f"\n{'='*60}", flush=True)
+        print(f"CLAUDE OCR PIPELINE: Processing {os.path.basename(image_path)}", flush=True)
+        print(f"{'='*60}", flush=True)
+
+    def _preprocess_image(self, image_path):
+        """STEP 1: Preprocessing (returns the preprocessed image path)"""
+        print("[1/3] Preprocessing image...", flush=True)
+        report('preprocess', 'Preprocessing image')
+        from utils.image_preprocessor import preprocess_to_file
+        processed_path, _ = preprocess_to_file(image_path)
+        return processed_path
+
+    def _finish(self, candidates, source):
+        print(f"   Extracted {len(candidates)} medicine candidates ({source or 'no engine'})", flush=True)
+        
+        # STEP 3: Fuzzy Database Refinement
+        print("[3/3] Fuzzy database refinement...", flush=True)
+        report('refine', 'Fuzzy database refinement', candidates=len(candidates), source=source)
+        results = self._fuzzy_refine(candidates)
+        
+        if results:
+            avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
+            print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
+        else:
+            print(f"\n⚠️ No medicines extracted", flush=True)
+        
+        print(f"{'='*60}\n", flush=True)
+        return results
+
+    def _get_async_client(self):
+        """AsyncOpenAI client bound to the running event loop (created per loop)"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(base_url=BLACKBOX_BASE_URL, api_key=self.blackbox_key)
+            self._async_loop = loop
+        return self._async_client
+
+    def _claude_ocr_json(self, image_path):
+        """Claude 3.5 Sonnet: Image -> JSON (NO HARDCODING)"""
+        
+        if not self.client:
+            return []
+        
+        breaker = get_breaker('blackbox')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Claude: Blackbox circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return []
+        
+        try:
+            response = breaker.call(
+                self.client.chat.completions.create,
+                model=CLAUDE_MODEL,
+                messages=self._messages(image_path),
                 max_tokens=2000
             )
+            return self._parse_response(response.choices[0].message.content)
             
-            content = response.choices[0].message.content
-            print(f"   Claude raw output: {content[:100]}...", flush=True)
-            
-            # Parse JSON
-            content = content.replace("```json", "").replace("```", "").strip()
-            data = json.loads(content)
-            
-            medicines = data.get('medicines', [])
-            if isinstance(data, list):
-                medicines = data
-            
-            # Normalize
-            results = []
-            for item in medicines:
-                results.append({
-                    'medicine_name': item.get('name', item.get('medicine_name', 'Unknown')),
-                    'strength': item.get('strength', ''),
-                    'dosage': item.get('dosage', ''),
-                    'duration': str(item.get('duration', '')),
-                    'confidence': float(item.get('confidence', 0.85)),
-                    'original_text': item.get('raw_text', item.get('original_text', '')),
-                    'source': 'claude_3.5_sonnet'
-                })
-            
-            return results
+        except Exception as e:
+            print(f"   Claude Error: {e}", flush=True)
+            return []
+
+    async def _claude_ocr_json_async(self, image_path):
+        """Async variant of _claude_ocr_json"""
+        if not self.client:
+            return []
+        
+        breaker = get_breaker('blackbox')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Claude: Blackbox circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return []
+        
+        try:
+            messages = await asyncio.to_thread(self._messages, image_path)
+            response = await breaker.call_async(
+                self._get_async_client().chat.completions.create,
+                model=CLAUDE_MODEL,
+                messages=messages,
+                max_tokens=2000
+            )
+            return self._parse_response(response.choices[0].message.content)
             
         except Exception as e:
             print(f"   Claude Error: {e}", flush=True)
             return []
 
+    def _messages(self, image_path):
+        # Resize for optimal API transmission
+        image_b64, mime_type = encode_image_base64(image_path)
+        return [{
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_b64}"}},
+                {"type": "text", "text": CLAUDE_PROMPT}
+            ]
+        }]
+
+    def _parse_response(self, content):
+        """Claude JSON reply -> normalized medicine candidates"""
+        print(f"   Claude raw output: {content[:100]}...", flush=True)
+        
+        # Parse JSON
+        content = content.replace("```json", "").replace("```", "").strip()
+        data = json.loads(content)
+        
+        medicines = data.get('medicines', []) if isinstance(data, dict) else []
+        if isinstance(data, list):
+            medicines = data
+        
+        return self._normalize(medicines)
+
+    def _normalize(self, medicines):
+        results = []
+        for item in medicines:
+            results.append({
+                'medicine_name': item.get('name', item.get('medicine_name', 'Unknown')),
+                'strength': item.get('strength', ''),
+                'dosage': item.get('dosage', ''),
+                'duration': str(item.get('duration', '')),
+                'confidence': float(item.get('confidence', 0.85)),
+                'original_text': item.get('raw_text', item.get('original_text', '')),
+                'source': 'claude_3.5_sonnet'
+            })
+        return results
+
+    def _claude_stream_text(self, image_path):
+        """
+        Text chunks of a streamed Claude reply (nothing if the call fails before
+        any text; StreamTruncatedError if it fails partway through)
+        """
+        if not self.client:
+            return
+        
+        breaker = get_breaker('blackbox')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Claude: Blackbox circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return
+        
+        produced = False
+        try:
+            for text in breaker.stream(self._claude_stream_chunks, self._messages(image_path)):
+                produced = True
+                yield text
+            
+        except Exception as e:
+            if produced:
+                raise StreamTruncatedError(f"Claude stream broke off: {e}") from e
+            print(f"   Claude stream error: {e}", flush=True)
+
+    def _claude_stream_chunks(self, messages):
+        stream = self.client.chat.completions.create(
+            model=CLAUDE_MODEL,
+            messages=messages,
+            max_tokens=2000,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _pixtral_available(self):
+        """Whether the orchestrator could hedge or fall back to Pixtral right now"""
+        try:
+            from utils.engine_registry import engine_registry
+            return engine_registry.get('mistral') is not None and not get_breaker('mistral').is_open()
+        except Exception:
+            return False
+
     def _pixtral_fallback(self, image_path):
         """Pixtral 12B fallback if Claude fails"""
         try:
-            from utils.ocr_engine import MistralOnlyEngine
-            engine = MistralOnlyEngine()
+            from utils.engine_registry import engine_registry
+            engine = engine_registry.get('mistral')
+            if engine is None:
+                return []
             return engine._mistral_ocr_json(image_path)
         except Exception as e:
             print(f"   Pixtral fallback error: {e}", flush=True)
             return []
 
+    async def _pixtral_fallback_async(self, image_path):
+        try:
+            from utils.engine_registry import engine_registry
+            engine = engine_registry.get('mistral')
+            if engine is None:
+                return []
+            return await engine._mistral_ocr_json_async(image_path)
+        except Exception as e:
+            print(f"   Pixtral fallback error: {e}", flush=True)
+            return []
+
     def _fuzzy_refine(self, candidates):
         """Fuzzy refinement against REAL database (no prescription-specific names)"""
         try:
-            from utils.fuzzy_matcher import MedicineMatcher
-            matcher = MedicineMatcher()
+            from utils.fuzzy_matcher import get_matcher
+            matcher = get_matcher()
             
             results = []
             for item in candidates:
@@ -2,9 +2,9 @@
 Correction Feedback System
 Stores pharmacist corrections to improve future OCR accuracy
 """
-import sqlite3
 import os
 from datetime import datetime
+from utils.db import execute, query, query_one, transaction
 
 class CorrectionFeedback:
     """Track and learn from pharmacist corrections"""
@@ -17,26 +17,23 @@ class CorrectionFeedback:
     def _init_corrections_table(self):
         """Ensure corrections table exists"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS corrections (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    prescription_id TEXT NOT NULL,
-                    original_text TEXT NOT NULL,
-                    corrected_text TEXT NOT NULL,
-                    pharmacist_id TEXT,
-                    correction_type TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            # Index for faster lookups
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_original_text 
-                ON corrections(original_text)
-            ''')
-            conn.commit()
-            conn.close()
+            with transaction(self.db_path) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS corrections (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        prescription_id TEXT NOT NULL,
+                        original_text TEXT NOT NULL,
+                        corrected_text TEXT NOT NULL,
+                        pharmacist_id TEXT,
+                        correction_type TEXT,
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                # Index for faster lookups
+                conn.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_original_text 
+                    ON corrections(original_text)
+                ''')
         except Exception as e:
             print(f"⚠ Corrections table init error: {e}", flush=True)
     
@@ -44,15 +41,11 @@ class CorrectionFeedback:
                       pharmacist_id=None, correction_type='medicine_name'):
         """Store a correction for future reference"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
+            execute(self.db_path, '''
                 INSERT INTO corrections 
                 (prescription_id, original_text, corrected_text, pharmacist_id, correction_type)
                 VALUES (?, ?, ?, ?, ?)
             ''', (prescription_id, original_text, corrected_text, pharmacist_id, correction_type))
-            conn.commit()
-            conn.close()
             print(f"✓ Correction saved: '{original_text}' → '{corrected_text}'", flush=True)
         except Exception as e:
             print(f"⚠ Failed to save correction: {e}", flush=True)
@@ -60,9 +53,7 @@ class CorrectionFeedback:
     def get_correction_hint(self, ocr_text):
         """Check if we've seen this OCR error before"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
+            result = query_one(self.db_path, '''
                 SELECT corrected_text, COUNT(*) as frequency
                 FROM corrections
                 WHERE original_text = ?
@@ -70,8 +61,6 @@ class CorrectionFeedback:
                 ORDER BY frequency DESC
                 LIMIT 1
             ''', (ocr_text,))
-            result = cursor.fetchone()
-            conn.close()
             
             if result and result[1] >= 2:  # At least 2 pharmacists agreed
                 return result[0]
@@ -95,12 +84,24 @@ class CorrectionFeedback:
                     'medicine_name'
                 )
     
+    def get_correction_frequencies(self):
+        """How often each name was the corrected value: {corrected_text: count}"""
+        try:
+            results = query(self.db_path, '''
+                SELECT corrected_text, COUNT(*) as frequency
+                FROM corrections
+                WHERE correction_type = 'medicine_name'
+                GROUP BY corrected_text
+            ''')
+            return {r[0]: r[1] for r in results}
+        except Exception as e:
+            print(f"⚠ Correction frequency query error: {e}", flush=True)
+            return {}
+    
     def get_common_mistakes(self, limit=20):
         """Get most frequently corrected OCR mistakes"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
+            results = query(self.db_path, '''
                 SELECT original_text, corrected_text, COUNT(*) as frequency
                 FROM corrections
                 WHERE correction_type = 'medicine_name'
@@ -108,8 +109,6 @@ class CorrectionFeedback:
                 ORDER BY frequency DESC
                 LIMIT ?
             ''', (limit,))
-            results = cursor.fetchall()
-            conn.close()
             return [{'original': r[0], 'corrected': r[1], 'frequency': r[2]} for r in results]
         except Exception as e:
             print(f"⚠ Common mistakes query error: {e}", flush=True)
@@ -1,99 +1,76 @@
-from utils.correction_store import CorrectionStore
-import re
+import heapq
+
+from utils.correction_model import get_correction_model
+
+
+def _top(counts, limit):
+    """(key, count) pairs, most frequent first (limit=None for all)"""
+    if limit is None:
+        return sorted(counts.items(), key=lambda x: x[1], reverse=True)
+    return heapq.nlargest(limit, counts.items(), key=lambda x: x[1])
 
 
 class CorrectionInsights:
-    def __init__(self):
-        self.store = CorrectionStore()
-    
-    def get_common_misspellings(self):
+    """Insight queries served from the running aggregates in the shared correction model"""
+
+    def __init__(self, model=None):
+        self.model = model or get_correction_model()
+
+    def get_common_misspellings(self, limit=None):
         """
-        Extract common misspellings from corrections.
-        
+        Common misspellings (cleaned to the medicine name), most frequent first.
+
         Returns: dict mapping original OCR text to corrected medicine name
         Example: {"paracetmol": "paracetamol", "asprin": "aspirin"}
         """
         try:
-            corrections = self.store.load_all_corrections()
-            if not corrections:
-                return {}
-            
-            misspellings = {}
-            
-            for correction in corrections:
-                try:
-                    original_text = correction.get("original_ocr_text", "").strip().lower()
-                    corrected_fields = correction.get("corrected_fields", {})
-                    corrected_name = corrected_fields.get("medicine_name", "").strip().lower()
-                    
-                    # Skip if either is empty
-                    if not original_text or not corrected_name:
-                        continue
-                    
-                    # Extract medicine name from original text (before strength/dosage)
-                    original_name = self._extract_medicine_name(original_text)
-                    
-                    # Only record if names differ
-                    if original_name and original_name != corrected_name:
-                        misspellings[original_name] = corrected_name
-                
-                except (KeyError, TypeError, AttributeError):
-                    continue
-            
-            return misspellings
-        
+            misspellings = self.model.misspellings
+            counts = self.model.misspelling_counts
+            return {original: misspellings[original] for original, count in _top(counts, limit)
+                    if original in misspellings}
         except Exception:
             return {}
-    
-    def get_common_dosage_patterns(self):
+
+    def get_common_dosage_patterns(self, limit=20):
         """
-        Extract frequently corrected dosage patterns.
-        
+        Frequently corrected dosage patterns, most frequent first.
+
         Returns: list of corrected dosage patterns
         Example: ["1-0-1", "BID", "TID", "0-1-0"]
         """
         try:
-            corrections = self.store.load_all_corrections()
-            if not corrections:
-                return []
-            
-            dosage_counts = {}
-            
-            for correction in corrections:
-                try:
-                    corrected_fields = correction.get("corrected_fields", {})
-                    dosage = corrected_fields.get("dosage", "").strip().upper()
-                    
-                    # Skip empty dosages
-                    if not dosage:
-                        continue
-                    
-                    # Count occurrences
-                    dosage_counts[dosage] = dosage_counts.get(dosage, 0) + 1
-                
-                except (KeyError, TypeError, AttributeError):
-                    continue
-            
-            # Sort by frequency and return patterns
-            sorted_dosages = sorted(dosage_counts.items(), key=lambda x: x[1], reverse=True)
-            return [dosage for dosage, count in sorted_dosages]
-        
+            return [dosage for dosage, count in _top(self.model.dosage_counts, limit)]
         except Exception:
             return []
-    
-    def _extract_medicine_name(self, text):
-        """Extract medicine name from OCR text (before strength/dosage indicators)"""
+
+    def get_pharmacist_counts(self, limit=20):
+        """
+        Number of corrections submitted by each pharmacist.
+
+        Returns: dict mapping pharmacist id to correction count
+        """
         try:
-            # Remove common strength patterns
-            text = re.sub(r'\b\d+\.?\d*\s*(mg|ml|g|mcg|iu)\b', '', text, flags=re.IGNORECASE)
-            
-            # Remove common dosage patterns
-            text = re.sub(r'\b(\d+-\d+-\d+|bid|tid|qd|od|hs|prn|stat|sos)\b', '', text, flags=re.IGNORECASE)
-            
-            # Clean up whitespace
-            text = re.sub(r'\s+', ' ', text).strip()
-            
-            return text
-        
+            return dict(_top(self.model.pharmacist_counts, limit))
         except Exception:
-            return text
+            return {}
+
+    def get_summary(self, limit=20):
+        """Dashboard summary: totals plus the top misspellings, dosages and pharmacists"""
+        try:
+            return {
+                'version': self.model.version,
+                'total_corrections': self.model.correction_count,
+                'misspelling_count': len(self.model.misspellings),
+                'misspellings': self.get_common_misspellings(limit=limit),
+                'dosage_patterns': [
+                    {'dosage': dosage, 'count': count}
+                    for dosage, count in _top(self.model.dosage_counts, limit)
+                ],
+                'pharmacists': [
+                    {'pharmacist_id': pharmacist_id, 'count': count}
+                    for pharmacist_id, count in _top(self.model.pharmacist_counts, limit)
+                ]
+            }
+        except Exception as e:
+            print(f"⚠ Correction insights error: {e}", flush=True)
+            return {'total_corrections': 0, 'misspellings': {}, 'dosage_patterns': [], 'pharmacists': []}
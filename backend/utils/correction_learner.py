@@ -1,4 +1,5 @@
 from utils.correction_store import CorrectionStore
+from utils.correction_model import extract_medicine_name, get_correction_model
 from utils.medicine_matcher import MedicineMatcher
 from difflib import SequenceMatcher
 import re
@@ -10,47 +11,22 @@ class CorrectionLearner:
     def __init__(self):
         self.store = CorrectionStore()
         self.matcher = MedicineMatcher()
-        self.misspelling_map = {}
-        self.dosage_patterns = []
-        self._load_corrections()
+        # Shared, versioned model file: consistent across workers, hot-reloaded on change
+        self.model = get_correction_model()
     
-    def _load_corrections(self):
-        """Load historical corrections and build mappings"""
-        try:
-            corrections = self.store.load_all_corrections()
-            
-            for correction in corrections:
-                try:
-                    original = correction.get('original_ocr_text', '').strip().lower()
-                    corrected_fields = correction.get('corrected_fields', {})
-                    corrected_name = corrected_fields.get('medicine_name', '').strip().lower()
-                    
-                    if original and corrected_name:
-                        original_clean = self._extract_medicine_name(original)
-                        if original_clean != corrected_name:
-                            self.misspelling_map[original_clean] = corrected_name
-                    
-                    dosage = corrected_fields.get('dosage', '').strip().upper()
-                    if dosage and dosage not in self.dosage_patterns:
-                        self.dosage_patterns.append(dosage)
-                
-                except (KeyError, TypeError, AttributeError):
-                    continue
-        
-        except Exception:
-            pass
+    @property
+    def misspelling_map(self):
+        return self.model.misspellings
+    
+    @property
+    def dosage_patterns(self):
+        return self.model.dosage_patterns
     
     def _extract_medicine_name(self, text):
         """Extract medicine name from OCR text"""
-        try:
-            text = re.sub(r'\b\d+\.?\d*\s*(mg|ml|g|mcg|iu)\b', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'\b(\d+-\d+-\d+|bid|tid|qd|od|hs|prn|stat|sos)\b', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'\s+', ' ', text).strip()
-            return text
-        except Exception:
-            return text
+        return extract_medicine_name(text)
     
-    def suggest_correction(self, ocr_text, region='All', threshold=0.7):
+    def suggest_correction(self, ocr_text, region='All', threshold=0.7, user_region=None):
         """
         Suggest correction using medicine database and fuzzy matching.
         
@@ -58,6 +34,7 @@ class CorrectionLearner:
             ocr_text: OCR extracted text
             region: Region to search in ('All', 'Karnataka', 'Mysore', 'National')
             threshold: Minimum confidence threshold (0-1)
+            user_region: With region='All', the user's region is searched first
         
         Returns: List of suggestions with confidence scores
         """
@@ -73,7 +50,8 @@ class CorrectionLearner:
                 }]
             
             # Use medicine matcher for database lookup
-            matches = self.matcher.find_matches(ocr_clean, region=region, top_n=3, threshold=int(threshold * 100))
+            matches = self.matcher.find_matches(ocr_clean, region=region, top_n=3, threshold=int(threshold * 100),
+                                              user_region=user_region)
             
             suggestions = []
             for match in matches:
@@ -109,16 +87,8 @@ class CorrectionLearner:
             success = self.store.save_correction(correction_data)
             
             if success:
-                # Update internal mappings
-                original_clean = self._extract_medicine_name(original_text.lower())
-                corrected_name = corrected_fields.get('medicine_name', '').strip().lower()
-                
-                if original_clean and corrected_name and original_clean != corrected_name:
-                    self.misspelling_map[original_clean] = corrected_name
-                
-                dosage = corrected_fields.get('dosage', '').strip().upper()
-                if dosage and dosage not in self.dosage_patterns:
-                    self.dosage_patterns.append(dosage)
+                # Publish to every worker via the shared model
+                self.model.apply_correction(correction_data)
             
             return success
         
@@ -0,0 +1,256 @@
+"""
+Shared correction model
+A versioned misspelling/dosage model persisted next to the corrections history,
+with running aggregates (misspelling, dosage and per-pharmacist counts) that
+serve the insights dashboard without touching the history.
+Each correction is folded in incrementally under a file lock, and every worker
+hot-reloads the file when its version changes instead of rescanning the history.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from utils.file_lock import file_lock
+
+DEFAULT_MODEL_PATH = "data/correction_model.json"
+FORMAT_VERSION = 3
+# Seconds between checks of the model file for changes made by other workers
+RELOAD_INTERVAL = 2.0
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def extract_medicine_name(text):
+    """Extract medicine name from OCR text (before strength/dosage indicators)"""
+    try:
+        text = re.sub(r'\b\d+\.?\d*\s*(mg|ml|g|mcg|iu)\b', '', text, flags=re.IGNORECASE)
+        text = re.sub(r'\b(\d+-\d+-\d+|bid|tid|qd|od|hs|prn|stat|sos)\b', '', text, flags=re.IGNORECASE)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text
+    except Exception:
+        return text
+
+
+def empty_model():
+    return {
+        'format': FORMAT_VERSION,
+        'version': 0,
+        'corrections': 0,
+        'misspellings': {},
+        'misspelling_counts': {},
+        'dosage_patterns': [],
+        'dosage_counts': {},
+        'pharmacist_counts': {},
+    }
+
+
+def fold_correction(model, correction):
+    """Apply one correction entry to the model and its aggregates in place"""
+    try:
+        corrected_fields = correction.get('corrected_fields', {}) or {}
+        original = correction.get('original_ocr_text', '').strip().lower()
+        corrected_name = corrected_fields.get('medicine_name', '').strip().lower()
+        dosage = corrected_fields.get('dosage', '').strip().upper()
+        pharmacist_id = str(correction.get('pharmacist_id') or 'unknown')
+    except (KeyError, TypeError, AttributeError):
+        return
+
+    counts = model['pharmacist_counts']
+    counts[pharmacist_id] = counts.get(pharmacist_id, 0) + 1
+
+    if original and corrected_name:
+        original_clean = extract_medicine_name(original)
+        if original_clean and original_clean != corrected_name:
+            model['misspellings'][original_clean] = corrected_name
+            model['misspelling_counts'][original_clean] = model['misspelling_counts'].get(original_clean, 0) + 1
+
+    if dosage:
+        model['dosage_counts'][dosage] = model['dosage_counts'].get(dosage, 0) + 1
+        if dosage not in model['dosage_patterns']:
+            model['dosage_patterns'].append(dosage)
+
+
+class CorrectionModel:
+    """Process-local view of the shared model file"""
+
+    def __init__(self, path=DEFAULT_MODEL_PATH, store=None):
+        self.path = path
+        self.store = store
+        self.data = empty_model()
+        self._stat = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def version(self):
+        return self.data['version']
+
+    @property
+    def misspellings(self):
+        self.refresh()
+        return self.data['misspellings']
+
+    @property
+    def misspelling_counts(self):
+        self.refresh()
+        return self.data['misspelling_counts']
+
+    @property
+    def dosage_patterns(self):
+        self.refresh()
+        return self.data['dosage_patterns']
+
+    @property
+    def dosage_counts(self):
+        self.refresh()
+        return self.data['dosage_counts']
+
+    @property
+    def pharmacist_counts(self):
+        self.refresh()
+        return self.data['pharmacist_counts']
+
+    @property
+    def correction_count(self):
+        self.refresh()
+        return self.data['corrections']
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('format') == FORMAT_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        """Read the model file, building it from the corrections history if it doesn't exist yet"""
+        stat = self._file_stat()
+        if stat is None:
+            self.rebuild()
+            return
+        if stat == self._stat:
+            return
+
+        data = self._read()
+        if data is None:
+            self.rebuild()
+            return
+        with self._lock:
+            self.data = data
+            self._stat = stat
+
+    def refresh(self):
+        """Hot-reload when another worker has published a new version (checked at most every RELOAD_INTERVAL)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + RELOAD_INTERVAL
+        try:
+            self._load()
+        except Exception as e:
+            print(f"⚠ Correction model reload failed: {e}", flush=True)
+
+    def _get_store(self):
+        if self.store is None:
+            from utils.correction_store import CorrectionStore
+            self.store = CorrectionStore()
+        return self.store
+
+    def _build_from_history(self, version=0):
+        """Fold the full corrections history into a fresh model (caller holds the file lock)"""
+        data = empty_model()
+        data['version'] = version
+        for correction in self._get_store().iter_corrections():
+            fold_correction(data, correction)
+            data['corrections'] += 1
+        print(f"✓ Correction model rebuilt from {data['corrections']} corrections", flush=True)
+        return data
+
+    def _publish(self, data):
+        data['version'] += 1
+        self._write(data)
+        with self._lock:
+            self.data = data
+            self._stat = self._file_stat()
+        return data['version']
+
+    def rebuild(self):
+        """Rebuild from the full corrections history (one-off, e.g. first start or after corruption)"""
+        with file_lock(self.path):
+            previous = self._read()
+            data = self._build_from_history(previous['version'] if previous else 0)
+            self._publish(data)
+        return data
+
+    def apply_correction(self, correction):
+        """Fold a newly stored correction into the shared file and publish a new version"""
+        with file_lock(self.path):
+            data = self._read()
+            if data is None:
+                # The history already contains this correction
+                data = self._build_from_history()
+            else:
+                fold_correction(data, correction)
+                data['corrections'] += 1
+            return self._publish(data)
+
+    def add_correction(self, correction):
+        """Append a correction to the history and fold it into the shared model"""
+        if not self._get_store().save_correction(correction):
+            return None
+        return self.apply_correction(correction)
+
+
+def approval_corrections(prescription_id, original_medicines, edited_medicines, pharmacist_id=None):
+    """Correction entries (store format) for the medicines a pharmacist changed at approval"""
+    corrections = []
+    for original, edited in zip(original_medicines, edited_medicines):
+        original_name = original.get('medicine_name', original.get('name', '')) or ''
+        edited_name = edited.get('medicine_name', edited.get('name', '')) or ''
+        corrected_fields = {}
+        if edited_name and edited_name != original_name:
+            corrected_fields['medicine_name'] = edited_name
+        edited_dosage = edited.get('dosage', '') or ''
+        if edited_dosage and edited_dosage != (original.get('dosage', '') or ''):
+            corrected_fields['dosage'] = edited_dosage
+        if corrected_fields:
+            corrections.append({
+                'original_ocr_text': original_name,
+                'corrected_fields': corrected_fields,
+                'original_confidence': original.get('confidence', 0.0),
+                'pharmacist_id': pharmacist_id,
+                'image_reference': prescription_id
+            })
+    return corrections
+
+
+def get_correction_model(path=DEFAULT_MODEL_PATH):
+    """Shared per-process model instance for path"""
+    with _models_lock:
+        model = _models.get(path)
+        if model is None:
+            model = _models[path] = CorrectionModel(path)
+        return model
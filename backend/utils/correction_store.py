@@ -1,27 +1,102 @@
+import atexit
 import json
 import os
+import time
 from datetime import datetime
 
+from utils.file_lock import file_lock
+
+# fsync the log after this many appends or this many seconds, whichever comes first
+FSYNC_BATCH = 16
+FSYNC_INTERVAL = 1.0
+# Rewrite the log (dropping torn lines and duplicate retries) after this many appends
+COMPACT_EVERY = 1000
+
 
 class CorrectionStore:
-    def __init__(self, filepath="data/corrections.json"):
+    """
+    Append-only JSON Lines log of pharmacist corrections.
+    Each save appends one line under a cross-process file lock, so a save is
+    O(1) and concurrent approvals never overwrite each other.
+    """
+
+    def __init__(self, filepath="data/corrections.jsonl"):
         self.filepath = filepath
+        self.legacy_path = os.path.splitext(filepath)[0] + '.json'
+        self._log = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._appends = 0
         self._ensure_file_exists()
-    
+        atexit.register(self.close)
+
     def _ensure_file_exists(self):
-        """Create corrections file if it doesn't exist"""
+        """Create the log, migrating a legacy corrections.json array on first use"""
         try:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            if not os.path.exists(self.filepath):
-                with open(self.filepath, 'w') as f:
-                    json.dump([], f)
+            directory = os.path.dirname(self.filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.filepath):
+                return
+
+            with file_lock(self.filepath):
+                if os.path.exists(self.filepath):
+                    return
+                corrections = []
+                if self.legacy_path != self.filepath and os.path.exists(self.legacy_path):
+                    with open(self.legacy_path, 'r') as f:
+                        legacy = json.load(f)
+                    corrections = legacy if isinstance(legacy, list) else []
+                self._rewrite(corrections)
+                if corrections:
+                    print(f"✓ Migrated {len(corrections)} corrections from {self.legacy_path}", flush=True)
         except Exception:
             pass
-    
+
+    def _rewrite(self, corrections):
+        """Atomically replace the log with the given entries (caller holds the lock)"""
+        tmp_path = f"{self.filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            for correction in corrections:
+                f.write(json.dumps(correction) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+
+    def _open_log(self):
+        """Append handle for the current log file (reopened if compaction replaced it)"""
+        if self._log is not None:
+            try:
+                if os.fstat(self._log.fileno()).st_ino == os.stat(self.filepath).st_ino:
+                    return self._log
+            except OSError:
+                pass
+            self._log.close()
+        self._log = open(self.filepath, 'a')
+        return self._log
+
+    def _ends_mid_line(self):
+        """True if a crashed writer left a torn last line that the next append must not join"""
+        try:
+            with open(self.filepath, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b'\n'
+        except OSError:
+            return False
+
+    def _sync(self):
+        if self._log is not None and self._unsynced:
+            os.fsync(self._log.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
     def save_correction(self, correction_data):
         """
-        Save a correction entry to the JSON file.
-        
+        Append a correction entry to the log.
+
         Expected correction_data structure:
         {
             "original_ocr_text": str,
@@ -35,44 +110,90 @@ class CorrectionStore:
             "timestamp": str (ISO format),
             "image_reference": str
         }
-        
+
         Returns: True if successful, False otherwise
         """
         try:
             # Add timestamp if not provided
             if "timestamp" not in correction_data:
                 correction_data["timestamp"] = datetime.now().isoformat()
-            
-            # Load existing corrections
-            corrections = self.load_all_corrections()
-            
-            # Append new correction
-            corrections.append(correction_data)
-            
-            # Write back to file
-            with open(self.filepath, 'w') as f:
-                json.dump(corrections, f, indent=2)
-            
+
+            line = json.dumps(correction_data) + '\n'
+            with file_lock(self.filepath):
+                log = self._open_log()
+                if self._ends_mid_line():
+                    line = '\n' + line
+                log.write(line)
+                log.flush()
+                self._unsynced += 1
+                if self._unsynced >= FSYNC_BATCH or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                    self._sync()
+
+            self._appends += 1
+            if self._appends >= COMPACT_EVERY:
+                self.compact()
+
             return True
-        
+
         except Exception:
             return False
-    
+
+    def iter_corrections(self):
+        """
+        Stream corrections from the log one entry at a time.
+        Torn or malformed lines (e.g. from a crash mid-write) are skipped.
+        """
+        try:
+            with open(self.filepath, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        correction = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(correction, dict):
+                        yield correction
+        except OSError:
+            return
+
     def load_all_corrections(self):
         """
-        Load all corrections from the JSON file.
-        
+        Load all corrections from the log.
+
         Returns: List of correction entries, or empty list if error
         """
         try:
-            if not os.path.exists(self.filepath):
-                self._ensure_file_exists()
-                return []
-            
-            with open(self.filepath, 'r') as f:
-                corrections = json.load(f)
-            
-            return corrections if isinstance(corrections, list) else []
-        
+            return list(self.iter_corrections())
         except Exception:
             return []
+
+    def compact(self):
+        """Rewrite the log without torn lines or duplicate entries; returns entries kept"""
+        try:
+            with file_lock(self.filepath):
+                self._sync()
+                seen = set()
+                corrections = []
+                for correction in self.iter_corrections():
+                    key = json.dumps(correction, sort_keys=True)
+                    if key not in seen:
+                        seen.add(key)
+                        corrections.append(correction)
+                self._rewrite(corrections)
+            self._appends = 0
+            return len(corrections)
+        except Exception as e:
+            print(f"⚠ Correction log compaction failed: {e}", flush=True)
+            return None
+
+    def close(self):
+        """fsync any batched appends and release the log handle"""
+        try:
+            if self._log is not None:
+                self._sync()
+                self._log.close()
+                self._log = None
+        except Exception:
+            pass
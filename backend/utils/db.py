@@ -0,0 +1,179 @@
+"""
+Shared SQLite access layer for pharmacy.db
+Per-thread pooled connections with tuned pragmas, cached prepared
+statements and query timing instrumentation.
+
+Connections never change the journal mode, so opening the checked-in
+database leaves it (and the working tree) untouched. Deployments switch a
+database to WAL once with enable_wal(), e.g. via the catalog loader CLI;
+the mode persists in the file and later connections pick it up.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Applied to every connection when it is opened
+PRAGMAS = [
+    ('cache_size', -16000),          # 16 MB page cache (negative = KiB)
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+]
+
+# sqlite3 keeps compiled statements per connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = 256
+SLOW_QUERY_MS = 200
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_query_stats = {}
+
+
+def connect(db_path):
+    """Open a new (unpooled) connection with the tuned pragmas applied"""
+    conn = sqlite3.connect(db_path, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in PRAGMAS:
+        try:
+            conn.execute(f"PRAGMA {name}={value}")
+        except sqlite3.DatabaseError as e:
+            print(f"⚠ PRAGMA {name} not applied on {db_path}: {e}", flush=True)
+    try:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            conn.execute('PRAGMA synchronous=NORMAL')  # safe with WAL, far fewer fsyncs
+    except sqlite3.DatabaseError:
+        pass
+    return conn
+
+
+def enable_wal(db_path):
+    """
+    Switch db_path to WAL mode so readers never block the writer.
+    The mode is stored in the database file; run this from the deploy/load
+    step, not per connection, since it rewrites the file and adds -wal/-shm files.
+    """
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    try:
+        mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        print(f"⚠ WAL mode not enabled on {db_path}: {e}", flush=True)
+        return False
+    finally:
+        conn.close()
+    return mode == 'wal'
+
+
+def get_connection(db_path):
+    """Return this thread's pooled connection for db_path, opening it on first use"""
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        pool = _local.connections = {}
+
+    key = os.path.abspath(db_path)
+    conn = pool.get(key)
+    if conn is None:
+        conn = pool[key] = connect(db_path)
+    return conn
+
+
+def close_connections():
+    """Close every pooled connection owned by the current thread"""
+    pool = getattr(_local, 'connections', {})
+    for conn in pool.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    pool.clear()
+
+
+def _record(sql, elapsed_ms):
+    key = ' '.join(sql.split())
+    with _stats_lock:
+        stats = _query_stats.setdefault(key, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        print(f"⚠ Slow query ({elapsed_ms:.0f} ms): {key[:120]}", flush=True)
+
+
+def query(db_path, sql, params=()):
+    """Run a read query on the pooled connection and return all rows"""
+    start = time.perf_counter()
+    rows = get_connection(db_path).execute(sql, params).fetchall()
+    _record(sql, (time.perf_counter() - start) * 1000)
+    return rows
+
+
+def query_one(db_path, sql, params=()):
+    """Run a read query on the pooled connection and return the first row (or None)"""
+    start = time.perf_counter()
+    row = get_connection(db_path).execute(sql, params).fetchone()
+    _record(sql, (time.perf_counter() - start) * 1000)
+    return row
+
+
+def execute(db_path, sql, params=()):
+    """Run a single write statement in its own transaction; returns the cursor"""
+    start = time.perf_counter()
+    conn = get_connection(db_path)
+    with conn:
+        cursor = conn.execute(sql, params)
+    _record(sql, (time.perf_counter() - start) * 1000)
+    return cursor
+
+
+@contextmanager
+def transaction(db_path):
+    """Yield the pooled connection inside a transaction (commit on success, rollback on error)"""
+    start = time.perf_counter()
+    conn = get_connection(db_path)
+    with conn:
+        yield conn
+    _record('<transaction>', (time.perf_counter() - start) * 1000)
+
+
+def get_query_stats():
+    """Snapshot of per-statement timings: {sql: {calls, total_ms, max_ms, avg_ms}}"""
+    with _stats_lock:
+        return {
+            sql: {**stats, 'avg_ms': round(stats['total_ms'] / stats['calls'], 3)}
+            for sql, stats in _query_stats.items()
+        }
+
+
+def get_catalog_version(db_path, key='version'):
+    """Version counter from catalog_meta ('version' for the catalog, 'inventory_version' for stock); 0 if unset"""
+    if not os.path.exists(db_path):
+        return 0
+    try:
+        row = query_one(db_path, "SELECT value FROM catalog_meta WHERE key = ?", (key,))
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+class CatalogWatcher:
+    """Throttled check for catalog reloads so in-memory indexes can be rebuilt"""
+
+    def __init__(self, db_path, interval=5.0, key='version'):
+        self.db_path = db_path
+        self.interval = interval
+        self.key = key
+        self.version = get_catalog_version(db_path, key)
+        self._next_check = time.monotonic() + interval
+
+    def changed(self):
+        """True once per catalog version bump (checks the database at most every interval seconds)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.interval
+
+        version = get_catalog_version(self.db_path, self.key)
+        if version == self.version:
+            return False
+        self.version = version
+        return True
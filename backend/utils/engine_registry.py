@@ -0,0 +1,132 @@
+"""
+OCR Engine Registry
+Builds each configured OCR engine once per process (lazily, thread-safe) so
+requests reuse configured API clients, and reports engine health.
+
+Configuration (environment):
+    OCR_ENGINES=gemini,claude   # preference order; first available engine is used
+"""
+import importlib
+import os
+import threading
+import time
+
+from utils.circuit_breaker import get_breaker
+
+# name -> (module, class)
+ENGINE_CLASSES = {
+    'gemini': ('utils.gemini_ocr_engine', 'GeminiOCREngine'),
+    'claude': ('utils.claude_ocr_engine', 'ClaudeOCREngine'),
+    'mistral': ('utils.ocr_engine', 'MistralOnlyEngine'),
+}
+# engine name -> API provider whose circuit breaker guards it
+ENGINE_PROVIDERS = {
+    'gemini': 'gemini',
+    'claude': 'blackbox',
+    'mistral': 'mistral',
+}
+DEFAULT_ENGINES = 'gemini'
+# An engine that failed to initialise is not retried for this many seconds
+RETRY_AFTER = 60.0
+
+
+def configured_engines():
+    """Engine names from OCR_ENGINES, in preference order (unknown names are ignored)"""
+    names = [name.strip().lower() for name in os.getenv('OCR_ENGINES', DEFAULT_ENGINES).split(',')]
+    return [name for name in names if name in ENGINE_CLASSES] or [DEFAULT_ENGINES]
+
+
+def _is_ready(engine):
+    """Engines disable themselves (client/model None) when their API key is missing"""
+    for attr in ('model', 'client', 'mistral_client'):
+        if hasattr(engine, attr):
+            return getattr(engine, attr) is not None
+    return True
+
+
+class EngineRegistry:
+    """Process-wide cache of OCR engine instances"""
+
+    def __init__(self):
+        self._engines = {}
+        self._status = {}
+        self._locks = {name: threading.Lock() for name in ENGINE_CLASSES}
+
+    def get(self, name):
+        """Return the shared engine instance for name, building it on first use (None if unavailable)"""
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        if name not in ENGINE_CLASSES:
+            raise ValueError(f"Unknown OCR engine: {name}")
+
+        with self._locks[name]:
+            engine = self._engines.get(name)
+            if engine is not None:
+                return engine
+
+            status = self._status.get(name)
+            if status and status['status'] == 'unavailable' and time.monotonic() < status['retry_at']:
+                return None
+
+            start = time.perf_counter()
+            try:
+                module_name, class_name = ENGINE_CLASSES[name]
+                engine = getattr(importlib.import_module(module_name), class_name)()
+                if not _is_ready(engine):
+                    raise RuntimeError("engine not configured (missing API key?)")
+            except Exception as e:
+                self._status[name] = {
+                    'status': 'unavailable',
+                    'error': str(e),
+                    'retry_at': time.monotonic() + RETRY_AFTER
+                }
+                print(f"⚠ OCR engine '{name}' unavailable: {e}", flush=True)
+                return None
+
+            self._status[name] = {
+                'status': 'ready',
+                'init_ms': round((time.perf_counter() - start) * 1000, 1),
+                'loaded_at': time.time()
+            }
+            self._engines[name] = engine
+            print(f"✓ OCR engine '{name}' ready", flush=True)
+            return engine
+
+    def get_ocr_engine(self):
+        """
+        First available engine in the configured preference order whose provider
+        circuit is closed; if every circuit is open, the first available engine
+        (its breaker lets a probe through once the cool-down has passed).
+        """
+        names = configured_engines()
+        fallback = None
+        for name in names:
+            engine = self.get(name)
+            if engine is None:
+                continue
+            if not get_breaker(ENGINE_PROVIDERS[name]).is_open():
+                return engine
+            if fallback is None:
+                fallback = engine
+        if fallback is not None:
+            return fallback
+        raise RuntimeError(f"No OCR engine available (configured: {', '.join(names)})")
+
+    def health(self):
+        """Status of each configured engine (ready / unavailable / not_loaded) with its provider's circuit health"""
+        report = {}
+        for name in configured_engines():
+            status = dict(self._status.get(name, {'status': 'not_loaded'}))
+            status.pop('retry_at', None)
+            status['circuit'] = get_breaker(ENGINE_PROVIDERS[name]).health()
+            report[name] = status
+        return report
+
+
+# Global instance
+engine_registry = EngineRegistry()
+
+
+def get_ocr_engine():
+    return engine_registry.get_ocr_engine()
@@ -5,91 +5,134 @@ Uses rapidfuzz to correct OCR errors against a comprehensive Indian medicine dat
 from rapidfuzz import process, fuzz
 import json
 import os
+import threading
+from utils.db import CatalogWatcher, query
+from utils.phonetic import PhoneticIndex, fold_confusables
+from utils.symspell import DEFAULT_PATH as SYMSPELL_PATH, SymSpellDictionary
+
+SQLITE_PATH = os.path.join(os.path.dirname(__file__), '../database/pharmacy.db')
+# Without a current prebuilt dictionary, only catalogs this small are indexed at startup
+SYMSPELL_INLINE_LIMIT = 20000
+
+
+def load_medicine_names():
+    """Load Indian medicine brands database (catalog names for fuzzy matching)"""
+    # Priority: Common Indian brands (expandable)
+    common_brands = [
+        # Pain & Inflammation
+        "Zerodol", "Zerodol-SP", "Zerodol-P", "Zerodol-MR",
+        "Voldol", "Veldol", "Veldol-Plus",
+        "Etosun", "Etosun-MR", "Etoricoxib",
+        "Pain-O-Soma", "Paracetamol", "PCM",
+        "Volini", "Volini Gel", "Volini Spray",
+        "Crocin", "Crocin Advance", "Crocin Pain Relief",
+        "Dolo-650", "Dolo", "Dolo-500",
+        "Combiflam", "Combiflam Plus",
+        "Ibuprofen", "Brufen",
+        "Diclofenac", "Aceclofenac",
+        "Tramadol", "Ultracet",
+
+        # Antibiotics
+        "Azithromycin", "Azee", "Azithral",
+        "Amoxicillin", "Mox", "Augmentin",
+        "Ciprofloxacin", "Cipro", "Ciplox",
+        "Cefixime", "Taxim-O",
+
+        # Topical
+        "Clobetasol", "Clob-MR", "Dermovate",
+        "Betamethasone", "Betnovate",
+        "Lidocaine", "Lignocaine",
+        "Mupirocin", "T-Bact",
+
+        # Antivirals
+        "Valacyclovir", "Valcivir",
+        "Acyclovir", "Zovirax",
+
+        # Antifungals
+        "Fluconazole", "Forcan",
+        "Itraconazole", "Candistat",
+
+        # Gastro
+        "Omeprazole", "Omez",
+        "Pantoprazole", "Pan", "Pan-40",
+        "Ranitidine", "Aciloc",
+
+        # Others
+        "Montelukast", "Montair",
+        "Cetirizine", "Zyrtec",
+        "Salbutamol", "Asthalin",
+    ]
+
+    # Load from JSON file if exists
+    db_path = os.path.join(os.path.dirname(__file__), '../database/medicines.json')
+    if os.path.exists(db_path):
+        try:
+            with open(db_path, 'r', encoding='utf-8') as f:
+                db_data = json.load(f)
+                if isinstance(db_data, list):
+                    common_brands.extend([m if isinstance(m, str) else m.get('name', '') for m in db_data])
+                elif isinstance(db_data, dict) and 'brands' in db_data:
+                    common_brands.extend(db_data['brands'])
+        except Exception as e:
+            print(f"Warning: Could not load medicines.json: {e}", flush=True)
+
+    # Load from SQLite database
+    if os.path.exists(SQLITE_PATH):
+        try:
+            for row in query(SQLITE_PATH, "SELECT generic_name, brand_name FROM medicines"):
+                common_brands.append(row[0])  # generic_name
+                common_brands.append(row[1])  # brand_name
+            print(f"✓ Loaded medicines from pharmacy.db", flush=True)
+        except Exception as e:
+            print(f"Warning: Could not load pharmacy.db: {e}", flush=True)
+
+    # Remove duplicates and empty strings
+    return list(set(filter(None, common_brands)))
+
+
+_shared_matcher = None
+_shared_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """Process-wide MedicineMatcher, built once so its indexes are reused across requests"""
+    global _shared_matcher
+    if _shared_matcher is None:
+        with _shared_matcher_lock:
+            if _shared_matcher is None:
+                _shared_matcher = MedicineMatcher()
+    return _shared_matcher
+
 
 class MedicineMatcher:
     def __init__(self):
-        self.medicines = self._load_database()
+        self.catalog_watcher = CatalogWatcher(SQLITE_PATH)
+        self._load_indexes()
         print(f"Loaded {len(self.medicines)} medicines for fuzzy matching", flush=True)
     
-    def _load_database(self):
-        """Load Indian medicine brands database"""
-        # Priority: Common Indian brands (expandable)
-        common_brands = [
-            # Pain & Inflammation
-            "Zerodol", "Zerodol-SP", "Zerodol-P", "Zerodol-MR",
-            "Voldol", "Veldol", "Veldol-Plus",
-            "Etosun", "Etosun-MR", "Etoricoxib",
-            "Pain-O-Soma", "Paracetamol", "PCM",
-            "Volini", "Volini Gel", "Volini Spray",
-            "Crocin", "Crocin Advance", "Crocin Pain Relief",
-            "Dolo-650", "Dolo", "Dolo-500",
-            "Combiflam", "Combiflam Plus",
-            "Ibuprofen", "Brufen",
-            "Diclofenac", "Aceclofenac",
-            "Tramadol", "Ultracet",
-            
-            # Antibiotics
-            "Azithromycin", "Azee", "Azithral",
-            "Amoxicillin", "Mox", "Augmentin",
-            "Ciprofloxacin", "Cipro", "Ciplox",
-            "Cefixime", "Taxim-O",
-            
-            # Topical
-            "Clobetasol", "Clob-MR", "Dermovate",
-            "Betamethasone", "Betnovate",
-            "Lidocaine", "Lignocaine",
-            "Mupirocin", "T-Bact",
-            
-            # Antivirals
-            "Valacyclovir", "Valcivir",
-            "Acyclovir", "Zovirax",
-            
-            # Antifungals
-            "Fluconazole", "Forcan",
-            "Itraconazole", "Candistat",
-            
-            # Gastro
-            "Omeprazole", "Omez",
-            "Pantoprazole", "Pan", "Pan-40",
-            "Ranitidine", "Aciloc",
-            
-            # Others
-            "Montelukast", "Montair",
-            "Cetirizine", "Zyrtec",
-            "Salbutamol", "Asthalin",
-        ]
-        
-        # Load from JSON file if exists
-        db_path = os.path.join(os.path.dirname(__file__), '../database/medicines.json')
-        if os.path.exists(db_path):
-            try:
-                with open(db_path, 'r', encoding='utf-8') as f:
-                    db_data = json.load(f)
-                    if isinstance(db_data, list):
-                        common_brands.extend([m if isinstance(m, str) else m.get('name', '') for m in db_data])
-                    elif isinstance(db_data, dict) and 'brands' in db_data:
-                        common_brands.extend(db_data['brands'])
-            except Exception as e:
-                print(f"Warning: Could not load medicines.json: {e}", flush=True)
-        
-        # Load from SQLite database
-        sqlite_path = os.path.join(os.path.dirname(__file__), '../database/pharmacy.db')
-        if os.path.exists(sqlite_path):
-            try:
-                import sqlite3
-                conn = sqlite3.connect(sqlite_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT generic_name, brand_name FROM medicines")
-                for row in cursor.fetchall():
-                    common_brands.append(row[0])  # generic_name
-                    common_brands.append(row[1])  # brand_name
-                conn.close()
-                print(f"✓ Loaded medicines from pharmacy.db", flush=True)
-            except Exception as e:
-                print(f"Warning: Could not load pharmacy.db: {e}", flush=True)
+    def _load_indexes(self):
+        """(Re)load the name list and the SymSpell / phonetic indexes built over it"""
+        medicines = load_medicine_names()
+        self.symspell = self._load_symspell(medicines)
+        self.phonetic_index = PhoneticIndex(medicines)
+        self.medicines = medicines
+    
+    def _load_symspell(self, medicines):
+        """Prebuilt dictionary for the current catalog version, else an inline build for small catalogs"""
+        version = self.catalog_watcher.version
+        dictionary = SymSpellDictionary.load(SYMSPELL_PATH)
+        if dictionary is None or dictionary.catalog_version != version:
+            if len(medicines) > SYMSPELL_INLINE_LIMIT:
+                print("⚠ SymSpell dictionary missing or stale, skipping (build with: python -m utils.symspell)", flush=True)
+                return None
+            dictionary = SymSpellDictionary(medicines, catalog_version=version)
         
-        # Remove duplicates and empty strings
-        return list(set(filter(None, common_brands)))
+        try:
+            from utils.correction_feedback import correction_feedback
+            dictionary.set_frequencies(correction_feedback.get_correction_frequencies())
+        except Exception:
+            pass  # Priors only break ties; keep the build-time ones
+        return dictionary
     
     def fuzzy_correct(self, medicine_name, threshold=80):
         """
@@ -105,6 +148,9 @@ class MedicineMatcher:
         if not medicine_name or len(medicine_name) < 3:
             return medicine_name, 0.0
         
+        if self.catalog_watcher.changed():
+            self._load_indexes()
+        
         # STEP 1: Check correction feedback first
         try:
             from utils.correction_feedback import correction_feedback
@@ -115,7 +161,30 @@ class MedicineMatcher:
         except Exception as e:
             pass  # Silently continue if feedback unavailable
         
-        # STEP 2: Use token_set_ratio for better partial matching
+        # STEP 2: SymSpell symmetric-delete lookup for 1-2 character OCR errors
+        if self.symspell is not None:
+            match_name, _ = self.symspell.lookup(medicine_name)
+            if match_name:
+                # Scored on confusable-folded forms so "Zer0dol" vs "Zerodol" is not penalised
+                score = fuzz.ratio(fold_confusables(medicine_name), fold_confusables(match_name))
+                if score >= threshold:
+                    return match_name, score / 100.0
+        
+        # STEP 3: Phonetic / confusable-character key lookup ("Dolo 6S0" -> "Dolo 650")
+        # Scores only the small bucket sharing the key before the full scan; plain ratio,
+        # since token_set_ratio gives 100 to a query that is a token subset of a longer name
+        candidates = self.phonetic_index.candidates(medicine_name)
+        if candidates:
+            result = process.extractOne(
+                fold_confusables(medicine_name),
+                candidates,
+                scorer=fuzz.ratio
+            )
+            if result and result[1] >= threshold:
+                _, score, match_name = result
+                return match_name, score / 100.0
+        
+        # STEP 4: Use token_set_ratio for better partial matching
         # This handles cases like "Zerodol SP" vs "Zerodol-SP"
         result = process.extractOne(
             medicine_name,
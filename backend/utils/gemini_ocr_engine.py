@@ -4,89 +4,25 @@ Latest model with superior vision and reasoning capabilities
 """
 import os
 import json
-import cv2
 import time
+import asyncio
 from dotenv import load_dotenv
 import google.generativeai as genai
 
-load_dotenv()
+from utils.batch_ocr import build_batch_prompt, image_label, split_batch_response
+from utils.circuit_breaker import get_breaker
+from utils.image_encoding import encode_image_for_api
+from utils.progress import report
+from utils.streaming_json import StreamTruncatedError, stream_refined
 
-class GeminiOCREngine:
-    """
-    Gemini 2.5 Pro for Indian prescription OCR
-    Latest model with enhanced vision and 15 RPM rate limit
-    """
-    def __init__(self):
-        # Try new API key first, fallback to old key
-        self.api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_AI_STUDIO_KEY")
-        
-        if not self.api_key:
-            print("⚠️ No Google API key found, Gemini engine disabled", flush=True)
-            self.model = None
-        else:
-            try:
-                genai.configure(api_key=self.api_key)
-                # Use gemini-2.5-pro - latest model with superior vision capabilities
-                # Rate limit: 15 RPM with new key
-                self.model = genai.GenerativeModel('gemini-2.5-pro')
-                print(f"✓ Gemini 2.5 Pro initialized (using {'GOOGLE_API_KEY' if os.getenv('GOOGLE_API_KEY') else 'GOOGLE_AI_STUDIO_KEY'})", flush=True)
-            except Exception as e:
-                print(f"⚠️ Gemini initialization error: {e}", flush=True)
-                self.model = None
+load_dotenv()
 
-    def extract_medicines(self, image_path):
-        """
-        Main extraction pipeline: Preprocess -> Gemini Vision -> Fuzzy refinement
-        """
-        try:
-            print(f"\n{'='*60}", flush=True)
-            print(f"GEMINI OCR PIPELINE: Processing {os.path.basename(image_path)}", flush=True)
-            print(f"{'='*60}", flush=True)
-            
-            # STEP 1: Preprocessing
-            print("[1/3] Preprocessing image...", flush=True)
-            from utils.image_preprocessor import ImagePreprocessor
-            preprocessor = ImagePreprocessor(handwriting_mode=True)
-            processed_img, quality_report = preprocessor.preprocess(image_path)
-            
-            processed_path = image_path.replace('.', '_preprocessed.')
-            if not processed_path.endswith(('.jpg', '.jpeg', '.png')):
-                processed_path = image_path.rsplit('.', 1)[0] + '_preprocessed.jpg'
-            preprocessor.save_preprocessed_image(processed_img, processed_path)
-            print(f"   Quality: {quality_report.get('quality_score', 'unknown')}", flush=True)
-            
-            # STEP 2: Gemini Vision OCR
-            print("[2/3] Gemini 2.5 Pro extraction...", flush=True)
-            candidates = self._gemini_ocr_json(processed_path)
-            
-            print(f"   Extracted {len(candidates)} medicine candidates", flush=True)
-            
-            # STEP 3: Fuzzy Database Refinement
-            print("[3/3] Fuzzy database refinement...", flush=True)
-            results = self._fuzzy_refine(candidates)
-            
-            if results:
-                avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
-                print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
-            else:
-                print(f"\n⚠️ No medicines extracted", flush=True)
-            
-            print(f"{'='*60}\n", flush=True)
-            return results
-            
-        except Exception as e:
-            print(f"❌ Pipeline Error: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            return []
+# Longest side of the image sent to Gemini (handwriting needs more detail than printed text)
+GEMINI_MAX_DIM = 1600
+# Inline parts count toward Gemini's 20 MB request limit; larger images use the file API
+GEMINI_INLINE_MAX_BYTES = 15 * 1024 * 1024
 
-    def _gemini_ocr_json(self, image_path):
-        """Gemini 2.5 Pro: Image -> JSON with Indian Pharmacist expertise"""
-        
-        if not self.model:
-            return []
-        
-        GEMINI_PROMPT = """Role: Expert Pharmacist specializing in Indian handwritten prescriptions (English, Hindi, Kannada).
+GEMINI_PROMPT = """Role: Expert Pharmacist specializing in Indian handwritten prescriptions (English, Hindi, Kannada).
 Task: Extract medications AND supplies into JSON from multilingual prescriptions.
 
 LANGUAGE SUPPORT:
@@ -129,16 +65,135 @@ JSON Format:
 }
 
 Return ONLY valid JSON. No markdown. Extract EVERYTHING including bandages."""
+
+class GeminiOCREngine:
+    """
+    Gemini 2.5 Pro for Indian prescription OCR
+    Latest model with enhanced vision and 15 RPM rate limit
+    """
+    def __init__(self):
+        # Try new API key first, fallback to old key
+        self.api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_AI_STUDIO_KEY")
+        
+        if not self.api_key:
+            print("⚠️ No Google API key found, Gemini engine disabled", flush=True)
+            self.model = None
+        else:
+            try:
+                genai.configure(api_key=self.api_key)
+                # Use gemini-2.5-pro - latest model with superior vision capabilities
+                # Rate limit: 15 RPM with new key
+                self.model = genai.GenerativeModel('gemini-2.5-pro')
+                print(f"✓ Gemini 2.5 Pro initialized (using {'GOOGLE_API_KEY' if os.getenv('GOOGLE_API_KEY') else 'GOOGLE_AI_STUDIO_KEY'})", flush=True)
+            except Exception as e:
+                print(f"⚠️ Gemini initialization error: {e}", flush=True)
+                self.model = None
+
+    def extract_medicines(self, image_path):
+        """
+        Main extraction pipeline: Preprocess -> Gemini Vision -> Fuzzy refinement
+        """
+        try:
+            self._print_header(image_path)
+            processed_path = self._preprocess_image(image_path)
+            return self.extract_from_preprocessed(processed_path)
+            
+        except Exception as e:
+            print(f"❌ Pipeline Error: {e}", flush=True)
+            import traceback
+            traceback.print_exc()
+            return []
+
+    async def extract_medicines_async(self, image_path):
+        """
+        Async pipeline for batch OCR: preprocessing runs in a worker thread and the
+        Gemini call uses the SDK's async client, so many prescriptions can be in
+        flight from one event loop.
+        """
+        try:
+            self._print_header(image_path)
+            processed_path = await asyncio.to_thread(self._preprocess_image, image_path)
+            return await self.extract_from_preprocessed_async(processed_path)
+            
+        except Exception as e:
+            print(f"❌ Pipeline Error: {e}", flush=True)
+            return []
+
+    def extract_from_preprocessed(self, processed_path):
+        """Gemini Vision + fuzzy refinement for an already preprocessed image"""
+        # STEP 2: Gemini Vision OCR
+        print("[2/3] Gemini 2.5 Pro extraction...", flush=True)
+        report('extract', 'Gemini 2.5 Pro extraction', engine='gemini')
+        candidates = self._gemini_ocr_json(processed_path)
+        return self._finish(candidates)
+
+    async def extract_from_preprocessed_async(self, processed_path):
+        print("[2/3] Gemini 2.5 Pro extraction...", flush=True)
+        report('extract', 'Gemini 2.5 Pro extraction', engine='gemini')
+        candidates = await self._gemini_ocr_json_async(processed_path)
+        return self._finish(candidates)
+
+    def stream_medicines(self, image_path):
+        """
+        Streaming pipeline: yields each refined medicine as soon as Gemini has
+        finished writing its JSON object, instead of after the whole reply.
+        """
+        self._print_header(image_path)
+        processed_path = self._preprocess_image(image_path)
+        print("[2/3] Gemini 2.5 Pro extraction (streaming)...", flush=True)
+        report('extract', 'Gemini 2.5 Pro extraction', engine='gemini', streaming=True)
+        yield from stream_refined(self._gemini_stream_text(processed_path), self._normalize, self._fuzzy_refine)
+
+    def _print_header(self, image_path):
+        print(f"\n{'='*60}", flush=True)
+        print(f"GEMINI OCR PIPELINE: Processing {os.path.basename(image_path)}", flush=True)
+        print(f"{'='*60}", flush=True)
+
+    def _preprocess_image(self, image_path):
+        """STEP 1: Preprocessing (returns the preprocessed image path)"""
+        print("[1/3] Preprocessing image...", flush=True)
+        report('preprocess', 'Preprocessing image')
+        from utils.image_preprocessor import preprocess_to_file
+        processed_path, quality_report = preprocess_to_file(image_path)
+        print(f"   Quality: {quality_report.get('quality_score', 'unknown')}", flush=True)
+        return processed_path
+
+    def _finish(self, candidates):
+        print(f"   Extracted {len(candidates)} medicine candidates", flush=True)
+        
+        # STEP 3: Fuzzy Database Refinement
+        print("[3/3] Fuzzy database refinement...", flush=True)
+        report('refine', 'Fuzzy database refinement', candidates=len(candidates))
+        results = self._fuzzy_refine(candidates)
+        
+        if results:
+            avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
+            print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
+        else:
+            print(f"\n⚠️ No medicines extracted", flush=True)
+        
+        print(f"{'='*60}\n", flush=True)
+        return results
+
+    def _gemini_ocr_json(self, image_path):
+        """Gemini 2.5 Pro: Image -> JSON with Indian Pharmacist expertise"""
         
+        if not self.model:
+            return []
+
+        breaker = get_breaker('gemini')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Gemini: circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return []
+        
+        uploaded_file = None
         try:
-            # Upload image to Gemini
-            print(f"   Uploading image to Gemini...", flush=True)
-            uploaded_file = genai.upload_file(image_path)
-            print(f"   File uploaded: {uploaded_file.name}", flush=True)
+            image_part, uploaded_file = self._image_part(image_path)
             
             # Generate response with low temperature for accuracy
-            response = self.model.generate_content(
-                [uploaded_file, GEMINI_PROMPT],
+            response = breaker.call(
+                self.model.generate_content,
+                [image_part, GEMINI_PROMPT],
                 generation_config=genai.GenerationConfig(
                     temperature=0.1  # Low temp for accuracy
                 )
@@ -148,59 +203,246 @@ Return ONLY valid JSON. No markdown. Extract EVERYTHING including bandages."""
             print(f"   ⏱ Waiting 5s to respect 15 RPM rate limit...", flush=True)
             time.sleep(5)
             
-            content = response.text
-            print(f"   Gemini raw output: {content[:300]}...", flush=True)
-            
-            # Clean markdown if present
-            content = content.replace("```json", "").replace("```", "").strip()
+            return self._parse_response(response.text)
             
-            # Parse JSON
-            data = json.loads(content)
-            
-            medicines = data.get('medicines', [])
-            if isinstance(data, list):
-                medicines = data
-            
-            if not medicines:
-                print("   ⚠️ No medicines found in Gemini response", flush=True)
-            
-            # Normalize
-            results = []
-            for item in medicines:
-                results.append({
-                    'medicine_name': item.get('name', item.get('medicine_name', 'Unknown')),
-                    'strength': item.get('strength', ''),
-                    'dosage': item.get('dosage', ''),
-                    'duration': str(item.get('duration', '')),
-                    'confidence': float(item.get('confidence', 0.90)),
-                    'original_text': item.get('raw_text', item.get('original_text', '')),
-                    'source': 'gemini_2.5_pro'
-                })
+        except Exception as e:
+            print(f"   Gemini Error: {e}", flush=True)
+            import traceback
+            traceback.print_exc()
+            return []
+        finally:
+            if uploaded_file is not None:
+                self._delete_uploaded(uploaded_file)
+
+    async def _gemini_ocr_json_async(self, image_path):
+        """Async variant of _gemini_ocr_json (pacing is left to the caller's rate limiter)"""
+        if not self.model:
+            return []
+        
+        breaker = get_breaker('gemini')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Gemini: circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return []
+        
+        uploaded_file = None
+        try:
+            image_part, uploaded_file = await asyncio.to_thread(self._image_part, image_path)
             
-            # Cleanup uploaded file
-            try:
-                genai.delete_file(uploaded_file.name)
-                print(f"   Cleaned up uploaded file", flush=True)
-            except Exception as cleanup_error:
-                print(f"   Cleanup warning: {cleanup_error}", flush=True)
+            response = await breaker.call_async(
+                self.model.generate_content_async,
+                [image_part, GEMINI_PROMPT],
+                generation_config=genai.GenerationConfig(
+                    temperature=0.1  # Low temp for accuracy
+                )
+            )
+            return self._parse_response(response.text)
             
-            return results
+        except Exception as e:
+            print(f"   Gemini Error: {e}", flush=True)
+            return []
+        finally:
+            if uploaded_file is not None:
+                await asyncio.to_thread(self._delete_uploaded, uploaded_file)
+
+    def _gemini_stream_text(self, image_path):
+        """
+        Text chunks of a streamed Gemini reply (nothing if the call fails before
+        any text; StreamTruncatedError if it fails partway through)
+        """
+        if not self.model:
+            return
+        
+        breaker = get_breaker('gemini')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Gemini: circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return
+        
+        uploaded_file = None
+        produced = False
+        try:
+            image_part, uploaded_file = self._image_part(image_path)
+            for text in breaker.stream(self._gemini_stream_chunks, image_part):
+                produced = True
+                yield text
             
+        except Exception as e:
+            if produced:
+                raise StreamTruncatedError(f"Gemini stream broke off: {e}") from e
+            print(f"   Gemini stream error: {e}", flush=True)
+        finally:
+            if uploaded_file is not None:
+                self._delete_uploaded(uploaded_file)
+
+    def _gemini_stream_chunks(self, image_part):
+        response = self.model.generate_content(
+            [image_part, GEMINI_PROMPT],
+            generation_config=genai.GenerationConfig(temperature=0.1),
+            stream=True
+        )
+        for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+
+    def _parse_response(self, content):
+        """Gemini JSON reply -> normalized medicine candidates"""
+        print(f"   Gemini raw output: {content[:300]}...", flush=True)
+        
+        # Clean markdown if present
+        content = content.replace("```json", "").replace("```", "").strip()
+        
+        # Parse JSON
+        try:
+            data = json.loads(content)
         except json.JSONDecodeError as e:
             print(f"   JSON Parse Error: {e}", flush=True)
-            print(f"   Raw content: {content if 'content' in locals() else 'No content'}", flush=True)
+            print(f"   Raw content: {content}", flush=True)
             return []
+        
+        medicines = data.get('medicines', []) if isinstance(data, dict) else []
+        if isinstance(data, list):
+            medicines = data
+        
+        if not medicines:
+            print("   ⚠️ No medicines found in Gemini response", flush=True)
+        
+        return self._normalize(medicines)
+
+    def _normalize(self, medicines):
+        results = []
+        for item in medicines:
+            results.append({
+                'medicine_name': item.get('name', item.get('medicine_name', 'Unknown')),
+                'strength': item.get('strength', ''),
+                'dosage': item.get('dosage', ''),
+                'duration': str(item.get('duration', '')),
+                'confidence': float(item.get('confidence', 0.90)),
+                'original_text': item.get('raw_text', item.get('original_text', '')),
+                'source': 'gemini_2.5_pro'
+            })
+        return results
+
+    def extract_batch_from_preprocessed(self, processed_paths):
+        """
+        OCR several preprocessed prescriptions in ONE Gemini request (one labelled
+        image part each) and split the reply back per prescription.
+
+        Returns: list of medicine lists in input order, or None if the batch
+        request failed (callers then fall back to one request per image).
+        """
+        if len(processed_paths) == 1:
+            return [self.extract_from_preprocessed(processed_paths[0])]
+        if not self.model:
+            return None
+        
+        breaker = get_breaker('gemini')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Gemini batch: circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return None
+        
+        uploaded_files = []
+        try:
+            contents, uploaded_files = self._batch_contents(processed_paths)
+            response = breaker.call(
+                self.model.generate_content,
+                contents,
+                generation_config=genai.GenerationConfig(temperature=0.1)
+            )
+            return self._split_batch(response.text, len(processed_paths))
+            
         except Exception as e:
-            print(f"   Gemini Error: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            return []
+            print(f"   Gemini batch error: {e}", flush=True)
+            return None
+        finally:
+            for uploaded_file in uploaded_files:
+                self._delete_uploaded(uploaded_file)
+
+    async def extract_batch_from_preprocessed_async(self, processed_paths):
+        """Async variant of extract_batch_from_preprocessed"""
+        if len(processed_paths) == 1:
+            return [await self.extract_from_preprocessed_async(processed_paths[0])]
+        if not self.model:
+            return None
+        
+        breaker = get_breaker('gemini')
+        if breaker.is_open():
+            print(f"   ⚠️ Skipping Gemini batch: circuit open (retry in {breaker.retry_in():.0f}s)", flush=True)
+            return None
+        
+        uploaded_files = []
+        try:
+            contents, uploaded_files = await asyncio.to_thread(self._batch_contents, processed_paths)
+            response = await breaker.call_async(
+                self.model.generate_content_async,
+                contents,
+                generation_config=genai.GenerationConfig(temperature=0.1)
+            )
+            return await asyncio.to_thread(self._split_batch, response.text, len(processed_paths))
+            
+        except Exception as e:
+            print(f"   Gemini batch error: {e}", flush=True)
+            return None
+        finally:
+            for uploaded_file in uploaded_files:
+                await asyncio.to_thread(self._delete_uploaded, uploaded_file)
+
+    def _batch_contents(self, processed_paths):
+        """Labelled image parts + batch prompt; inline bytes share one request-size budget"""
+        contents = []
+        uploaded_files = []
+        budget = GEMINI_INLINE_MAX_BYTES
+        for index, path in enumerate(processed_paths):
+            part, uploaded_file = self._image_part(path, inline_budget=budget)
+            if uploaded_file is not None:
+                uploaded_files.append(uploaded_file)
+            else:
+                budget -= len(part['data'])
+            contents.extend([image_label(index), part])
+        contents.append(build_batch_prompt(GEMINI_PROMPT, len(processed_paths)))
+        print(f"   Batched {len(processed_paths)} prescriptions into one Gemini request", flush=True)
+        return contents, uploaded_files
+
+    def _split_batch(self, content, count):
+        """Per-image medicine lists from a batch reply, each fuzzy-refined"""
+        print(f"   Gemini batch output: {content[:300]}...", flush=True)
+        per_image = split_batch_response(content, count)
+        return [self._fuzzy_refine(self._normalize(medicines)) for medicines in per_image]
+
+    def _delete_uploaded(self, uploaded_file):
+        # Cleanup uploaded file
+        try:
+            genai.delete_file(uploaded_file.name)
+            print(f"   Cleaned up uploaded file", flush=True)
+        except Exception as cleanup_error:
+            print(f"   Cleanup warning: {cleanup_error}", flush=True)
+
+    def _image_part(self, image_path, inline_budget=GEMINI_INLINE_MAX_BYTES):
+        """
+        Image content part for generate_content.
+        Sends resized JPEG bytes inline in the request; only images still too
+        large for the remaining inline budget go through the file API (upload + delete).
+        Returns: (part, uploaded_file or None)
+        """
+        try:
+            data, mime_type = encode_image_for_api(image_path, max_dim=GEMINI_MAX_DIM)
+        except Exception as e:
+            print(f"   Inline encoding failed ({e}), using file upload", flush=True)
+            data, mime_type = None, None
+
+        if data is not None and len(data) <= inline_budget:
+            print(f"   Sending image inline ({len(data) // 1024} KB)", flush=True)
+            return {'mime_type': mime_type, 'data': data}, None
+
+        # Upload image to Gemini
+        print(f"   Uploading image to Gemini...", flush=True)
+        uploaded_file = genai.upload_file(image_path)
+        print(f"   File uploaded: {uploaded_file.name}", flush=True)
+        return uploaded_file, uploaded_file
 
     def _fuzzy_refine(self, candidates):
         """Fuzzy refinement against real database with aggressive matching"""
         try:
-            from utils.fuzzy_matcher import MedicineMatcher
-            matcher = MedicineMatcher()
+            from utils.fuzzy_matcher import get_matcher
+            matcher = get_matcher()
             
             results = []
             for item in candidates:
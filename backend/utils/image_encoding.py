@@ -0,0 +1,56 @@
+"""
+Image encoding for vision APIs
+Resizes and JPEG-compresses prescription images once so every engine can send
+them inline (base64 / raw bytes) instead of uploading full-resolution files.
+"""
+import base64
+
+import cv2
+
+# Longest side sent to vision APIs; larger images only add tokens and latency
+DEFAULT_MAX_DIM = 1024
+DEFAULT_JPEG_QUALITY = 85
+
+
+def encode_image_for_api(image_path, max_dim=DEFAULT_MAX_DIM, quality=DEFAULT_JPEG_QUALITY):
+    """
+    Downscale an image so its longest side is at most max_dim and encode it as JPEG.
+
+    Returns: (image_bytes, mime_type). If OpenCV cannot decode the file, the
+    original bytes are returned unchanged with a mime type guessed from the extension.
+    """
+    img = cv2.imread(image_path)
+    if img is not None:
+        h, w = img.shape[:2]
+        if max(h, w) > max_dim:
+            scale = max_dim / max(h, w)
+            new_w, new_h = int(w * scale), int(h * scale)
+            img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+            print(f"   Resized for API: {w}x{h} -> {new_w}x{new_h}", flush=True)
+
+        ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            return buffer.tobytes(), 'image/jpeg'
+
+    # Fallback to direct read if cv2 fails
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    return data, _guess_mime_type(image_path)
+
+
+def encode_image_base64(image_path, max_dim=DEFAULT_MAX_DIM, quality=DEFAULT_JPEG_QUALITY):
+    """Same as encode_image_for_api, returning (base64 string, mime_type)"""
+    data, mime_type = encode_image_for_api(image_path, max_dim=max_dim, quality=quality)
+    return base64.b64encode(data).decode('utf-8'), mime_type
+
+
+def _guess_mime_type(image_path):
+    ext = image_path.rsplit('.', 1)[-1].lower() if '.' in image_path else ''
+    return {
+        'png': 'image/png',
+        'webp': 'image/webp',
+        'gif': 'image/gif',
+        'bmp': 'image/bmp',
+        'heic': 'image/heic',
+        'heif': 'image/heif',
+    }.get(ext, 'image/jpeg')
@@ -14,14 +14,17 @@ class ImagePreprocessor:
     Enhanced preprocessor for handwritten prescriptions with multiple modes
     """
     
-    def __init__(self, handwriting_mode=False):
+    def __init__(self, handwriting_mode=False, crop_to_rx=False):
         """
         Initialize preprocessor
         
         Args:
             handwriting_mode: If True, use aggressive preprocessing for messy handwriting
+            crop_to_rx: If True, crop the output to the detected prescription body
+                        (drops letterhead/footer; falls back to the full page when unsure)
         """
         self.handwriting_mode = handwriting_mode
+        self.crop_to_rx = crop_to_rx
         
         # Standard mode parameters
         self.blur_kernel_size = (3, 3)
@@ -43,6 +46,17 @@ class ImagePreprocessor:
         self.min_resolution = 500
         self.blur_threshold = 100.0
         self.contrast_threshold = 30.0
+        
+        # Region-of-interest detection parameters (fractions of page size / row width)
+        self.roi_analysis_size = 1200      # longest side analysed for projection profiles
+        self.roi_blank_fraction = 0.003    # rows/columns with less ink are blank
+        self.roi_rule_fraction = 0.5       # an unbroken ink run this wide is a ruled separator line
+        self.roi_min_gap_fraction = 0.02   # header/body gap must be at least this tall
+        self.roi_padding = 0.015
+        self.roi_min_ink_fraction = 0.001
+        self.roi_min_area_fraction = 0.2   # smaller crops are treated as misdetections
+        self.roi_max_area_fraction = 0.92  # larger crops aren't worth it
+        self.roi_min_kept_ink = 0.5        # crop must keep at least half the page's ink
     
     def preprocess(self, image_path: str) -> Tuple[np.ndarray, Dict[str, Any]]:
         """
@@ -92,9 +106,131 @@ class ImagePreprocessor:
             # Standard preprocessing
             processed = self._preprocess_standard(gray_image)
         
+        if self.crop_to_rx:
+            processed = self._crop_to_rx_region(processed, quality_report)
+        
         print(f"DEBUG: Preprocessing Output shape: {processed.shape}")
         return processed, quality_report
     
+    def _crop_to_rx_region(self, binary: np.ndarray, quality_report: Dict[str, Any]) -> np.ndarray:
+        """Crop to the detected prescription body, keeping the full page when detection is uncertain"""
+        try:
+            box, reason = self._detect_rx_region(binary)
+        except Exception as e:
+            box, reason = None, f"error: {e}"
+        
+        if box is None:
+            quality_report["roi"] = {"cropped": False, "reason": reason}
+            print(f"DEBUG: ROI crop skipped ({reason}), using full page")
+            return binary
+        
+        x0, y0, x1, y1 = box
+        h, w = binary.shape[:2]
+        quality_report["roi"] = {
+            "cropped": True,
+            "reason": reason,
+            "box": [x0, y0, x1, y1],
+            "area_fraction": round((x1 - x0) * (y1 - y0) / float(h * w), 3)
+        }
+        print(f"DEBUG: ROI crop ({reason}): {w}x{h} -> {x1 - x0}x{y1 - y0}")
+        return binary[y0:y1, x0:x1]
+    
+    def _detect_rx_region(self, binary: np.ndarray):
+        """
+        Locate the medication block on a binarised page (dark text on white) with
+        projection profiles:
+        1. Top: below a horizontal rule in the top 40% (letterhead separator), or
+           below the widest blank band in the top 35% between header and body
+        2. Bottom: above a horizontal rule in the bottom 25% (footer separator)
+        3. Left/right and remaining top/bottom: trimmed to the ink extent
+        
+        The bottom is only cut at a rule so that supplies written near the end of
+        the page (bandages, syringes) are kept.
+        
+        Returns: ((x0, y0, x1, y1), reason) or (None, reason) when uncertain
+        """
+        h, w = binary.shape[:2]
+        
+        # Profiles on a strided downsample (the handwriting output is 3x upscaled)
+        step = max(1, max(h, w) // self.roi_analysis_size)
+        ink = binary[::step, ::step] < 128
+        sh, sw = ink.shape
+        total_ink = int(ink.sum())
+        if total_ink < self.roi_min_ink_fraction * sh * sw:
+            return None, "blank page"
+        
+        rows = ink.mean(axis=1)
+        text_rows = rows > self.roi_blank_fraction
+        inked = np.flatnonzero(text_rows)
+        first_row, last_row = int(inked[0]), int(inked[-1])
+        
+        top, bottom = 0, sh
+        reasons = []
+        
+        rule_rows = self._rule_rows(ink, rows)
+        header_rules = rule_rows[rule_rows < int(sh * 0.40)]
+        footer_rules = rule_rows[rule_rows >= int(sh * 0.75)]
+        if len(header_rules):
+            top = int(header_rules.max()) + 1
+            reasons.append("header rule")
+        else:
+            gap_start, gap_len = self._widest_gap(text_rows, first_row, int(sh * 0.35))
+            if gap_len >= self.roi_min_gap_fraction * sh:
+                top = gap_start + gap_len
+                reasons.append("header gap")
+        if len(footer_rules):
+            bottom = int(footer_rules.min())
+            reasons.append("footer rule")
+        
+        region = ink[top:bottom]
+        body_rows = np.flatnonzero(region.mean(axis=1) > self.roi_blank_fraction)
+        body_cols = np.flatnonzero(region.mean(axis=0) > self.roi_blank_fraction)
+        if not len(body_rows) or not len(body_cols):
+            return None, "no text below header"
+        
+        pad = max(1, int(self.roi_padding * max(sh, sw)))
+        y0 = max(0, top + int(body_rows[0]) - pad)
+        y1 = min(sh, top + int(body_rows[-1]) + 1 + pad)
+        x0 = max(0, int(body_cols[0]) - pad)
+        x1 = min(sw, int(body_cols[-1]) + 1 + pad)
+        
+        area_fraction = (x1 - x0) * (y1 - y0) / float(sh * sw)
+        kept_ink = ink[y0:y1, x0:x1].sum() / float(total_ink)
+        if area_fraction < self.roi_min_area_fraction:
+            return None, f"region too small ({area_fraction:.0%} of page)"
+        if kept_ink < self.roi_min_kept_ink:
+            return None, f"region drops too much text ({kept_ink:.0%} kept)"
+        if area_fraction > self.roi_max_area_fraction:
+            return None, "no significant margin to crop"
+        
+        box = (x0 * step, y0 * step, min(w, x1 * step), min(h, y1 * step))
+        return box, " + ".join(reasons) or "ink extent"
+    
+    def _rule_rows(self, ink: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Rows containing a ruled line: one unbroken ink run across most of the width"""
+        min_run = self.roi_rule_fraction * ink.shape[1]
+        candidates = np.flatnonzero(rows > self.roi_rule_fraction)
+        rule_rows = []
+        for y in candidates:
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], ink[y].view(np.int8), [0]))))
+            if len(edges) and (edges[1::2] - edges[0::2]).max() >= min_run:
+                rule_rows.append(y)
+        return np.array(rule_rows, dtype=int)
+    
+    def _widest_gap(self, text_rows: np.ndarray, start: int, end: int) -> Tuple[int, int]:
+        """Longest run of blank rows in [start, end) that has text both above and below it"""
+        best_start, best_len = 0, 0
+        run_start = None
+        for y in range(start, min(end, len(text_rows))):
+            if not text_rows[y]:
+                if run_start is None:
+                    run_start = y
+            elif run_start is not None:
+                if y - run_start > best_len:
+                    best_start, best_len = run_start, y - run_start
+                run_start = None
+        return best_start, best_len
+    
     def _preprocess_standard(self, gray_image: np.ndarray) -> np.ndarray:
         """Standard preprocessing pipeline"""
         # Resize 2x
@@ -281,6 +417,31 @@ class ImagePreprocessor:
         cv2.imwrite(output_path, image)
 
 
+def preprocessed_path_for(image_path: str) -> str:
+    """Path the preprocessed copy of image_path is saved to"""
+    output_path = image_path.replace('.', '_preprocessed.')
+    if not output_path.endswith(('.jpg', '.jpeg', '.png')):
+        output_path = image_path.rsplit('.', 1)[0] + '_preprocessed.jpg'
+    return output_path
+
+
+def preprocess_to_file(image_path: str, handwriting_mode: bool = True, crop_to_rx: bool = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Preprocess an image and save the result next to it (CPU-bound; a plain
+    function so it can run in a thread or process pool).
+    Cropping to the prescription body defaults to OCR_ROI_CROP (on unless set to 0).
+
+    Returns: (preprocessed image path, quality report)
+    """
+    if crop_to_rx is None:
+        crop_to_rx = os.getenv('OCR_ROI_CROP', '1') != '0'
+    preprocessor = ImagePreprocessor(handwriting_mode=handwriting_mode, crop_to_rx=crop_to_rx)
+    processed_img, quality_report = preprocessor.preprocess(image_path)
+    output_path = preprocessed_path_for(image_path)
+    preprocessor.save_preprocessed_image(processed_img, output_path)
+    return output_path, quality_report
+
+
 if __name__ == "__main__":
     import sys
     
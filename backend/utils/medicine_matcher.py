@@ -3,52 +3,136 @@ Enhanced medicine matcher with rapidfuzz and region filtering
 """
 
 from rapidfuzz import fuzz, process
-import sqlite3
 import os
+import threading
+from array import array
+from collections import OrderedDict
+from utils.db import CatalogWatcher, query
+
+# Per-matcher LRU of find_matches results (cleared whenever the catalog reloads)
+MATCH_CACHE_SIZE = 2048
+# A hit this strong in the user's own region stops the search widening to other regions
+REGION_CUTOFF = 90
+
+
+class MedicineCatalog:
+    """
+    Columnar catalog ordered by region, so every region is a contiguous index
+    range and filtering is a slice. Name, brand and strength are array('I')
+    codes into one table of distinct strings (a generic or strength repeats
+    across many brands). The search strings stay a list: they are unique per
+    row and rapidfuzz scores a sequence of str.
+    """
+    __slots__ = ('strings', 'name_ids', 'brand_ids', 'strength_ids', 'search_strs', 'regions', 'region_ranges',
+                 'region_choices')
+
+    def __init__(self, rows=()):
+        self.strings = []
+        self.name_ids = array('I')
+        self.brand_ids = array('I')
+        self.strength_ids = array('I')
+        self.search_strs = []
+        self.regions = []
+        self.region_ranges = {}
+        string_ids = {}
+
+        def encode(value):
+            code = string_ids.get(value)
+            if code is None:
+                code = string_ids[value] = len(self.strings)
+                self.strings.append(value)
+            return code
+
+        # rows must arrive grouped by region
+        for name, brand, strength, region in rows:
+            if not self.regions or self.regions[-1] != region:
+                self.regions.append(region)
+                self.region_ranges[region] = [len(self.search_strs), len(self.search_strs)]
+            self.name_ids.append(encode(name))
+            self.brand_ids.append(encode(brand))
+            self.strength_ids.append(encode(strength))
+            self.search_strs.append(f"{name} {brand} {strength}".strip())
+            self.region_ranges[region][1] = len(self.search_strs)
+
+        self.region_ranges = {region: tuple(bounds) for region, bounds in self.region_ranges.items()}
+        self.region_ranges['All'] = (0, len(self.search_strs))
+
+        # Choice lists handed to rapidfuzz, built once per load instead of per query
+        self.region_choices = {
+            region: self.search_strs[start:end] for region, (start, end) in self.region_ranges.items()
+            if region != 'All'
+        }
+        self.region_choices['All'] = self.search_strs
+
+    def __len__(self):
+        return len(self.search_strs)
+
+    def row(self, index):
+        """(name, brand, strength) of one catalog row"""
+        strings = self.strings
+        return strings[self.name_ids[index]], strings[self.brand_ids[index]], strings[self.strength_ids[index]]
+
+    def search_tiers(self, region, user_region=None):
+        """
+        Partitions to scan, in order. A region='All' search for a known user
+        region scans that region first, then National, then every other region.
+        """
+        if region != 'All' or user_region in (None, 'All') or user_region not in self.region_ranges:
+            return [region]
+        tiers = [user_region]
+        if 'National' in self.region_ranges and user_region != 'National':
+            tiers.append('National')
+        tiers.extend(r for r in self.regions if r not in tiers)
+        return tiers
+
+    def indices(self, region):
+        """Row range for a region (unknown regions fall back to 'All')"""
+        return range(*self.region_ranges.get(region, self.region_ranges['All']))
+
+    def choices(self, region):
+        """Precomputed search strings for a region (same fallback as indices)"""
+        return self.region_choices.get(region, self.region_choices['All'])
 
 
 class MedicineMatcher:
     def __init__(self, db_path='database/pharmacy.db'):
         self.db_path = db_path
-        self.medicines_cache = {}
+        self.catalog = MedicineCatalog()
+        self.catalog_watcher = CatalogWatcher(db_path)
+        self._match_cache = OrderedDict()
+        self._match_cache_lock = threading.Lock()
         self._load_medicines()
-    
+
     def _load_medicines(self):
-        """Load all medicines from database and cache by region"""
+        """Load all medicines from database into the region-ordered columnar catalog"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT generic_name, brand_name, strength, region FROM medicines')
-            medicines = cursor.fetchall()
-            
-            # Group by region
-            for name, brand, strength, region in medicines:
-                if region not in self.medicines_cache:
-                    self.medicines_cache[region] = []
-                
-                # Store as searchable string
-                search_str = f"{name} {brand} {strength}".strip()
-                self.medicines_cache[region].append({
-                    'name': name,
-                    'brand': brand,
-                    'strength': strength,
-                    'search_str': search_str
-                })
-            
-            conn.close()
-            
-            # Also create "All" region with all medicines
-            all_medicines = []
-            for region_meds in self.medicines_cache.values():
-                all_medicines.extend(region_meds)
-            self.medicines_cache['All'] = all_medicines
-            
+            medicines = query(self.db_path, '''
+                SELECT generic_name, brand_name, strength, region FROM medicines
+                ORDER BY region, id
+            ''')
+            self.catalog = MedicineCatalog(medicines)
+
         except Exception as e:
             print(f"Error loading medicines: {e}")
-            self.medicines_cache = {'All': []}
+            self.catalog = MedicineCatalog()
+
+        with self._match_cache_lock:
+            self._match_cache.clear()
+
+    def _cached_matches(self, key):
+        with self._match_cache_lock:
+            results = self._match_cache.get(key)
+            if results is not None:
+                self._match_cache.move_to_end(key)
+        return results
+
+    def _store_matches(self, key, results):
+        with self._match_cache_lock:
+            self._match_cache[key] = results
+            if len(self._match_cache) > MATCH_CACHE_SIZE:
+                self._match_cache.popitem(last=False)
     
-    def find_matches(self, query, region='All', top_n=3, threshold=60):
+    def find_matches(self, query, region='All', top_n=3, threshold=60, user_region=None):
         """
         Find top N medicine matches using rapidfuzz
         
@@ -57,45 +141,63 @@ class MedicineMatcher:
             region: Region to filter by ('All', 'Karnataka', 'Mysore', 'National')
             top_n: Number of top matches to return
             threshold: Minimum similarity score (0-100)
+            user_region: With region='All', search this region first and only widen
+                to National/other regions while the best score is below REGION_CUTOFF
         
         Returns:
             List of dicts with match info
         """
         try:
+            query = ' '.join(query.split()) if query else query
             if not query or len(query) < 2:
                 return []
             
-            # Get medicines for region
-            region_medicines = self.medicines_cache.get(region, self.medicines_cache.get('All', []))
-            
-            if not region_medicines:
-                return []
+            if self.catalog_watcher.changed():
+                self._load_medicines()
             
-            # Create list of search strings
-            search_strings = [m['search_str'] for m in region_medicines]
+            cache_key = (query, region, top_n, threshold, user_region)
+            cached = self._cached_matches(cache_key)
+            if cached is not None:
+                return [dict(match) for match in cached]
             
-            # Use rapidfuzz to find matches
-            matches = process.extract(
-                query,
-                search_strings,
-                scorer=fuzz.WRatio,  # Weighted ratio for better results
-                limit=top_n
-            )
+            # Region filtering is a slice of the region-ordered catalog; scan
+            # partitions in tier order and stop once a strong match is found
+            catalog = self.catalog
+            best = []  # (score, row, match_str), best first
+            for tier in catalog.search_tiers(region, user_region):
+                rows = catalog.indices(tier)
+                if not rows:
+                    continue
+                
+                # Only candidates that could still make the top N are worth scoring
+                cutoff = best[-1][0] if len(best) >= top_n else threshold
+                matches = process.extract(
+                    query,
+                    catalog.choices(tier),
+                    scorer=fuzz.WRatio,  # Weighted ratio for better results
+                    limit=top_n,
+                    score_cutoff=cutoff
+                )
+                best.extend((score, rows[idx], match_str) for match_str, score, idx in matches)
+                best.sort(key=lambda match: (-match[0], match[1]))
+                del best[top_n:]
+                
+                if best and best[0][0] >= REGION_CUTOFF:
+                    break
             
-            # Filter by threshold and format results
             results = []
-            for match_str, score, idx in matches:
-                if score >= threshold:
-                    medicine = region_medicines[idx]
-                    results.append({
-                        'name': medicine['name'],
-                        'brand': medicine['brand'],
-                        'strength': medicine['strength'],
-                        'score': round(score, 1),
-                        'match_text': match_str
-                    })
+            for score, row, match_str in best:
+                name, brand, strength = catalog.row(row)
+                results.append({
+                    'name': name,
+                    'brand': brand,
+                    'strength': strength,
+                    'score': round(score, 1),
+                    'match_text': match_str
+                })
             
-            return results
+            self._store_matches(cache_key, tuple(results))
+            return [dict(match) for match in results]
         
         except Exception as e:
             print(f"Error finding matches: {e}")
@@ -103,11 +205,13 @@ class MedicineMatcher:
     
     def get_regions(self):
         """Get list of available regions"""
-        return list(self.medicines_cache.keys())
+        return list(self.catalog.region_ranges.keys())
     
     def get_medicine_count(self, region='All'):
         """Get count of medicines in a region"""
-        return len(self.medicines_cache.get(region, []))
+        if region not in self.catalog.region_ranges:
+            return 0
+        return len(self.catalog.indices(region))
 
 
 # Standalone function for quick matching
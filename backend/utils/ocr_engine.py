@@ -1,29 +1,115 @@
 import os
 import json
-import base64
 import time
+import asyncio
+import inspect
 import requests
 from dotenv import load_dotenv
 from mistralai import Mistral
 from mistralai.models.sdkerror import SDKError
+from utils.circuit_breaker import CircuitOpenError, get_breaker
+from utils.progress import report
 
 load_dotenv()
 
-def retry_api(max_retries=5, delay=5):
+PIXTRAL_MODEL = "pixtral-12b-2409"
+# Rate-limit retries for Pixtral calls: at most 1s + 2s of backoff. The circuit
+# breaker handles a provider that keeps failing, and the hedge/worker time budgets
+# can't absorb the minutes a longer exponential backoff would take.
+PIXTRAL_MAX_RETRIES = 2
+PIXTRAL_RETRY_DELAY = 1
+
+PIXTRAL_JSON_PROMPT = """You are an Indian Pharmacist AI. Analyze this handwritten prescription image and output structured JSON.
+
+INSTRUCTIONS:
+1. Identify all medicines, dosages, and durations.
+2. Decode abbreviations: 
+   - "Tab" -> "Tablet"
+   - "BD"/"BID" -> "Twice daily"
+   - "OD" -> "Once daily"
+   - "TDS" -> "Three times daily"
+   - "x 10" -> "for 10 days"
+   - "1-0-1" -> "Morning-Afternoon-Night"
+3. Preserve brand names EXACTLY (e.g., Zerodol-SP, Veldol).
+
+OUTPUT JSON FORMAT:
+{
+  "medicines": [
+    {
+      "medicine_name": "Exact Brand Name",
+      "strength": "500mg (if visible)",
+      "dosage": "Twice daily (decoded)",
+      "duration": "10 days (decoded)",
+      "confidence": 0.95,
+      "original_text": "Tab Zerodol-SP x 10"
+    }
+  ]
+}
+
+Return ONLY valid JSON. No markdown.
+"""
+
+def _is_rate_limited(error):
+    error_str = str(error).lower()
+    return "rate" in error_str or "limit" in error_str or "429" in error_str
+
+
+def retry_api(max_retries=5, delay=5, provider=None):
+    """
+    Retry rate-limited API calls with exponential backoff.
+    With a provider, every attempt goes through that provider's circuit breaker:
+    an open circuit fails fast with CircuitOpenError instead of backing off.
+    Works on coroutine functions too (backing off with asyncio.sleep).
+    """
     def decorator(func):
         def wrapper(*args, **kwargs):
+            breaker = get_breaker(provider) if provider else None
+
+            def attempt():
+                if breaker is None:
+                    return func(*args, **kwargs)
+                return breaker.call(func, *args, **kwargs)
+
             for i in range(max_retries):
                 try:
-                    return func(*args, **kwargs)
+                    return attempt()
+                except CircuitOpenError:
+                    raise
                 except (SDKError, Exception) as e:
-                    error_str = str(e).lower()
-                    if "rate" in error_str or "limit" in error_str or "429" in error_str:
-                        wait = delay * (2 ** i)
-                        print(f"⚠ API Rate limited (Attempt {i+1}/{max_retries}). Retrying in {wait}s...", flush=True)
-                        time.sleep(wait)
-                    else:
+                    if not _is_rate_limited(e):
                         raise e
-            return func(*args, **kwargs)
+                    if breaker is not None and breaker.is_open():
+                        raise CircuitOpenError(provider, breaker.retry_in())
+                    wait = delay * (2 ** i)
+                    print(f"⚠ API Rate limited (Attempt {i+1}/{max_retries}). Retrying in {wait}s...", flush=True)
+                    time.sleep(wait)
+            return attempt()
+
+        async def async_wrapper(*args, **kwargs):
+            breaker = get_breaker(provider) if provider else None
+
+            async def attempt():
+                if breaker is None:
+                    return await func(*args, **kwargs)
+                return await breaker.call_async(func, *args, **kwargs)
+
+            for i in range(max_retries):
+                try:
+                    return await attempt()
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    if not _is_rate_limited(e):
+                        raise e
+                    if breaker is not None and breaker.is_open():
+                        raise CircuitOpenError(provider, breaker.retry_in())
+                    wait = delay * (2 ** i)
+                    print(f"⚠ API Rate limited (Attempt {i+1}/{max_retries}). Retrying in {wait}s...", flush=True)
+                    await asyncio.sleep(wait)
+            return await attempt()
+
+        if inspect.iscoroutinefunction(func):
+            return async_wrapper
         return wrapper
     return decorator
 
@@ -90,32 +176,9 @@ Tab Pain-O 1-0-1 x 10"""
         Execute enhanced pipeline: Preprocess → Vision → Parse → Fuzzy Match
         """
         try:
-            print(f"\n{'='*60}", flush=True)
-            print(f"OCR PIPELINE 2.0: Processing {os.path.basename(image_path)}", flush=True)
-            print(f"{'='*60}", flush=True)
-            
-            # STEP 1: Enhanced Image Preprocessing
-            print("[1/4] Preprocessing image for handwriting...", flush=True)
+            self._print_header(image_path)
             processed_path = self._preprocess_image(image_path)
-            
-            # STEP 2: Single-Shot Pixtral OCR -> JSON
-            print("[2/4] Pixtral single-shot extraction...", flush=True)
-            candidates = self._mistral_ocr_json(processed_path)
-            print(f"   Extracted {len(candidates)} medicine candidates", flush=True)
-            
-            # STEP 3: Fuzzy Database Matching
-            print("[3/4] Fuzzy database correction...", flush=True)
-            results = self._apply_fuzzy_matching(candidates)
-            
-            # Calculate overall confidence
-            if results:
-                avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
-                print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
-            else:
-                print(f"\n⚠ No medicines extracted", flush=True)
-            
-            print(f"{'='*60}\n", flush=True)
-            return results
+            return self.extract_from_preprocessed(processed_path)
             
         except Exception as e:
             print(f"❌ Pipeline Error: {e}", flush=True)
@@ -123,19 +186,77 @@ Tab Pain-O 1-0-1 x 10"""
             traceback.print_exc()
             return []
 
+    async def extract_medicines_async(self, image_path):
+        """
+        Async pipeline for batch OCR: preprocessing runs in a worker thread and
+        the Pixtral call uses the Mistral SDK's async API.
+        """
+        try:
+            self._print_header(image_path)
+            processed_path = await asyncio.to_thread(self._preprocess_image, image_path)
+            return await self.extract_from_preprocessed_async(processed_path)
+            
+        except Exception as e:
+            print(f"❌ Pipeline Error: {e}", flush=True)
+            return []
+
+    def extract_from_preprocessed(self, processed_path):
+        """Pixtral extraction + fuzzy matching for an already preprocessed image"""
+        # STEP 2: Single-Shot Pixtral OCR -> JSON
+        print("[2/4] Pixtral single-shot extraction...", flush=True)
+        report('extract', 'Pixtral single-shot extraction', engine='mistral')
+        candidates = self._mistral_ocr_json(processed_path)
+        return self._finish(candidates)
+
+    async def extract_from_preprocessed_async(self, processed_path):
+        print("[2/4] Pixtral single-shot extraction...", flush=True)
+        report('extract', 'Pixtral single-shot extraction', engine='mistral')
+        candidates = await self._mistral_ocr_json_async(processed_path)
+        return self._finish(candidates)
+
+    def stream_medicines(self, image_path):
+        """
+        Streaming pipeline: yields each fuzzy-matched medicine as soon as Pixtral
+        has finished writing its JSON object, instead of after the whole reply.
+        """
+        self._print_header(image_path)
+        processed_path = self._preprocess_image(image_path)
+        print("[2/4] Pixtral single-shot extraction (streaming)...", flush=True)
+        report('extract', 'Pixtral single-shot extraction', engine='mistral', streaming=True)
+        from utils.streaming_json import stream_refined
+        yield from stream_refined(self._mistral_stream_text(processed_path), self._normalize, self._apply_fuzzy_matching)
+
+    def _print_header(self, image_path):
+        print(f"\n{'='*60}", flush=True)
+        print(f"OCR PIPELINE 2.0: Processing {os.path.basename(image_path)}", flush=True)
+        print(f"{'='*60}", flush=True)
+
+    def _finish(self, candidates):
+        print(f"   Extracted {len(candidates)} medicine candidates", flush=True)
+        
+        # STEP 3: Fuzzy Database Matching
+        print("[3/4] Fuzzy database correction...", flush=True)
+        report('refine', 'Fuzzy database refinement', candidates=len(candidates))
+        results = self._apply_fuzzy_matching(candidates)
+        
+        # Calculate overall confidence
+        if results:
+            avg_conf = sum(r.get('confidence', 0) for r in results) / len(results)
+            print(f"\n✓ Pipeline complete: {len(results)} medicines, {avg_conf*100:.1f}% avg confidence", flush=True)
+        else:
+            print(f"\n⚠ No medicines extracted", flush=True)
+        
+        print(f"{'='*60}\n", flush=True)
+        return results
+
     def _preprocess_image(self, image_path):
         """Enhanced preprocessing with bilateral filtering for handwriting"""
+        # STEP 1: Enhanced Image Preprocessing
+        print("[1/4] Preprocessing image for handwriting...", flush=True)
+        report('preprocess', 'Preprocessing image')
         try:
-            from utils.image_preprocessor import ImagePreprocessor
-            preprocessor = ImagePreprocessor(handwriting_mode=True)
-            processed_img, quality_report = preprocessor.preprocess(image_path)
-            
-            # Save preprocessed version
-            output_path = image_path.replace('.', '_preprocessed.')
-            if not output_path.endswith(('.jpg', '.jpeg', '.png')):
-                output_path = image_path.rsplit('.', 1)[0] + '_preprocessed.jpg'
-            
-            preprocessor.save_preprocessed_image(processed_img, output_path)
+            from utils.image_preprocessor import preprocess_to_file
+            output_path, quality_report = preprocess_to_file(image_path)
             print(f"   Quality: {quality_report.get('quality_score', 'unknown')}", flush=True)
             
             return output_path
@@ -143,109 +264,127 @@ Tab Pain-O 1-0-1 x 10"""
             print(f"   Preprocessing error: {e}, using original image", flush=True)
             return image_path
 
-    @retry_api(max_retries=5, delay=5)
+    @retry_api(max_retries=PIXTRAL_MAX_RETRIES, delay=PIXTRAL_RETRY_DELAY, provider='mistral')
+    def _pixtral_complete(self, messages, **kwargs):
+        return self.mistral_client.chat.complete(model=PIXTRAL_MODEL, messages=messages, **kwargs)
+
+    @retry_api(max_retries=PIXTRAL_MAX_RETRIES, delay=PIXTRAL_RETRY_DELAY, provider='mistral')
+    async def _pixtral_complete_async(self, messages, **kwargs):
+        return await self.mistral_client.chat.complete_async(model=PIXTRAL_MODEL, messages=messages, **kwargs)
+
     def _mistral_ocr_json(self, image_path):
         """Single-shot Pixtral VLM: Image -> Structured JSON"""
-        
-        JSON_PROMPT = """You are an Indian Pharmacist AI. Analyze this handwritten prescription image and output structured JSON.
-
-INSTRUCTIONS:
-1. Identify all medicines, dosages, and durations.
-2. Decode abbreviations: 
-   - "Tab" -> "Tablet"
-   - "BD"/"BID" -> "Twice daily"
-   - "OD" -> "Once daily"
-   - "TDS" -> "Three times daily"
-   - "x 10" -> "for 10 days"
-   - "1-0-1" -> "Morning-Afternoon-Night"
-3. Preserve brand names EXACTLY (e.g., Zerodol-SP, Veldol).
+        try:
+            chat_response = self._pixtral_complete(
+                messages=self._messages(image_path),
+                response_format={"type": "json_object"}
+            )
+            return self._parse_response(chat_response.choices[0].message.content)
 
-OUTPUT JSON FORMAT:
-{
-  "medicines": [
-    {
-      "medicine_name": "Exact Brand Name",
-      "strength": "500mg (if visible)",
-      "dosage": "Twice daily (decoded)",
-      "duration": "10 days (decoded)",
-      "confidence": 0.95,
-      "original_text": "Tab Zerodol-SP x 10"
-    }
-  ]
-}
+        except CircuitOpenError as e:
+            print(f"   ⚠ Skipping Pixtral: {e}", flush=True)
+            return []
+        except Exception as e:
+            print(f"   VLM Error: {e}", flush=True)
+            return []
 
-Return ONLY valid JSON. No markdown.
-"""
+    async def _mistral_ocr_json_async(self, image_path):
+        """Async variant of _mistral_ocr_json"""
         try:
-            # Resize image for API to avoid rate limits (huge token count)
-            import cv2
-            import numpy as np
-            
-            img = cv2.imread(image_path)
-            if img is not None:
-                # Max dimension 1024px
-                max_dim = 1024
-                h, w = img.shape[:2]
-                if max(h, w) > max_dim:
-                    scale = max_dim / max(h, w)
-                    new_w, new_h = int(w * scale), int(h * scale)
-                    img = cv2.resize(img, (new_w, new_h))
-                    print(f"   Resized for API: {w}x{h} -> {new_w}x{new_h}", flush=True)
-                
-                # Compress to JPEG
-                _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                image_data = base64.b64encode(buffer).decode('utf-8')
-            else:
-                # Fallback to direct read if cv2 fails
-                with open(image_path, "rb") as f:
-                    image_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            chat_response = self.mistral_client.chat.complete(
-                model="pixtral-12b-2409",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": JSON_PROMPT},
-                            {"type": "image_url", "image_url": f"data:image/jpeg;base64,{image_data}"}
-                        ]
-                    }
-                ],
+            messages = await asyncio.to_thread(self._messages, image_path)
+            chat_response = await self._pixtral_complete_async(
+                messages=messages,
                 response_format={"type": "json_object"}
             )
-            
-            content = chat_response.choices[0].message.content
-            print(f"   Raw VLM output: {content[:100]}...", flush=True)
-            
-            content = content.replace("```json", "").replace("```", "").strip()
-            data = json.loads(content)
-            
-            medicines = data.get('medicines', [])
-            if isinstance(data, list): medicines = data
-            
-            # Normalize
-            results = []
-            for item in medicines:
-                results.append({
-                    'medicine_name': item.get('medicine_name', 'Unknown'),
-                    'strength': item.get('strength', ''),
-                    'dosage': item.get('dosage', ''),
-                    'duration': str(item.get('duration', '')),
-                    'confidence': float(item.get('confidence', 0.8)),
-                    'original_text': item.get('original_text', ''),
-                    'source': 'pixtral_vlm'
-                })
-            return results
+            return self._parse_response(chat_response.choices[0].message.content)
 
+        except CircuitOpenError as e:
+            print(f"   ⚠ Skipping Pixtral: {e}", flush=True)
+            return []
         except Exception as e:
             print(f"   VLM Error: {e}", flush=True)
             return []
 
+    # No provider here: the breaker judges the whole stream (see _pixtral_stream_chunks)
+    @retry_api(max_retries=PIXTRAL_MAX_RETRIES, delay=PIXTRAL_RETRY_DELAY)
+    def _pixtral_stream(self, messages, **kwargs):
+        return self.mistral_client.chat.stream(model=PIXTRAL_MODEL, messages=messages, **kwargs)
+
+    def _pixtral_stream_chunks(self, messages, **kwargs):
+        for event in self._pixtral_stream(messages=messages, **kwargs):
+            choices = event.data.choices
+            if choices and choices[0].delta.content:
+                yield choices[0].delta.content
+
+    def _mistral_stream_text(self, image_path):
+        """
+        Text chunks of a streamed Pixtral reply (nothing if the call fails before
+        any text; StreamTruncatedError if it fails partway through)
+        """
+        from utils.streaming_json import StreamTruncatedError
+        produced = False
+        try:
+            chunks = get_breaker('mistral').stream(
+                self._pixtral_stream_chunks,
+                messages=self._messages(image_path),
+                response_format={"type": "json_object"}
+            )
+            for text in chunks:
+                produced = True
+                yield text
+
+        except CircuitOpenError as e:
+            print(f"   ⚠ Skipping Pixtral: {e}", flush=True)
+        except Exception as e:
+            if produced:
+                raise StreamTruncatedError(f"Pixtral stream broke off: {e}") from e
+            print(f"   VLM stream error: {e}", flush=True)
+
+    def _messages(self, image_path):
+        # Resize image for API to avoid rate limits (huge token count)
+        from utils.image_encoding import encode_image_base64
+        image_data, mime_type = encode_image_base64(image_path)
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": PIXTRAL_JSON_PROMPT},
+                    {"type": "image_url", "image_url": f"data:{mime_type};base64,{image_data}"}
+                ]
+            }
+        ]
+
+    def _parse_response(self, content):
+        """Pixtral JSON reply -> normalized medicine candidates"""
+        print(f"   Raw VLM output: {content[:100]}...", flush=True)
+        
+        content = content.replace("```json", "").replace("```", "").strip()
+        data = json.loads(content)
+        
+        medicines = data.get('medicines', []) if isinstance(data, dict) else []
+        if isinstance(data, list): medicines = data
+        
+        return self._normalize(medicines)
+
+    def _normalize(self, medicines):
+        results = []
+        for item in medicines:
+            results.append({
+                'medicine_name': item.get('medicine_name', 'Unknown'),
+                'strength': item.get('strength', ''),
+                'dosage': item.get('dosage', ''),
+                'duration': str(item.get('duration', '')),
+                'confidence': float(item.get('confidence', 0.8)),
+                'original_text': item.get('original_text', ''),
+                'source': 'pixtral_vlm'
+            })
+        return results
+
     def _apply_fuzzy_matching(self, candidates):
         """Apply fuzzy database matching to correct OCR errors"""
         try:
-            from utils.fuzzy_matcher import MedicineMatcher
-            matcher = MedicineMatcher()
+            from utils.fuzzy_matcher import get_matcher
+            matcher = get_matcher()
             
             results = []
             for item in candidates:
@@ -0,0 +1,276 @@
+"""
+Hedged OCR orchestration
+Runs a primary extraction and, if it hasn't produced a good answer within a
+hedge delay (or comes back below the confidence gate), races the next engine
+against it. The first result that passes the gate wins; slower attempts are
+cancelled if not yet started, otherwise their results are ignored.
+
+The hedge delay follows measured latency: once an engine has HEDGE_MIN_SAMPLES
+completed calls, the next engine is started when the running one passes the
+HEDGE_PERCENTILE latency of those calls, so only its slowest ~5% are hedged.
+Until then DEFAULT_HEDGE_DELAY is used.
+
+Configuration (environment):
+    OCR_HEDGE_DELAY=8      # fixed hedge delay in seconds (unset = derive from measured latency)
+    OCR_HEDGE_TIMEOUT=90   # overall time budget for one extraction
+"""
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.progress import report
+
+# Hedge delay before an engine has enough latency samples. A single-image vision
+# call usually finishes in a few seconds, so 8s only hedges calls that are already
+# well into their tail, without doubling provider spend on cold starts.
+DEFAULT_HEDGE_DELAY = 8.0
+DEFAULT_TIMEOUT = 90.0
+# Latency percentile an attempt must exceed before the next engine is started
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 10
+HEDGE_LATENCY_SAMPLES = 50
+# Floor for the measured delay, so a run of fast replies can't make every call hedge
+MIN_HEDGE_DELAY = 1.0
+# Average confidence an extraction needs to be accepted without waiting for others
+MIN_CONFIDENCE = 0.9
+MAX_WORKERS = 8
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def average_confidence(candidates):
+    if not candidates:
+        return 0.0
+    return sum(c.get('confidence', 0) for c in candidates) / len(candidates)
+
+
+def passes_gate(candidates, min_confidence=MIN_CONFIDENCE):
+    """Accept a non-empty extraction with named medicines and high enough average confidence"""
+    if not candidates:
+        return False
+    for candidate in candidates:
+        name = (candidate.get('medicine_name') or '').strip()
+        if not name or name == 'Unknown':
+            return False
+    return average_confidence(candidates) >= min_confidence
+
+
+class HedgedOrchestrator:
+    """Races OCR attempts in preference order with a hedge delay between launches"""
+
+    def __init__(self, hedge_delay=None, timeout=None, min_confidence=MIN_CONFIDENCE, max_workers=MAX_WORKERS):
+        """hedge_delay (or OCR_HEDGE_DELAY) fixes the delay; by default it is derived from measured latency"""
+        if hedge_delay is None and os.getenv('OCR_HEDGE_DELAY'):
+            hedge_delay = _env_float('OCR_HEDGE_DELAY', DEFAULT_HEDGE_DELAY)
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout if timeout is not None else _env_float('OCR_HEDGE_TIMEOUT', DEFAULT_TIMEOUT)
+        self.min_confidence = min_confidence
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._latency_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ocr-hedge')
+        return self._executor
+
+    def record_latency(self, name, seconds):
+        """Completed-call latency for an engine, feeding its measured hedge delay"""
+        with self._latency_lock:
+            samples = self._latencies.get(name)
+            if samples is None:
+                samples = self._latencies[name] = deque(maxlen=HEDGE_LATENCY_SAMPLES)
+            samples.append(seconds)
+
+    def hedge_delay_for(self, name):
+        """Seconds to give the named attempt before starting the next engine"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._latency_lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        delay = samples[math.ceil(HEDGE_PERCENTILE * len(samples)) - 1]
+        return min(max(delay, MIN_HEDGE_DELAY), self.timeout)
+
+    def _track(self, future, name, launched_at, clock):
+        """Record the attempt's latency when it completes, even after it lost the race"""
+        def done(f):
+            if not f.cancelled() and f.exception() is None:
+                self.record_latency(name, clock() - launched_at)
+        future.add_done_callback(done)
+
+    def run(self, attempts):
+        """
+        Run attempts, a list of (name, callable) in preference order; each
+        callable returns a list of candidate dicts.
+
+        Returns: (candidates, name of the attempt used). If no attempt passes
+        the gate, the best finished result is returned (([], None) if none finished).
+        """
+        queue = list(attempts)
+        pending = {}
+        finished = []
+        start = time.monotonic()
+        deadline = start + self.timeout
+        next_hedge_at = start
+
+        def launch():
+            nonlocal next_hedge_at
+            name, func = queue.pop(0)
+            if pending:
+                print(f"   ⏱ Hedging with {name} after {time.monotonic() - start:.1f}s", flush=True)
+                report('hedge', f"Hedging with {name}", engine=name)
+            # Each attempt runs in a copy of the caller's context, so progress.report()
+            # inside it reaches the upload's bound channel
+            future = self.executor.submit(contextvars.copy_context().run, func)
+            self._track(future, name, time.monotonic(), time.monotonic)
+            pending[future] = name
+            next_hedge_at = time.monotonic() + self.hedge_delay_for(name)
+
+        launch()
+        while pending or queue:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if not pending:
+                launch()
+                continue
+
+            wait_for = deadline - now
+            if queue:
+                wait_for = min(wait_for, max(next_hedge_at - now, 0))
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if queue and time.monotonic() >= next_hedge_at:
+                    launch()
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    candidates = future.result() or []
+                except Exception as e:
+                    print(f"   ⚠️ {name} extraction failed: {e}", flush=True)
+                    candidates = []
+
+                elapsed = time.monotonic() - start
+                if passes_gate(candidates, self.min_confidence):
+                    print(f"   ✓ {name} won in {elapsed:.1f}s ({average_confidence(candidates)*100:.0f}% avg confidence)", flush=True)
+                    self._abandon(pending)
+                    return candidates, name
+
+                print(f"   ⚠️ {name} below confidence gate after {elapsed:.1f}s", flush=True)
+                finished.append((candidates, name))
+
+            # A rejected answer starts the next engine without waiting for the hedge delay
+            if queue:
+                launch()
+
+        if pending:
+            print(f"   ⚠️ OCR hedge timed out after {self.timeout:.0f}s", flush=True)
+            self._abandon(pending)
+
+        if not finished:
+            return [], None
+        return max(finished, key=lambda r: (bool(r[0]), average_confidence(r[0])))
+
+    async def run_async(self, attempts):
+        """
+        Asyncio version of run: attempts is a list of (name, coroutine function).
+        Losing attempts are cancelled.
+        """
+        queue = list(attempts)
+        pending = {}
+        finished = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout
+        next_hedge_at = start
+
+        def launch():
+            nonlocal next_hedge_at
+            name, func = queue.pop(0)
+            if pending:
+                print(f"   ⏱ Hedging with {name} after {loop.time() - start:.1f}s", flush=True)
+                report('hedge', f"Hedging with {name}", engine=name)
+            task = asyncio.ensure_future(func())  # tasks copy the caller's context
+            self._track(task, name, loop.time(), loop.time)
+            pending[task] = name
+            next_hedge_at = loop.time() + self.hedge_delay_for(name)
+
+        try:
+            launch()
+            while pending or queue:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if not pending:
+                    launch()
+                    continue
+
+                wait_for = deadline - now
+                if queue:
+                    wait_for = min(wait_for, max(next_hedge_at - now, 0))
+                done, _ = await asyncio.wait(list(pending), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if queue and loop.time() >= next_hedge_at:
+                        launch()
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        candidates = task.result() or []
+                    except Exception as e:
+                        print(f"   ⚠️ {name} extraction failed: {e}", flush=True)
+                        candidates = []
+
+                    elapsed = loop.time() - start
+                    if passes_gate(candidates, self.min_confidence):
+                        print(f"   ✓ {name} won in {elapsed:.1f}s ({average_confidence(candidates)*100:.0f}% avg confidence)", flush=True)
+                        return candidates, name
+
+                    print(f"   ⚠️ {name} below confidence gate after {elapsed:.1f}s", flush=True)
+                    finished.append((candidates, name))
+
+                if queue:
+                    launch()
+
+            if pending:
+                print(f"   ⚠️ OCR hedge timed out after {self.timeout:.0f}s", flush=True)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if not finished:
+            return [], None
+        return max(finished, key=lambda r: (bool(r[0]), average_confidence(r[0])))
+
+    def _abandon(self, pending):
+        """Cancel attempts that haven't started; running ones finish in the background and are ignored"""
+        for future, name in pending.items():
+            if not future.cancel():
+                print(f"   ℹ Ignoring in-flight {name} result", flush=True)
+        pending.clear()
+
+
+# Global instance
+ocr_orchestrator = HedgedOrchestrator()
@@ -0,0 +1,173 @@
+"""
+Phonetic / handwriting-confusion keys for medicine names
+Folds characters OCR commonly confuses (5/S, 0/O, 1/l, ...) by context - a digit
+inside a word reads as a letter ("Zer0dol"), a letter inside a number as a digit
+("6S0") - and reduces the result to a simplified Metaphone code, so "Dolo 6S0" and
+"Dolo 650" share a key while real strengths such as "650" are left alone.
+"""
+import re
+
+# Handwriting/OCR confusables folded to one representative letter inside a word
+CONFUSABLE_FOLD = {
+    '0': 'o',
+    '1': 'l',
+    '|': 'l',
+    '!': 'l',
+    '5': 's',
+    '$': 's',
+    '6': 'g',
+    '8': 'b',
+    '2': 'z',
+}
+
+# ...and to the digit they stand for inside a number
+DIGIT_FOLD = {
+    'o': '0',
+    'l': '1',
+    'i': '1',
+    '|': '1',
+    '!': '1',
+    's': '5',
+    '$': '5',
+    'z': '2',
+    'b': '8',
+    'g': '6',
+}
+
+# Keys shorter than this are too ambiguous to bucket by prefix
+PREFIX_LEN = 3
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+VOWELS = set('aeiou')
+# Letters that sound alike (or look alike when handwritten) share a code
+LETTER_CODES = {
+    'b': 'P', 'p': 'P',
+    'd': 'T', 't': 'T',
+    'f': 'F', 'v': 'F',
+    'g': 'K', 'k': 'K', 'q': 'K',
+    's': 'S', 'z': 'S',
+    'j': 'J',
+    'l': 'L', 'm': 'M', 'n': 'N', 'r': 'R',
+}
+
+
+def fold_confusables(text):
+    """
+    Lower-case and fold confusable characters, keeping only word characters and spaces.
+    A confusable is only folded between two characters of the other kind: "zer0dol" ->
+    "zerodol" and "6s0" -> "650", while "650", "650mg" and "b12" are unchanged.
+    """
+    text = text.lower()
+    folded = []
+    for i, ch in enumerate(text):
+        prev = text[i - 1] if i else ''
+        nxt = text[i + 1:i + 2]
+        if ch in DIGIT_FOLD and prev.isdigit() and nxt.isdigit():
+            ch = DIGIT_FOLD[ch]
+        elif ch in CONFUSABLE_FOLD and (not ch.isdigit() or (prev.isalpha() and nxt.isalpha())):
+            ch = CONFUSABLE_FOLD[ch]
+        folded.append(ch)
+    return ' '.join(TOKEN_PATTERN.findall(''.join(folded)))
+
+
+def _metaphone_token(word):
+    """Simplified Metaphone for one token (digits pass through unchanged)"""
+    if not word:
+        return ''
+    for prefix in ('kn', 'gn', 'pn', 'wr', 'ps'):
+        if word.startswith(prefix):
+            word = word[1:]
+            break
+    if word.startswith('x'):
+        word = 's' + word[1:]
+
+    code = []
+    i = 0
+    while i < len(word):
+        ch = word[i]
+        nxt = word[i + 1] if i + 1 < len(word) else ''
+        if ch == word[i - 1:i] and ch != 'c':
+            i += 1
+            continue
+
+        if ch.isdigit():
+            code.append(ch)
+        elif ch in VOWELS:
+            if i == 0:
+                code.append('A')
+        elif ch == 'p' and nxt == 'h':
+            code.append('F')
+            i += 1
+        elif ch in 'sc' and nxt == 'h':
+            code.append('X')
+            i += 1
+        elif ch == 't' and nxt == 'h':
+            code.append('0')
+            i += 1
+        elif ch == 'c':
+            if nxt == 'k':
+                i += 1
+            code.append('S' if nxt in ('i', 'e', 'y') else 'K')
+        elif ch == 'g' and nxt in ('i', 'e', 'y'):
+            code.append('J')
+        elif ch == 'x':
+            code.append('KS')
+        elif ch in 'hwy':
+            # Only sounded before a vowel
+            if nxt in VOWELS and i == 0:
+                code.append(ch.upper())
+        else:
+            code.append(LETTER_CODES.get(ch, ch.upper()))
+        i += 1
+
+    # Collapse codes that became adjacent duplicates (e.g. "ck" -> K K)
+    collapsed = []
+    for c in ''.join(code):
+        if not collapsed or collapsed[-1] != c or c.isdigit():
+            collapsed.append(c)
+    return ''.join(collapsed)
+
+
+def phonetic_key(text):
+    """Confusable-folded, simplified-Metaphone key for a medicine name ('' if nothing usable)"""
+    if not text:
+        return ''
+    return ''.join(_metaphone_token(token) for token in fold_confusables(text).split())
+
+
+class PhoneticIndex:
+    """
+    Precomputed key -> {name: folded name} buckets for O(1) candidate lookup.
+    Exact key matches come first; otherwise names sharing the key prefix.
+    """
+
+    def __init__(self, names=()):
+        self.by_key = {}
+        self.by_prefix = {}
+        self.size = 0
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        key = phonetic_key(name)
+        if not key:
+            return
+        folded = fold_confusables(name)
+        self.by_key.setdefault(key, {})[name] = folded
+        if len(key) >= PREFIX_LEN:
+            self.by_prefix.setdefault(key[:PREFIX_LEN], {})[name] = folded
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def candidates(self, text):
+        """{name: folded name} sharing text's full key, else its key prefix (empty if none)"""
+        key = phonetic_key(text)
+        if not key:
+            return {}
+        if key in self.by_key:
+            return self.by_key[key]
+        if len(key) >= PREFIX_LEN:
+            return self.by_prefix.get(key[:PREFIX_LEN], {})
+        return {}
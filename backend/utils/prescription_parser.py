@@ -14,14 +14,16 @@ except ImportError:
 
 
 class PrescriptionParser:
-    def __init__(self, lenient_mode=False):
+    def __init__(self, lenient_mode=False, user_region=None):
         """
         Initialize parser
         
         Args:
             lenient_mode: If True, use very loose rules for messy handwriting
+            user_region: Region searched first when matching lines against the catalog
         """
         self.lenient_mode = lenient_mode
+        self.user_region = user_region
         
         # Header keywords to filter out
         self.header_keywords = [
@@ -248,7 +250,7 @@ class PrescriptionParser:
                     if self.lenient_mode:
                         # Try to find medicine name candidates in text
                         # This integrates 'MediScribe' dictionary lookup approach
-                        candidates = self.medicine_matcher.find_matches(text, top_n=1)
+                        candidates = self.medicine_matcher.find_matches(text, top_n=1, user_region=self.user_region)
                         if candidates and candidates[0]['score'] > 70:
                             db_match = candidates[0]
                             is_med = True # Force true if we found a strong match
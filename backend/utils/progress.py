@@ -0,0 +1,164 @@
+"""
+OCR upload progress
+In-process pub/sub for pipeline progress. An upload request binds a channel
+(keyed by user and a client-chosen upload id) to its context, the engines call
+report() at each stage, and GET /api/ocr/progress/<upload_id> relays the
+channel to the browser as Server-Sent Events.
+
+Channels live in this process's memory, so the progress stream and the upload
+must reach the same worker (run gunicorn with threads rather than several
+worker processes, or use sticky routing). A subscriber may connect before the
+upload starts; events published earlier are replayed to it. A subscription
+ends with an error if no upload starts within START_WAIT seconds, or if the
+channel then goes quiet for longer than the TTL.
+
+Configuration (environment):
+    OCR_PROGRESS_TTL=300   # seconds an idle or finished channel is kept
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+
+DEFAULT_TTL = 300
+KEEPALIVE_SECONDS = 15
+# Seconds a subscriber waits for the upload to start (covers a slow file upload)
+START_WAIT = 60
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_current = contextvars.ContextVar('ocr_progress_channel', default=None)
+
+
+def valid_upload_id(upload_id):
+    return bool(upload_id) and UPLOAD_ID_PATTERN.match(upload_id) is not None
+
+
+class ProgressChannel:
+    """Ordered event log for one upload; subscribers replay it and then follow it"""
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.started = None
+        self.last_activity = time.monotonic()
+        self._cond = threading.Condition()
+
+    def publish(self, event, data=None):
+        """Append an event; data gets 'elapsed' (seconds since the first event)"""
+        with self._cond:
+            if self.closed:
+                return
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            payload = dict(data or {})
+            payload['elapsed'] = round(now - self.started, 3)
+            self.events.append((event, payload))
+            self.last_activity = now
+            self._cond.notify_all()
+
+    def close(self, event=None, data=None):
+        """Publish a final event (if given) and end every subscription"""
+        if event is not None:
+            self.publish(event, data)
+        with self._cond:
+            self.closed = True
+            self.last_activity = time.monotonic()
+            self._cond.notify_all()
+
+    def subscribe(self, keepalive=KEEPALIVE_SECONDS, start_wait=START_WAIT, idle=DEFAULT_TTL):
+        """
+        Yields (event, data) for every event from the start of the channel until
+        it is closed. Yields (None, None) after keepalive seconds without events,
+        so the caller can write a comment to keep the connection open.
+        Ends with an 'error' event if nothing is published for start_wait
+        seconds before the upload starts, or for idle seconds after it.
+        """
+        index = 0
+        subscribed = time.monotonic()
+        while True:
+            with self._cond:
+                if index >= len(self.events) and not self.closed:
+                    self._cond.wait(keepalive)
+                pending = self.events[index:]
+                index += len(pending)
+                finished = self.closed and index >= len(self.events)
+                if self.started is None:
+                    waited, limit = time.monotonic() - subscribed, start_wait
+                else:
+                    waited, limit = time.monotonic() - max(self.last_activity, subscribed), idle
+
+            if not pending and not finished:
+                if waited >= limit:
+                    message = 'Upload did not start' if self.started is None else 'Progress stalled'
+                    yield 'error', {'msg': message}
+                    return
+                yield None, None
+            for item in pending:
+                yield item
+            if finished:
+                return
+
+
+class ProgressHub:
+    """Channels by (owner, upload_id), created by whichever side arrives first"""
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            try:
+                ttl = float(os.getenv('OCR_PROGRESS_TTL', DEFAULT_TTL))
+            except ValueError:
+                ttl = DEFAULT_TTL
+        self.ttl = ttl
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, owner, upload_id, fresh=False):
+        """
+        The channel for (owner, upload_id). With fresh=True (the upload side) a
+        closed channel left by an earlier upload with the same id is replaced,
+        so the new upload's events aren't dropped.
+        """
+        with self._lock:
+            self._prune()
+            key = (owner, upload_id)
+            channel = self._channels.get(key)
+            if channel is None or (fresh and channel.closed):
+                channel = ProgressChannel()
+                self._channels[key] = channel
+            return channel
+
+    def _prune(self):
+        """Drop channels idle for longer than the TTL (abandoned ones are closed first)"""
+        cutoff = time.monotonic() - self.ttl
+        for key, channel in list(self._channels.items()):
+            if channel.last_activity < cutoff:
+                if not channel.closed:
+                    channel.close('error', {'msg': 'Progress channel expired'})
+                del self._channels[key]
+
+
+def bind(channel):
+    """Make channel the target of report() in the current context; returns a reset token"""
+    return _current.set(channel)
+
+
+def unbind(token):
+    _current.reset(token)
+
+
+def publish(event, data=None):
+    """Publish to the current context's channel (no-op without one)"""
+    channel = _current.get()
+    if channel is not None:
+        channel.publish(event, data)
+
+
+def report(stage, message, **data):
+    """Stage transition from the OCR pipeline, e.g. report('preprocess', 'Preprocessing image', step=1, total=3)"""
+    publish('stage', dict(data, stage=stage, message=message))
+
+
+# Global instance
+progress_hub = ProgressHub()
@@ -0,0 +1,32 @@
+"""
+Async request rate limiter
+Token bucket that spaces out provider calls to stay under a requests-per-minute
+quota (e.g. Gemini's 15 RPM) when many OCR requests run concurrently.
+"""
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """Allow at most `rpm` acquisitions per minute, with bursts up to `burst`"""
+
+    def __init__(self, rpm, burst=1):
+        self.rate = rpm / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
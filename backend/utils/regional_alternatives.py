@@ -2,9 +2,26 @@
 Regional Medicine Alternatives Finder
 Helps users find equivalent medicines available in their region
 """
-import sqlite3
 import os
 from rapidfuzz import process, fuzz
+from utils.db import CatalogWatcher, query, query_one
+
+try:
+    from utils.catalog_snapshot import load_snapshot
+except ImportError:  # numpy not installed: always read the catalog from SQLite
+    load_snapshot = None
+
+# SQLite's default limit on bound parameters per statement
+MAX_SQL_PARAMS = 900
+
+# Hub & Spoke: the major city hub serving each state
+HUB_CITIES = {
+    'Karnataka': 'Bangalore',
+    'Maharashtra': 'Mumbai',
+    'Tamil Nadu': 'Chennai',
+    'Delhi': 'Delhi',
+    'West Bengal': 'Kolkata'
+}
 
 class RegionalMedicineMapper:
     """Find regional alternatives for medicines"""
@@ -18,6 +35,18 @@ class RegionalMedicineMapper:
             
         self.db_path = db_path
         self.medicine_cache = {}
+        self.brand_index = {}
+        self.generic_index = {}
+        self.availability_tiers = {}
+        self.brand_ids = {}
+        self.medicines_by_id = {}
+        self.equivalents_cache = {}
+        self.has_compositions = False
+        self.has_inventory = False
+        self.snapshot = None
+        self.fuzzy_brands = None
+        self.catalog_watcher = CatalogWatcher(db_path)
+        self.inventory_watcher = CatalogWatcher(db_path, key='inventory_version')
         self._load_medicines()
         self._configure_gemini()
         
@@ -44,34 +73,279 @@ class RegionalMedicineMapper:
             print(f"⚠ pharmacy.db not found at {self.db_path}", flush=True)
             return
         
+        if self._load_snapshot():
+            return
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get all medicines with their generic names
-            cursor.execute('''
-                SELECT generic_name, brand_name, region, city, strength
-                FROM medicines
-            ''')
+            # Get all medicines with their generic names, joined with hub stock levels.
+            # Rows without a generic or brand name are skipped, as the catalog loader
+            # does (a NULL also fails != '', so NULL rows are excluded too).
+            has_inventory = self._has_table('inventory')
+            if has_inventory:
+                rows = query(self.db_path, '''
+                    SELECT m.id, m.generic_name, m.brand_name, m.region, m.city, m.strength, i.hub, i.qty
+                    FROM medicines m
+                    LEFT JOIN inventory i ON i.medicine_id = m.id
+                    WHERE m.generic_name != '' AND m.brand_name != ''
+                    ORDER BY m.id
+                ''')
+            else:
+                rows = query(self.db_path, '''
+                    SELECT id, generic_name, brand_name, region, city, strength, NULL, NULL
+                    FROM medicines
+                    WHERE generic_name != '' AND brand_name != ''
+                    ORDER BY id
+                ''')
             
-            for row in cursor.fetchall():
-                generic_name, brand_name, region, city, strength = row
+            medicine_cache = {}
+            brand_index = {}
+            generic_index = {}
+            brand_ids = {}
+            medicines_by_id = {}
+            last_id = None
+            for row in rows:
+                medicine_id, generic_name, brand_name, region, city, strength, hub, qty = row
                 
-                if generic_name not in self.medicine_cache:
-                    self.medicine_cache[generic_name] = []
+                # One row per (medicine, hub): fold extra hubs into the stock map
+                if medicine_id == last_id:
+                    medicine_cache[generic_name][-1]['stock'][hub] = qty
+                    continue
+                last_id = medicine_id
                 
-                self.medicine_cache[generic_name].append({
-                    'brand_name': brand_name,
-                    'region': region if region else 'All India',
-                    'city': city,
-                    'strength': strength if strength else 'N/A',
-                    'generic_name': generic_name
-                })
+                if generic_name not in medicine_cache:
+                    medicine_cache[generic_name] = []
+                    generic_index[generic_name.lower()] = generic_name
+                
+                brand_info = self._brand_info(medicine_id, generic_name, brand_name, region, city, strength)
+                if hub is not None:
+                    brand_info['stock'] = {hub: qty}
+                medicine_cache[generic_name].append(brand_info)
+                medicines_by_id[medicine_id] = brand_info
+                brand_index.setdefault(brand_name.lower(), generic_name)
+                brand_ids.setdefault(brand_name.lower(), medicine_id)
             
-            conn.close()
-            print(f"✓ Loaded {len(self.medicine_cache)} generic medicines", flush=True)
+            # Swap in the new catalog together
+            self.medicine_cache = medicine_cache
+            self.brand_index = brand_index
+            self.generic_index = generic_index
+            self.availability_tiers = {}
+            self.brand_ids = brand_ids
+            self.medicines_by_id = medicines_by_id
+            self.equivalents_cache = {}
+            self.has_compositions = self._has_table('medicine_compositions')
+            self.has_inventory = has_inventory
+            self.snapshot = None
+            self.fuzzy_brands = None
+            print(f"✓ Loaded {len(medicine_cache)} generic medicines (catalog v{self.catalog_watcher.version})", flush=True)
         except Exception as e:
             print(f"⚠ Failed to load medicines from DB: {e}", flush=True)
+
+    def _load_snapshot(self):
+        """
+        Map the prebuilt catalog snapshot instead of reading every row.
+        Generics are materialised lazily on first lookup. Returns False when
+        no current snapshot exists (or numpy is missing) so the DB path is used.
+        """
+        if load_snapshot is None:
+            return False
+        try:
+            snapshot = load_snapshot(self.db_path)
+            if snapshot is None:
+                return False
+            
+            self.medicine_cache = {}
+            self.brand_index = {}
+            self.generic_index = {}
+            self.availability_tiers = {}
+            self.brand_ids = {}
+            self.medicines_by_id = {}
+            self.equivalents_cache = {}
+            self.has_compositions = self._has_table('medicine_compositions')
+            self.has_inventory = self._has_table('inventory')
+            self.snapshot = snapshot
+            self.fuzzy_brands = None
+            print(f"✓ Mapped catalog snapshot: {len(snapshot):,} medicines (catalog v{snapshot.catalog_version})", flush=True)
+            return True
+        except Exception as e:
+            print(f"⚠ Catalog snapshot failed, loading from DB: {e}", flush=True)
+            return False
+
+    def _has_table(self, name):
+        return bool(query_one(self.db_path, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)))
+
+    def _brand_info(self, medicine_id, generic_name, brand_name, region, city, strength):
+        return {
+            'medicine_id': medicine_id,
+            'brand_name': brand_name,
+            'region': region if region else 'All India',
+            'city': city,
+            'strength': strength if strength else 'N/A',
+            'generic_name': generic_name
+        }
+
+    def _fetch_stock(self, medicine_ids):
+        """{medicine_id: {hub: qty}} for the given ids (empty without an inventory table)"""
+        stock = {}
+        if not self.has_inventory:
+            return stock
+        for start in range(0, len(medicine_ids), MAX_SQL_PARAMS):
+            chunk = medicine_ids[start:start + MAX_SQL_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            rows = query(self.db_path,
+                         f"SELECT medicine_id, hub, qty FROM inventory WHERE medicine_id IN ({placeholders})",
+                         chunk)
+            for medicine_id, hub, qty in rows:
+                stock.setdefault(medicine_id, {})[hub] = qty
+        return stock
+
+    def _get_brands(self, generic):
+        """A generic's brand list, materialised from the snapshot on first use"""
+        brands = self.medicine_cache.get(generic)
+        if brands is not None or self.snapshot is None or not generic:
+            return brands or []
+        
+        rows = [self.snapshot.row(i) for i in self.snapshot.generic_range(generic)]
+        stock = self._fetch_stock([row[0] for row in rows])
+        brands = []
+        for medicine_id, generic_name, brand_name, strength, region, city in rows:
+            brand_info = self._brand_info(medicine_id, generic, brand_name, region, city, strength)
+            if medicine_id in stock:
+                brand_info['stock'] = stock[medicine_id]
+            brands.append(brand_info)
+            self.medicines_by_id[medicine_id] = brand_info
+        self.medicine_cache[generic] = brands
+        return brands
+
+    def _lookup_brand(self, brand_name):
+        """(generic_name, medicine_id) for an exact brand name (case-insensitive), or (None, None)"""
+        key = brand_name.strip().lower()
+        if key in self.brand_index:
+            return self.brand_index[key], self.brand_ids.get(key)
+        if self.snapshot is not None:
+            idx = self.snapshot.find_brand(key)
+            if idx is not None:
+                medicine_id, generic_name = self.snapshot.row(idx)[:2]
+                self.brand_index[key] = generic_name
+                self.brand_ids[key] = medicine_id
+                return generic_name, medicine_id
+        return None, None
+
+    def _get_medicine(self, medicine_id):
+        """Brand dict for a medicine id (materialising its generic from the snapshot if needed)"""
+        if medicine_id not in self.medicines_by_id and self.snapshot is not None:
+            idx = self.snapshot.find_id(medicine_id)
+            if idx is not None:
+                self._get_brands(self.snapshot.row(idx)[1])
+        return self.medicines_by_id.get(medicine_id)
+
+    def _refresh_if_catalog_changed(self):
+        """Rebuild caches (and drop memoised tiers) after the catalog loader or inventory feed bumps a version"""
+        catalog_changed = self.catalog_watcher.changed()
+        inventory_changed = self.inventory_watcher.changed()
+        if catalog_changed or inventory_changed:
+            print(f"ℹ Catalog v{self.catalog_watcher.version} / inventory v{self.inventory_watcher.version}, "
+                  f"reloading medicines", flush=True)
+            self._load_medicines()
+
+    def _rank_brands(self, brands, hub_city, state):
+        """Rank a generic's brands as (row index, tier) pairs: Hub > State > National > Others > Out of Stock"""
+        state_hub = HUB_CITIES.get(state)
+        ranked = []
+        for idx, brand_info in enumerate(brands):
+            stock = brand_info.get('stock')
+            if stock is not None:
+                # Real availability from the inventory feed
+                if hub_city and stock.get(hub_city, 0) > 0:
+                    tier = 1
+                elif state_hub and stock.get(state_hub, 0) > 0:
+                    tier = 2
+                elif any(qty > 0 for qty in stock.values()):
+                    tier = 3
+                else:
+                    tier = 5
+            elif hub_city and brand_info['city'] == hub_city:
+                tier = 1
+            elif brand_info['region'] == state:
+                tier = 2
+            elif brand_info['region'] == 'All India':
+                tier = 3
+            else:
+                tier = 4
+            ranked.append((idx, tier))
+        ranked.sort(key=lambda pair: pair[1])  # stable: keeps DB order within a tier
+        return tuple(ranked)
+
+    def _get_ranked_brands(self, generic, hub_city, state):
+        """
+        Ranked brands for a generic near a hub, computed on first lookup and
+        memoised per (generic, hub, state) until the next catalog load
+        """
+        by_hub = self.availability_tiers.setdefault(generic, {})
+        key = (hub_city, state)
+        if key not in by_hub:
+            by_hub[key] = self._rank_brands(self._get_brands(generic), hub_city, state)
+        return by_hub[key]
+
+    def _availability_status(self, tier, brand_info, hub_city):
+        if tier == 1:
+            return f"Available in {hub_city} Hub (Next Day)"
+        if tier == 2:
+            return "Standard Shipping (2-3 Days)"
+        if tier == 3:
+            return "National Stock"
+        if tier == 5:
+            return "Out of Stock"
+        return f"Ships from {brand_info['region']}"
+
+    def find_exact_equivalents(self, medicine_name):
+        """
+        Brands with exactly the same composition (every ingredient and strength)
+        as the named brand, via an indexed self-join on medicine_compositions.
+        Returns a list of brand dicts, or [] if the brand or its composition is unknown.
+        """
+        medicine_id = self._lookup_brand(medicine_name)[1]
+        if not medicine_id or not self.has_compositions:
+            return []
+        
+        if medicine_id not in self.equivalents_cache:
+            rows = query(self.db_path, '''
+                SELECT c.medicine_id
+                FROM medicine_compositions t
+                JOIN medicine_compositions c
+                  ON c.ingredient = t.ingredient
+                 AND c.strength_value = t.strength_value
+                 AND c.unit = t.unit
+                WHERE t.medicine_id = ?
+                GROUP BY c.medicine_id
+                HAVING COUNT(*) = (SELECT COUNT(*) FROM medicine_compositions WHERE medicine_id = ?)
+                   AND COUNT(*) = (SELECT COUNT(*) FROM medicine_compositions x WHERE x.medicine_id = c.medicine_id)
+                ORDER BY c.medicine_id
+            ''', (medicine_id, medicine_id))
+            equivalents = (self._get_medicine(row[0]) for row in rows)
+            self.equivalents_cache[medicine_id] = tuple(info for info in equivalents if info)
+        return list(self.equivalents_cache[medicine_id])
+
+    def _resolve_generic(self, medicine_name):
+        """Map a brand or generic name to a cached generic (exact first, then broad DB search)"""
+        key = medicine_name.strip().lower()
+        generic = self._lookup_brand(key)[0]
+        if generic:
+            return generic
+        if key in self.generic_index:
+            return self.generic_index[key]
+        if self.snapshot is not None:
+            rows = self.snapshot.generic_range(key)
+            if rows:
+                return self.snapshot.row(rows[0])[1]
+        
+        # Wildcard search for Brand OR Generic
+        pattern = f"%{medicine_name}%"
+        row = query_one(self.db_path, '''
+            SELECT generic_name FROM medicines
+            WHERE brand_name LIKE ? OR generic_name LIKE ?
+            LIMIT 1
+        ''', (pattern, pattern))
+        return row[0] if row else None
             
     def ask_gemini_hub(self, address):
         """Ask Gemini to find the nearest Major Hub for an address (with Mock Fallback)"""
@@ -125,25 +399,44 @@ class RegionalMedicineMapper:
                 
         return hub, state
 
+    def _get_fuzzy_brands(self):
+        """(brand names, brand -> generic) for fuzzy lookup, built once per catalog load"""
+        fuzzy_brands = self.fuzzy_brands
+        if fuzzy_brands is not None:
+            return fuzzy_brands
+        
+        generic_map = {}
+        snapshot = self.snapshot
+        if snapshot is not None:
+            # Decode each interned string once, not once per row
+            decoded = {}
+            for brand_id, generic_id in zip(snapshot.brand.tolist(), snapshot.generic.tolist()):
+                if brand_id not in decoded:
+                    decoded[brand_id] = snapshot.string(brand_id)
+                if generic_id not in decoded:
+                    decoded[generic_id] = snapshot.string(generic_id)
+                generic_map[decoded[brand_id]] = decoded[generic_id]
+        else:
+            for generic, brands in self.medicine_cache.items():
+                for brand_info in brands:
+                    generic_map[brand_info['brand_name']] = generic
+        
+        fuzzy_brands = (list(generic_map), generic_map)
+        self.fuzzy_brands = fuzzy_brands
+        return fuzzy_brands
+
     def find_generic_name(self, medicine_name):
         """Find generic name for a brand medicine using fuzzy matching"""
         if not medicine_name:
             return None
         
         # Try exact match first
-        for generic, brands in self.medicine_cache.items():
-            for brand_info in brands:
-                if brand_info['brand_name'].lower() == medicine_name.lower():
-                    return generic
+        generic = self._lookup_brand(medicine_name)[0]
+        if generic:
+            return generic
         
         # Try fuzzy match on brand names
-        all_brands = []
-        generic_map = {}
-        for generic, brands in self.medicine_cache.items():
-            for brand_info in brands:
-                all_brands.append(brand_info['brand_name'])
-                generic_map[brand_info['brand_name']] = generic
-        
+        all_brands, generic_map = self._get_fuzzy_brands()
         result = process.extractOne(
             medicine_name,
             all_brands,
@@ -156,10 +449,12 @@ class RegionalMedicineMapper:
         
         return None
 
-    def find_alternatives(self, medicine_name, user_region='Karnataka', locality=None):
+    def find_alternatives(self, medicine_name, user_region='Karnataka', locality=None, limit=10):
         """
-        Find regional alternatives using BROAD SQL SEARCH (Wildcard)
+        Find regional alternatives from the memoised availability tiers
         """
+        self._refresh_if_catalog_changed()
+        
         # 1. Detect Hub from Locality (Address)
         hub_city = None
         detected_state = user_region
@@ -171,37 +466,22 @@ class RegionalMedicineMapper:
                 hub_city = ai_city
                 detected_state = ai_state
         
-        print(f"DEBUG: Searching DB for '%{medicine_name}%' near '{hub_city}'", flush=True)
+        print(f"DEBUG: Looking up '{medicine_name}' near '{hub_city}'", flush=True)
 
         try:
-            # 2. execute DIRECT BROAD SEARCH on Database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Wildcard search for Brand OR Generic
-            query = f"%{medicine_name}%"
-            cursor.execute('''
-                SELECT generic_name, brand_name, region, city, strength
-                FROM medicines
-                WHERE brand_name LIKE ? OR generic_name LIKE ?
-                LIMIT 50
-            ''', (query, query))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            alternatives = []
-            for row in rows:
-                g_name, b_name, reg, cty, st = row
-                alternatives.append({
-                    'brand_name': b_name,
-                    'generic_name': g_name,
-                    'region': reg,
-                    'city': cty,
-                    'strength': st
-                })
+            # 2. Exact-composition equivalents for a known brand; otherwise resolve to a
+            #    generic and do a single keyed lookup (Hub > State > National)
+            generic = None
+            brands = self.find_exact_equivalents(medicine_name)
+            if brands:
+                generic = brands[0]['generic_name']
+                ranked = self._rank_brands(brands, hub_city, detected_state)
+            else:
+                generic = self._resolve_generic(medicine_name)
+                ranked = self._get_ranked_brands(generic, hub_city, detected_state) if generic else ()
+                brands = self._get_brands(generic)
                 
-            if not alternatives:
+            if not ranked:
                 return {
                     'original': medicine_name,
                     'generic_name': 'Unknown',
@@ -212,50 +492,28 @@ class RegionalMedicineMapper:
                     'message': 'No alternatives found'
                 }
 
-            # 3. Sort Buckets (Hub > State > National)
-            hub_matches = []      # Tier 1 (City Match)
-            state_matches = []    # Tier 2 (State Match)
-            national_matches = [] # Tier 3 (All India)
-            others = []
-            
-            for alt in alternatives:
-                # Skip exact brand name match only if strictly identical
-                if alt['brand_name'].lower() == medicine_name.lower():
-                    # Optional: decide if we want to show itself. Let's keep it to show availability.
-                    pass 
-                
-                status = 'Check Availability'
-                
-                if hub_city and alt['city'] == hub_city:
-                    status = f"Available in {hub_city} Hub (Next Day)"
-                    hub_matches.append({**alt, 'availability': status, 'tier': 1})
-                elif alt['region'] == detected_state:
-                    status = "Standard Shipping (2-3 Days)"
-                    state_matches.append({**alt, 'availability': status, 'tier': 2})
-                elif alt['region'] == 'All India':
-                    status = "National Stock"
-                    national_matches.append({**alt, 'availability': status, 'tier': 3})
-                else:
-                    status = f"Ships from {alt['region']}"
-                    others.append({**alt, 'availability': status, 'tier': 4})
-            
-            sorted_alternatives = hub_matches + state_matches + national_matches + others
-            
-            # Infer generic name from the first result if logical
-            primary_generic = sorted_alternatives[0]['generic_name'] if sorted_alternatives else "Unknown"
+            # 3. Slice the pre-ranked list and attach availability
+            alternatives = []
+            for idx, tier in ranked[:limit]:
+                brand_info = brands[idx]
+                alternatives.append({
+                    **brand_info,
+                    'availability': self._availability_status(tier, brand_info, hub_city),
+                    'tier': tier
+                })
             
             return {
                 'original': medicine_name,
-                'generic_name': primary_generic,
+                'generic_name': generic,
                 'user_region': detected_state,
                 'locality': locality,
                 'hub_detected': hub_city,
-                'alternatives': sorted_alternatives[:10],
-                'total_found': len(sorted_alternatives)
+                'alternatives': alternatives,
+                'total_found': len(ranked)
             }
 
         except Exception as e:
-            print(f"BROAD SEARCH ERROR: {e}")
+            print(f"ALTERNATIVES LOOKUP ERROR: {e}")
             return {
                 'original': medicine_name,
                 'generic_name': 'Error',
@@ -0,0 +1,121 @@
+"""
+Incremental JSON parsing for streamed LLM replies
+Scans text chunks as they arrive and emits each object in a JSON array (e.g.
+every entry of "medicines": [...]) as soon as its closing brace is seen, so a
+medicine can be refined and sent to the client before the reply is complete.
+"""
+import json
+
+
+class StreamTruncatedError(Exception):
+    """A streamed reply ended early, after some of it had already been used"""
+
+
+def _is_medicine(obj):
+    return 'name' in obj or 'medicine_name' in obj
+
+
+class IncrementalJSONParser:
+    """
+    Emits complete objects that are direct elements of a JSON array.
+    Markdown fences and prose around the JSON are ignored (only brackets,
+    braces and strings outside them are tracked).
+    """
+
+    def __init__(self, predicate=_is_medicine):
+        self.predicate = predicate
+        self.text = ''
+        self.emitted = 0
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None
+        self._obj_depth = None
+
+    def feed(self, chunk):
+        """Add a chunk of streamed text; returns the objects completed by it"""
+        if not chunk:
+            return []
+        self.text += chunk
+        completed = []
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                if ch == '{' and self._obj_start is None and self._stack and self._stack[-1] == '[':
+                    self._obj_start = pos
+                    self._obj_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch == '}' or ch == ']':
+                if self._stack:
+                    self._stack.pop()
+                if ch == '}' and self._obj_start is not None and len(self._stack) == self._obj_depth:
+                    obj = self._decode(text[self._obj_start:pos + 1])
+                    self._obj_start = None
+                    if obj is not None:
+                        completed.append(obj)
+        self._pos = len(text)
+        self.emitted += len(completed)
+        return completed
+
+    @property
+    def complete(self):
+        """True once every bracket opened so far has been closed"""
+        return not self._stack and not self._in_string
+
+    def _decode(self, fragment):
+        try:
+            obj = json.loads(fragment)
+        except ValueError:
+            return None
+        if isinstance(obj, dict) and (self.predicate is None or self.predicate(obj)):
+            return obj
+        return None
+
+
+def parse_medicines(text):
+    """Full (non-incremental) parse of a reply: the "medicines" list or a bare list"""
+    content = text.replace("```json", "").replace("```", "").strip()
+    data = json.loads(content)
+    if isinstance(data, list):
+        return data
+    return data.get('medicines', []) if isinstance(data, dict) else []
+
+
+def stream_refined(chunks, normalize, refine):
+    """
+    Turn a stream of text chunks into refined medicine dicts, one at a time.
+
+    normalize and refine are the engine's list -> list steps (raw JSON items to
+    candidates, then fuzzy database refinement). If nothing could be parsed
+    incrementally, the complete reply is parsed once at the end.
+
+    Raises StreamTruncatedError if the reply stops inside the JSON after some
+    medicines were yielded (e.g. max_tokens), so the caller doesn't keep a
+    partial list as the whole prescription.
+    """
+    parser = IncrementalJSONParser()
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield from refine(normalize([item]))
+
+    if parser.emitted and not parser.complete:
+        raise StreamTruncatedError(f"reply ended inside the JSON after {parser.emitted} medicines")
+
+    if parser.emitted == 0 and parser.text.strip():
+        try:
+            items = parse_medicines(parser.text)
+        except ValueError as e:
+            print(f"   JSON Parse Error: {e}", flush=True)
+            return
+        yield from refine(normalize(items))
@@ -0,0 +1,190 @@
+"""
+SymSpell-style symmetric-delete dictionary for medicine names
+Precomputes every deletion (edit distance <= 2) of each catalog name's prefix
+so one- and two-character OCR errors resolve with a few dict lookups instead
+of a full fuzzy scan. Built offline and pickled next to pharmacy.db.
+
+Build (from backend/):
+    python -m utils.symspell
+"""
+import os
+import pickle
+import sys
+import time
+
+from rapidfuzz.distance import Levenshtein
+
+if __package__ in (None, ''):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMAT_VERSION = 1
+MAX_EDIT_DISTANCE = 2
+# Deletes are generated from the first PREFIX_LENGTH characters only, which
+# bounds the dictionary size; candidates are verified on the full string
+PREFIX_LENGTH = 7
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'medicines.symspell')
+
+
+def normalize_term(text):
+    return ' '.join(text.lower().split())
+
+
+def max_distance_for(term, max_edit_distance=MAX_EDIT_DISTANCE):
+    """Allowed edit distance for a query: short names tolerate fewer edits"""
+    return min(max_edit_distance, len(term) // 4)
+
+
+def _deletes(term, max_distance, prefix_length=PREFIX_LENGTH):
+    prefix = term[:prefix_length]
+    deletes = {prefix}
+    frontier = [prefix]
+    for _ in range(max_distance):
+        next_frontier = []
+        for word in frontier:
+            for i in range(len(word)):
+                candidate = word[:i] + word[i + 1:]
+                if candidate not in deletes:
+                    deletes.add(candidate)
+                    next_frontier.append(candidate)
+        frontier = next_frontier
+    return deletes
+
+
+class SymSpellDictionary:
+    """Symmetric-delete lookup over normalised names with correction-frequency priors"""
+
+    def __init__(self, names=(), frequencies=None, catalog_version=0,
+                 max_edit_distance=MAX_EDIT_DISTANCE):
+        self.max_edit_distance = max_edit_distance
+        self.catalog_version = catalog_version
+        self.terms = []
+        self.names = []
+        self.term_ids = {}
+        self.deletes = {}
+        self.frequencies = {}
+        self.set_frequencies(frequencies or {})
+
+        for name in names:
+            term = normalize_term(name)
+            if not term or term in self.term_ids:
+                continue
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.names.append(name)
+            for delete in _deletes(term, max_edit_distance):
+                self.deletes.setdefault(delete, []).append(term_id)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def set_frequencies(self, frequencies):
+        """Correction counts per name; break ties between equally close candidates"""
+        self.frequencies = {normalize_term(name): count for name, count in frequencies.items() if name}
+
+    def lookup(self, text, max_distance=None):
+        """
+        Closest catalog name to text within the allowed edit distance.
+        Returns: (name, distance) or (None, None) on a miss
+        """
+        term = normalize_term(text)
+        if not term:
+            return None, None
+        if term in self.term_ids:
+            return self.names[self.term_ids[term]], 0
+
+        if max_distance is None:
+            max_distance = max_distance_for(term, self.max_edit_distance)
+        max_distance = min(max_distance, self.max_edit_distance)
+        if max_distance <= 0:
+            return None, None
+
+        candidate_ids = set()
+        for delete in _deletes(term, max_distance):
+            ids = self.deletes.get(delete)
+            if ids is None:
+                continue
+            if isinstance(ids, int):
+                candidate_ids.add(ids)
+            else:
+                candidate_ids.update(ids)
+
+        best = None
+        for term_id in candidate_ids:
+            candidate = self.terms[term_id]
+            if abs(len(candidate) - len(term)) > max_distance:
+                continue
+            distance = Levenshtein.distance(term, candidate, score_cutoff=max_distance)
+            if distance > max_distance:
+                continue
+            rank = (distance, -self.frequencies.get(candidate, 0), term_id)
+            if best is None or rank < best:
+                best = rank
+        if best is None:
+            return None, None
+        return self.names[best[2]], best[0]
+
+    def save(self, path=DEFAULT_PATH):
+        """Pickle the dictionary (written atomically)"""
+        # Most deletes map to a single name: store a bare int to keep the
+        # pickle small and fast to load
+        deletes = {delete: ids[0] if len(ids) == 1 else tuple(ids) for delete, ids in self.deletes.items()}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'format': FORMAT_VERSION,
+                'catalog_version': self.catalog_version,
+                'max_edit_distance': self.max_edit_distance,
+                'prefix_length': PREFIX_LENGTH,
+                'names': self.names,
+                'terms': self.terms,
+                'deletes': deletes,
+                'frequencies': self.frequencies,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Load a saved dictionary; None if missing or built with different parameters"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"⚠ SymSpell dictionary unreadable: {e}", flush=True)
+            return None
+        if data.get('format') != FORMAT_VERSION or data.get('prefix_length') != PREFIX_LENGTH:
+            return None
+
+        dictionary = cls(max_edit_distance=data['max_edit_distance'], catalog_version=data['catalog_version'])
+        dictionary.names = data['names']
+        dictionary.terms = data['terms']
+        dictionary.term_ids = {term: i for i, term in enumerate(dictionary.terms)}
+        dictionary.deletes = data['deletes']
+        dictionary.frequencies = data['frequencies']
+        return dictionary
+
+
+def build_dictionary(path=DEFAULT_PATH):
+    """Build the dictionary from the fuzzy matcher's name list and correction history, and save it"""
+    from utils.correction_feedback import correction_feedback
+    from utils.db import get_catalog_version
+    from utils.fuzzy_matcher import SQLITE_PATH, load_medicine_names
+
+    start = time.perf_counter()
+    dictionary = SymSpellDictionary(
+        load_medicine_names(),
+        frequencies=correction_feedback.get_correction_frequencies(),
+        catalog_version=get_catalog_version(SQLITE_PATH)
+    )
+    dictionary.save(path)
+    print(f"✓ SymSpell dictionary: {len(dictionary):,} names, {len(dictionary.deletes):,} deletes "
+          f"in {time.perf_counter() - start:.1f}s -> {path}", flush=True)
+    return dictionary
+
+
+if __name__ == '__main__':
+    build_dictionary(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
@@ -1,9 +1,9 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
-import { Upload as UploadIcon, Loader2 } from 'lucide-react';
+import { Upload as UploadIcon, Loader2, CheckCircle2 } from 'lucide-react';
 import { motion } from 'framer-motion';
-import { uploadPrescription } from '@/services/api';
+import { uploadPrescription, openUploadProgress } from '@/services/api';
 import { useNavigate } from 'react-router-dom';
 
 export default function Upload() {
@@ -12,6 +12,9 @@ export default function Upload() {
     const [uploading, setUploading] = useState(false);
     const [selectedPatient, setSelectedPatient] = useState('');
     const [user, setUser] = useState(null);
+    const [stages, setStages] = useState([]);
+    const [partialMedicines, setPartialMedicines] = useState([]);
+    const progressRef = useRef(null);
     const navigate = useNavigate();
 
     useEffect(() => {
@@ -21,6 +24,32 @@ export default function Upload() {
         }
     }, []);
 
+    // Close any open progress stream when leaving the page
+    useEffect(() => () => progressRef.current?.close(), []);
+
+    const newUploadId = () => (
+        window.crypto?.randomUUID?.() || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+    );
+
+    // Follow pipeline stages and partial medicines over SSE while the upload request runs
+    const watchProgress = (uploadId) => {
+        setStages([]);
+        setPartialMedicines([]);
+        // Declared before the call: the callback may run before openUploadProgress returns
+        let source = null;
+        source = openUploadProgress(uploadId, (event, data) => {
+            if (event === 'stage') {
+                setStages((prev) => [...prev, data]);
+            } else if (event === 'medicine') {
+                setPartialMedicines((prev) => [...prev, data]);
+            } else if (event === 'done' || event === 'error') {
+                source?.close();
+                if (source && progressRef.current === source) progressRef.current = null;
+            }
+        });
+        progressRef.current = source;
+    };
+
     const handleFileChange = (e) => {
         const selected = e.target.files[0];
         if (selected) {
@@ -39,10 +68,13 @@ export default function Upload() {
         }
 
         setUploading(true);
+        const uploadId = newUploadId();
+        watchProgress(uploadId);
 
         try {
             const formData = new FormData();
             formData.append('file', file);
+            formData.append('upload_id', uploadId);
             if (selectedPatient) {
                 formData.append('patient_email', selectedPatient);
             }
@@ -51,6 +83,8 @@ export default function Upload() {
         } catch (err) {
             alert("Upload failed: " + (err.response?.data?.msg || err.message));
         } finally {
+            progressRef.current?.close();
+            progressRef.current = null;
             setUploading(false);
         }
     };
@@ -88,13 +122,52 @@ export default function Upload() {
                                 )}
                                 {uploading && (
                                     <div className="absolute inset-0 flex items-center justify-center bg-black/40 text-white font-bold rounded-md">
-                                        Processing OCR...
+                                        {stages.length ? `${stages[stages.length - 1].message}...` : 'Processing OCR...'}
                                     </div>
                                 )}
                             </div>
                         )}
                     </div>
 
+                    {/* Live OCR progress (stages with timings, medicines as they are read) */}
+                    {uploading && stages.length > 0 && (
+                        <div className="space-y-3 rounded-md border p-4">
+                            <ul className="space-y-1 text-sm">
+                                {stages.map((stage, i) => {
+                                    const next = stages[i + 1];
+                                    return (
+                                        <li key={i} className="flex items-center gap-2">
+                                            {next
+                                                ? <CheckCircle2 className="h-4 w-4 text-green-600" />
+                                                : <Loader2 className="h-4 w-4 animate-spin" />}
+                                            <span>{stage.message}</span>
+                                            <span className="ml-auto text-xs text-muted-foreground">
+                                                {next
+                                                    ? `${(next.elapsed - stage.elapsed).toFixed(1)}s`
+                                                    : `started at ${stage.elapsed.toFixed(1)}s`}
+                                            </span>
+                                        </li>
+                                    );
+                                })}
+                            </ul>
+                            {partialMedicines.length > 0 && (
+                                <div className="space-y-1">
+                                    <p className="text-xs font-medium text-muted-foreground">
+                                        Medicines found so far ({partialMedicines.length})
+                                    </p>
+                                    <ul className="text-sm list-disc pl-5">
+                                        {partialMedicines.map((m, i) => (
+                                            <li key={i}>
+                                                {m.medicine_name || m.name}
+                                                {m.dosage ? ` - ${m.dosage}` : ''}
+                                            </li>
+                                        ))}
+                                    </ul>
+                                </div>
+                            )}
+                        </div>
+                    )}
+
                     {/* Patient Selector for Doctors/Pharmacists */}
                     {user && (user.role === 'doctor' || user.role === 'pharmacist') && (
                         <div className="space-y-2">
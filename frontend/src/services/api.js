@@ -31,6 +31,51 @@ export const verifyLicense = (license_no) => api.post('/verify-license', { licen
 export const uploadPrescription = (formData) => api.post('/ocr/upload', formData, {
     headers: { 'Content-Type': 'multipart/form-data' }
 });
+// Server-Sent Events stream of OCR progress for an upload sent with the same upload_id.
+// Read with fetch (not EventSource) so the token goes in the Authorization header
+// rather than the URL. onEvent(event, data) is called per event; returns { close }.
+export const openUploadProgress = (uploadId, onEvent) => {
+    const controller = new AbortController();
+    const token = localStorage.getItem('token');
+
+    (async () => {
+        try {
+            const res = await fetch(`${API_BASE_URL}/api/ocr/progress/${uploadId}`, {
+                headers: token ? { Authorization: `Bearer ${token}` } : {},
+                signal: controller.signal,
+            });
+            if (!res.ok || !res.body) {
+                onEvent('error', { msg: `Progress stream failed (${res.status})` });
+                return;
+            }
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    let event = 'message';
+                    const data = [];
+                    for (const line of frame.split('\n')) {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                    }
+                    // Keepalive comments carry no data
+                    if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+                }
+            }
+        } catch (err) {
+            if (err.name !== 'AbortError') onEvent('error', { msg: err.message });
+        }
+    })();
+
+    return { close: () => controller.abort() };
+};
 export const getPrescription = (id) => api.get(`/prescriptions/${id}`);
 export const translateText = (text, target) => api.post('/translate', { text, target });
 